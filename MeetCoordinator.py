@@ -1,39 +1,98 @@
 import os
+from functools import lru_cache
 from db import SessionLocal, Meeting
+from date_scanner import find_fallback_date
+from lazy import lazy_import
+from metrics import instrument, instrument_handler, timed, inc
+import metrics
+import profiler
+import retention
+import availability
+import model_router
+import search
+import freebusy
+from jobqueue import jobs, PRIORITY_HIGH, PRIORITY_LOW
+import admission
+import transcript_cache
+import audio_segments
+import venues
+import recurrence
+import drain
+from reminders import ReminderEngine, reminder_text
+import render
+from meeting_cache import meetings as meeting_cache, snapshot as snapshot_meeting
+from callbacks import CallbackRouter, encode as encode_callback
+from ics_writer import Event, calendar_file
+from update_processor import ChatOrderedUpdateProcessor
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, filters, ContextTypes, ChatMemberHandler, CallbackQueryHandler
-from openai import OpenAI
 from datetime import datetime, date, timedelta, timezone
 import re
-import dateparser
-import googlemaps
 from urllib.parse import quote
 import asyncio
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
-from ics import Calendar, Event as IcsEvent
+import signal
 import pytz
 from telegram import Update,InputFile,InlineKeyboardButton, InlineKeyboardMarkup
-import aiohttp
 import tempfile
 import subprocess
-import uuid
+import hashlib
 from io import BytesIO
 
+# Heavy libraries are only loaded on first use (see lazy.py)
+dateparser = lazy_import("dateparser")
+aiohttp = lazy_import("aiohttp")
+
 editing_sessions = {}
 
 # Load environment variables
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+# Service endpoints can be overridden, e.g. to point at local stand-ins
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+TELEGRAM_FILE_BASE_URL = os.getenv("TELEGRAM_FILE_BASE_URL")
+# Port for the bot's own Prometheus /metrics endpoint (0: not served)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Telegram user IDs allowed to run admin commands such as /profile
+ADMIN_USER_IDS = {int(x) for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip()}
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """OpenAI client, built on first use."""
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+
+# Fast/strong model routing for summaries
+summary_router = model_router.ModelRouter(get_openai_client)
+
+@lru_cache(maxsize=None)
+def get_gmaps():
+    """Google Maps client, built on first use."""
+    import googlemaps
+    return googlemaps.Client(key=GOOGLE_MAPS_API_KEY, base_url=GOOGLE_MAPS_BASE_URL)
+
+@lru_cache(maxsize=None)
+def get_scheduler():
+    """Reminder scheduler, built on first use."""
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    return AsyncIOScheduler(timezone="Asia/Singapore")
+
+def forget_views(meeting_ids):
+    """Drop cached meeting views whose reminder state just changed (e.g. a reminder fired)."""
+    for meeting_id in meeting_ids:
+        render.invalidate(meeting_id)
+
+# Bucketed, rate-limited reminder delivery (see reminders.py)
+reminder_engine = ReminderEngine(get_scheduler, next_due=lambda fired: next_reminder_dues(fired),
+                                 on_fired=forget_views)
 
 # States per group
 listening_sessions = {}  # {chat_id: {user: [messages]}}
-
-scheduler = AsyncIOScheduler(timezone="Asia/Singapore")
+late_transcripts = {}  # {chat_id: {user: [messages]}} voice notes transcribed after /stoplistening
+bot_app = None  # the Application, for background jobs (set by build_application)
 
 def escape_markdown_v2(text: str) -> str:
     escape_chars = r"\_*[]()~`>#+-=|{}.!"
@@ -46,6 +105,20 @@ def extract_time_from_summary(summary: str) -> str:
             return line.split("🕒 Time:")[1].strip()
     return None
 
+_UNSURE = re.compile(r"^\s*$|<|\?|\b(?:tbd|tbc|unclear|unknown|not (?:specified|mentioned|stated|clear)|n/?a)\b",
+                     re.IGNORECASE)
+
+def summary_is_complete(summary: str) -> bool:
+    """Whether a model summary has every field, with a definite date and time."""
+    fields = {}
+    for line in summary.splitlines():
+        for label in ("📅 Date:", "🕒 Time:", "📍 Place:", "👥 Pax:", "🎯 Activity:"):
+            if line.strip().startswith(label):
+                fields[label] = line.split(label, 1)[1].strip()
+    if len(fields) < 5:
+        return False
+    return not (_UNSURE.search(fields["📅 Date:"]) or _UNSURE.search(fields["🕒 Time:"]))
+
 def parse_meeting_datetime(meet_date: date, time_str: str) -> datetime:
     """Combine meeting date and time into datetime object"""
     if not meet_date or not time_str:
@@ -73,6 +146,37 @@ def parse_meeting_datetime(meet_date: date, time_str: str) -> datetime:
         print(f"❌ Error parsing meeting datetime: {e}")
         return None
 
+def reminder_minutes(meeting_id: int):
+    """Minutes-before of the pending reminder for this meeting, or None."""
+    return reminder_engine.minutes_before(meeting_id)
+
+def view_summary(meeting) -> str:
+    """The summary shown on a meeting's message: recurring ones say how often they repeat."""
+    if meeting.rrule:
+        return f"{meeting.summary}\n🔁 Repeats: {recurrence.describe(meeting.rrule)}"
+    return meeting.summary
+
+def _load_meeting_view(meeting_id: int):
+    meeting = meeting_cache.get(meeting_id)
+    if not meeting:
+        return None
+    return render.MeetingView(meeting_id, meeting.chat_id, view_summary(meeting), reminder_minutes(meeting_id))
+
+def invalidate_meeting(meeting_id: int):
+    """Call after any write to a meeting."""
+    meeting_cache.invalidate(meeting_id)
+    render.invalidate(meeting_id)
+
+def forget_meetings(meeting_ids):
+    """Call after meetings are deleted: cancel their reminders and drop cached state."""
+    for meeting_id in meeting_ids:
+        reminder_engine.cancel(meeting_id)
+        invalidate_meeting(meeting_id)
+
+def get_meeting_view(meeting_id: int):
+    """Rendered summary + keyboard for a meeting, from cache when possible."""
+    return render.get(meeting_id, _load_meeting_view)
+
 # --- COMMANDS 
 
 async def welcome_on_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -92,7 +196,7 @@ async def welcome_on_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "1️⃣ `/startlistening` — I’ll capture your chat\n"
         "2️⃣ Chat freely about date/time/place/etc.\n"
         "3️⃣ `/stoplistening` — I’ll post a neat summary\n\n"
-        "🔧 *Quick commands:* `/listmeetings`, `/editmeeting <id>`, `/deletemeeting <id>`, `/cancelreminder <id>`\n\n"
+        "🔧 *Quick commands:* `/listmeetings`, `/findmeeting <text>`, `/exportmeetings`, `/editmeeting <id>`, `/repeatmeeting <id> weekly`, `/deletemeeting <id>`, `/cancelreminder <id>`\n\n"
         "🔒 I only record when you ask. Let’s make planning smooth and stress-free! 🗓️✨"
     )
 
@@ -112,6 +216,7 @@ async def start_listening(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     listening_sessions[chat_id] = {}
+    late_transcripts.pop(chat_id, None)
     await update.message.reply_text("👂 Listening for availability suggestions... Use /stoplistening when you're done.")
 
 
@@ -122,9 +227,29 @@ async def stop_listening(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ I'm not currently listening. Use /startlistening to begin.")
         return
 
-    await update.message.reply_text("✅ Stopped listening. Processing availability now...")
-    await process_availability(update, context, chat_id)
-    del listening_sessions[chat_id]  # Clear after processing
+    group_data = listening_sessions[chat_id]
+    if not group_data and not pending_voice(chat_id):
+        del listening_sessions[chat_id]
+        await update.message.reply_text("❌ No messages were collected.")
+        return
+
+    try:
+        position = await admission.summaries.admit(chat_id)
+    except admission.Busy:
+        # Keep listening so nothing is lost; they can simply try again
+        await update.message.reply_text("🚦 I'm summarizing for a lot of groups right now. "
+                                        "Still listening here, please /stoplistening again in a minute.")
+        return
+    del listening_sessions[chat_id]
+
+    # Summarizing takes seconds (GPT, Maps); the job queue does it in the background.
+    # Jobs are keyed by chat, so voice notes still being transcribed are included.
+    jobs.enqueue("summarize", {"chat_id": chat_id, "user_id": update.effective_user.id, "group_data": group_data},
+                 key=f"chat:{chat_id}")
+    if position:
+        await update.message.reply_text(f"✅ Stopped listening. ⏳ Busy right now, your summary is queued (about #{position} in line).")
+    else:
+        await update.message.reply_text("✅ Stopped listening. Processing availability now...")
 
 # --- MESSAGE HANDLING ---
 async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -167,10 +292,8 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     if user_id in editing_sessions:
         session = editing_sessions[user_id]
         step = session['step']
-        db = SessionLocal()
-        meeting = db.query(Meeting).filter_by(id=session['meeting_id']).first()
 
-        if not meeting:
+        if not meeting_cache.get(session['meeting_id']):
             del editing_sessions[user_id]
             await update.message.reply_text("❌ Meeting not found (may have been deleted). Edit cancelled.")
             return
@@ -192,6 +315,14 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
         # STEP 2: user has entered the new value
         elif step == 'enter_value':
+            db = SessionLocal()
+            meeting = db.query(Meeting).filter_by(id=session['meeting_id']).first()
+            if not meeting:
+                db.close()
+                del editing_sessions[user_id]
+                await update.message.reply_text("❌ Meeting not found (may have been deleted). Edit cancelled.")
+                return
+
             field = session['field']
             lines = meeting.summary.split('\n')
 
@@ -253,42 +384,32 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
             # commit changes
             meeting.summary = '\n'.join(updated_lines)
+            search.index_fields(meeting)
             db.commit()
             meeting_id = meeting.id
-            summary_text = meeting.summary
+            invalidate_meeting(meeting_id)
+            view = render.put(render.MeetingView(
+                meeting_id, meeting.chat_id, view_summary(meeting), reminder_minutes(meeting_id)
+            ))
             db.close()
             del editing_sessions[user_id]
 
-            # rebuild the final summary with Outlook link
-            domain = os.getenv('DOMAIN_BASE_URL')
-            sync_link = f"{domain}/login?telegram_id={update.effective_user.id}&meeting_id={meeting_id}"
-            final_message = (
-                f"📋 Final Summary:\n\n{summary_text}\n\n"
-                f"🔗 [🗓️ Click here to add to Outlook Calendar]({sync_link})"
-            )
-
             # re-edit the original message (or send a new one)
             msg_id = context.chat_data.get(f"meeting_msg_{meeting_id}")
-            buttons = [
-                [InlineKeyboardButton("✏️ Edit Meeting", callback_data=f'edit:{meeting_id}')],
-                [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f'delete_prompt:{meeting_id}')],
-                [InlineKeyboardButton("⏰ Set Reminder", callback_data=f'setreminder:{meeting_id}')]
-            ]
-
             if msg_id:
                 await context.bot.edit_message_text(
                     chat_id=chat_id,
                     message_id=msg_id,
-                    text=final_message,
+                    text=view.text(user_id),
                     parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(buttons)
+                    reply_markup=view.keyboard
                 )
             else:
                 await context.bot.send_message(
                     chat_id=chat_id,
-                    text=final_message,
+                    text=view.text(user_id),
                     parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(buttons)
+                    reply_markup=view.keyboard
                 )
             return
 
@@ -296,13 +417,14 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     if chat_id in listening_sessions:
         user = update.message.from_user.full_name
         listening_sessions[chat_id].setdefault(user, []).append(user_text)
+        freebusy.remember_member(chat_id, user_id, user)
 
 # --- DATE EXTRACTION ---
 def extract_meeting_date(original_messages, gpt_summary, current_date=None):
     """
     1) Look for “📅 Date:” in the GPT summary and parse it.
-    2) If that fails, scan the raw chat for explicit date tokens.
-    Clamps same-month/day parses back to the current year.
+    2) If that fails, scan the raw chat for date tokens and parse the
+       most explicit, most recent candidates (see date_scanner).
     """
     if current_date is None:
         current_date = date.today()
@@ -323,262 +445,167 @@ def extract_meeting_date(original_messages, gpt_summary, current_date=None):
             # if GPT gave a Date line but it didn't parse to a valid future date, stop here
             break
 
-    # 2) Fallback: scan raw messages
+    # 2) Fallback: scan raw messages in a single pass, parse only the best few
     all_messages = []
     for msgs in original_messages.values():
         all_messages.extend(msgs)
 
-    date_patterns = [
-        r'\b(tomorrow|tmr)\b',
-        r'\b(today|tdy)\b',
-        r'\b(next\s+(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday))\b',
-        r'\b(this\s+(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday))\b',
-        r'\b(\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*)\b',
-        r'\b(\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b',
-        r'\b(\d{1,2}-\d{1,2}(?:-\d{2,4})?)\b'
-    ]
-
-    def clamp_year(dt: datetime) -> datetime:
-        if dt.month == current_date.month and dt.day == current_date.day:
-            return dt.replace(year=current_date.year)
-        return dt
-
-    for message in all_messages:
-        msg_low = message.lower()
-        for pat in date_patterns:
-            for match in re.findall(pat, msg_low, re.IGNORECASE):
-                parsed = dateparser.parse(
-                    match,
-                    settings={
-                        'RELATIVE_BASE': datetime.combine(current_date, datetime.min.time()),
-                        'PREFER_DATES_FROM': 'future'
-                    }
-                )
-                if parsed:
-                    parsed = clamp_year(parsed)
-                    if parsed.date() >= current_date:
-                        return parsed.date()
-
-    # nothing valid found
-    return None
+    return find_fallback_date(all_messages, current_date)
 
 
-async def send_final_summary_with_buttons(context, chat_id, summary_text, meeting_id: int):
-    # Fetch meeting & parse .ics
-    db      = SessionLocal()
-    meeting = db.query(Meeting).filter_by(id=meeting_id).first()
-    time_str = extract_time_from_summary(meeting.summary)
-    meeting_dt = parse_meeting_datetime(meeting.meet_date, time_str)
+async def send_final_summary_with_buttons(bot, chat_data, chat_id, view, user_id: int, meet_date):
+    # Build the .ics from what we already have in hand (in the CPU pool)
+    time_str = extract_time_from_summary(view.summary)
+    meeting_dt = parse_meeting_datetime(meet_date, time_str)
 
     ics_buf = None
     if meeting_dt:
-        ics_buf = create_ics_file(
-            meeting_title="Group Meeting",
-            description=meeting.summary,
-            start_time=meeting_dt
-        )
-
-    # Build the first two buttons
-    buttons = [
-        [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=f'edit:{meeting_id}')],
-        [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f'delete_prompt:{meeting_id}')]
-    ]
-
-    # Toggle reminder button
-    job_id  = f"reminder_{meeting_id}"
-    if scheduler.get_job(job_id):
-        buttons.append([InlineKeyboardButton("❌ Cancel Reminder", callback_data=f"cancel_reminder:{meeting_id}")])
-    else:
-        buttons.append([InlineKeyboardButton("⏰ Set Reminder",    callback_data=f"setreminder:{meeting_id}")])
+        ics_buf = await jobs.run_cpu(create_ics_file, "Group Meeting", view.summary, meeting_dt, 60,
+                                     f"meeting-{view.meeting_id}@meetcoord.local")
 
     # Send the summary + buttons
-    msg = await context.bot.send_message(
+    msg = await bot.send_message(
         chat_id=chat_id,
-        text=summary_text,
+        text=view.text(user_id),
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=view.keyboard
     )
     # Store for later edits
-    context.chat_data[f"meeting_msg_{meeting_id}"] = msg.message_id
+    chat_data[f"meeting_msg_{view.meeting_id}"] = msg.message_id
 
     # Finally, send the .ics if we built one
     if ics_buf:
-        await context.bot.send_document(
+        await bot.send_document(
             chat_id=chat_id,
             document=InputFile(ics_buf, filename=ics_buf.name),
             caption="📅 Tap to add this meeting to your calendar!"
         )
-    db.close()
 
 
-async def meeting_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data or ""
+callback_router = CallbackRouter()
 
-    try:
-        # --- STEP 1: prompt for delete ---
-        if data.startswith("delete_prompt:"):
-            meeting_id = int(data.split(":", 1)[1])
-            # guard: only prompt if meeting still exists
-            db = SessionLocal()
-            exists = db.query(Meeting.id).filter_by(id=meeting_id).first()
-            db.close()
-            if not exists:
-                return await query.edit_message_text("❌ Meeting not found.")
-            kb = [
-                InlineKeyboardButton("✅ Yes, delete", callback_data=f"confirm_delete:{meeting_id}"),
-                InlineKeyboardButton("❌ Cancel",       callback_data=f"cancel_delete:{meeting_id}")
-            ]
-            return await query.edit_message_text(
-                text="⚠️ Are you sure you want to delete this meeting?",
-                reply_markup=InlineKeyboardMarkup([kb])
-            )
 
-        # --- STEP 2: confirm deletion ---
-        elif data.startswith("confirm_delete:"):
-            meeting_id = int(data.split(":", 1)[1])
-            success = await perform_meeting_deletion(update.effective_chat.id, meeting_id, context)
-            if success:
-                return await query.edit_message_text("✅ Meeting deleted.")
-            else:
-                return await query.edit_message_text("❌ Meeting not found.")
+async def meeting_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await callback_router.dispatch(update, context)
+    except Exception as e:
+        print(f"Error in meeting_button_handler: {e}")
+        # inform user without exposing internals
+        await update.callback_query.answer("❌ An error occurred. Please try again.", show_alert=True)
 
-        # --- STEP 3: cancel deletion ---
-        elif data.startswith("cancel_delete:"):
-            meeting_id = int(data.split(":", 1)[1])
-            db = SessionLocal()
-            meeting = db.query(Meeting).filter_by(id=meeting_id).first()
-            db.close()
-            if not meeting:
-                return await query.edit_message_text("❌ Meeting not found.")
-            buttons = [
-                [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=f'edit:{meeting_id}')],
-                [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f'delete_prompt:{meeting_id}')],
-                [InlineKeyboardButton("⏰ Set Reminder",    callback_data=f'setreminder:{meeting_id}')]
-            ]
-            return await query.edit_message_text(
-                text=meeting.summary,
-                parse_mode="Markdown",
-                reply_markup=InlineKeyboardMarkup(buttons)
-            )
 
-        # --- Edit meeting flow ---
-        elif data.startswith("edit:"):
-            meeting_id = int(data.split(":", 1)[1])
-            return await perform_edit_start(
-                update.effective_user.id, 
-                update.effective_chat.id, 
-                meeting_id, 
-                context
-            )
+# --- STEP 1: prompt for delete ---
+@callback_router.route("delete_prompt")
+async def on_delete_prompt(update, context, query, cb):
+    # guard: only prompt if meeting still exists
+    if not meeting_cache.get(cb.meeting_id):
+        return await query.edit_message_text("❌ Meeting not found.")
+    kb = [
+        InlineKeyboardButton("✅ Yes, delete", callback_data=encode_callback("confirm_delete", cb.meeting_id)),
+        InlineKeyboardButton("❌ Cancel",       callback_data=encode_callback("cancel_delete", cb.meeting_id))
+    ]
+    return await query.edit_message_text(
+        text="⚠️ Are you sure you want to delete this meeting?",
+        reply_markup=InlineKeyboardMarkup([kb])
+    )
 
-        elif data.startswith("editfield:"):
-            parts = data.split(":")
-            meeting_id, field = int(parts[1]), parts[2]
-            # re-use same session safety
-            editing_sessions[update.effective_user.id] = {
-                'step': 'enter_value',
-                'meeting_id': meeting_id,
-                'field': field
-            }
-            field_name = field.capitalize()
-            return await query.edit_message_text(
-                f"✏️ Please enter the new value for *{field_name}*:",
-                parse_mode="Markdown"
-            )
+# --- STEP 2: confirm deletion ---
+@callback_router.route("confirm_delete")
+async def on_confirm_delete(update, context, query, cb):
+    success = await perform_meeting_deletion(update.effective_chat.id, cb.meeting_id, context)
+    if success:
+        return await query.edit_message_text("✅ Meeting deleted.")
+    else:
+        return await query.edit_message_text("❌ Meeting not found.")
+
+# --- STEP 3: cancel deletion ---
+@callback_router.route("cancel_delete")
+async def on_cancel_delete(update, context, query, cb):
+    view = get_meeting_view(cb.meeting_id)
+    if not view:
+        return await query.edit_message_text("❌ Meeting not found.")
+    return await query.edit_message_text(
+        text=view.text(query.from_user.id),
+        parse_mode="Markdown",
+        reply_markup=view.keyboard
+    )
 
-        # --- View summary ---
-        elif data.startswith("view:"):
-            meeting_id = int(data.split(":", 1)[1])
-            db = SessionLocal()
-            meeting = db.query(Meeting).filter_by(id=meeting_id).first()
-            db.close()
-            if not meeting:
-                await query.answer("❌ Meeting not found.", show_alert=True)
-                return
+# --- Edit meeting flow ---
+@callback_router.route("edit")
+async def on_edit(update, context, query, cb):
+    return await perform_edit_start(
+        update.effective_user.id,
+        update.effective_chat.id,
+        cb.meeting_id,
+        context
+    )
 
-            # Build full summary with Outlook link
-            summary = meeting.summary
-            sync_link = (
-                f"{os.getenv('DOMAIN_BASE_URL')}"
-                f"/login?telegram_id={query.from_user.id}&meeting_id={meeting_id}"
-            )
-            full_text = (
-                f"{summary}\n\n"
-                f"🔗 [🗓️ Add to Outlook Calendar]({sync_link})"
-            )
+@callback_router.route("editfield")
+async def on_edit_field(update, context, query, cb):
+    # re-use same session safety
+    editing_sessions[update.effective_user.id] = {
+        'step': 'enter_value',
+        'meeting_id': cb.meeting_id,
+        'field': cb.arg
+    }
+    return await query.edit_message_text(
+        f"✏️ Please enter the new value for *{cb.arg.capitalize()}*:",
+        parse_mode="Markdown"
+    )
 
-            # Rebuild the action buttons
-            buttons = [
-                [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=f"edit:{meeting_id}")],
-                [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f"delete_prompt:{meeting_id}")],
-                [InlineKeyboardButton("⏰ Set Reminder",    callback_data=f"setreminder:{meeting_id}")]
-            ]
-            markup = InlineKeyboardMarkup(buttons)
-
-            await query.edit_message_text(
-                text=full_text,
-                parse_mode="Markdown",
-                reply_markup=markup
-            )
+# --- View summary ---
+@callback_router.route("view")
+async def on_view(update, context, query, cb):
+    view = get_meeting_view(cb.meeting_id)
+    if not view:
+        return await query.answer("❌ Meeting not found.", show_alert=True)
+    return await query.edit_message_text(
+        text=view.text(query.from_user.id),
+        parse_mode="Markdown",
+        reply_markup=view.keyboard
+    )
 
-        # --- Reminder controls ---
-        elif data.startswith("setreminder:"):
-            meeting_id = int(data.split(":", 1)[1])
-            return await offer_reminder_presets(query, context, meeting_id)
-
-        elif data.startswith("cancel_reminder:"):
-            meeting_id = int(data.split(":", 1)[1])
-            job_id = f"reminder_{meeting_id}"
-            if scheduler.get_job(job_id):
-                scheduler.remove_job(job_id)
-                # refresh buttons
-                db = SessionLocal()
-                meeting = db.query(Meeting).filter_by(id=meeting_id).first()
-                db.close()
-                buttons = [
-                    [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=f'edit:{meeting_id}')],
-                    [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f'delete_prompt:{meeting_id}')],
-                    [InlineKeyboardButton("⏰ Set Reminder",    callback_data=f"setreminder:{meeting_id}")]
-                ]
-                return await query.edit_message_text(
-                    text=f"📋 Final Summary:\n\n{meeting.summary}",
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(buttons)
-                )
-            else:
-                return await query.answer("❌ No active reminder to cancel.", show_alert=True)
-
-        elif data.startswith("remind:"):
-            _, mid, mins = data.split(":")
-            return await schedule_reminder(query, context, int(mid), int(mins))
-
-        elif data.startswith("remindcustom:"):
-            meeting_id = int(data.split(":", 1)[1])
-            context.user_data["awaiting_custom_reminder_for"] = meeting_id
-            return await query.edit_message_text(
-                "✏️ Please enter a custom reminder interval (e.g. `90m` or `2h30m`):",
-                parse_mode="Markdown"
-            )
+# --- Reminder controls ---
+@callback_router.route("setreminder")
+async def on_set_reminder(update, context, query, cb):
+    return await offer_reminder_presets(query, context, cb.meeting_id)
+
+@callback_router.route("cancel_reminder")
+async def on_cancel_reminder(update, context, query, cb):
+    if not reminder_engine.cancel(cb.meeting_id):
+        return await query.answer("❌ No active reminder to cancel.", show_alert=True)
+
+    # redraw from the cached view, now without the reminder
+    view = get_meeting_view(cb.meeting_id)
+    if not view:
+        return await query.edit_message_text("❌ Meeting not found.")
+    view = render.put(view.with_reminder(None))
+    return await query.edit_message_text(
+        text=view.text(query.from_user.id),
+        parse_mode="Markdown",
+        reply_markup=view.keyboard
+    )
 
-        else:
-            # catch any unknown or stale callback_data
-            return await query.answer("⚠️ This action is no longer available.", show_alert=True)
+@callback_router.route("remind")
+async def on_remind(update, context, query, cb):
+    return await schedule_reminder(query, context, cb.meeting_id, cb.arg)
 
-    except Exception as e:
-        print(f"Error in meeting_button_handler: {e}")
-        # inform user without exposing internals
-        await query.answer("❌ An error occurred. Please try again.", show_alert=True)
+@callback_router.route("remindcustom")
+async def on_remind_custom(update, context, query, cb):
+    context.user_data["awaiting_custom_reminder_for"] = cb.meeting_id
+    return await query.edit_message_text(
+        "✏️ Please enter a custom reminder interval (e.g. `90m` or `2h30m`):",
+        parse_mode="Markdown"
+    )
 
 
 # --- helper to show preset buttons ---
 async def offer_reminder_presets(query, context, meeting_id):
     presets = [("1 h before", 60), ("3 h", 180), ("6 h", 360), ("12 h", 720), ("24 h", 1440)]
     kb = [
-        [InlineKeyboardButton(label, callback_data=f"remind:{meeting_id}:{mins}")]
+        [InlineKeyboardButton(label, callback_data=encode_callback("remind", meeting_id, mins))]
         for label, mins in presets
-    ] + [[InlineKeyboardButton("🔧 Custom…", callback_data=f"remindcustom:{meeting_id}")]]
+    ] + [[InlineKeyboardButton("🔧 Custom…", callback_data=encode_callback("remindcustom", meeting_id))]]
     await query.edit_message_text(
         "⏰ When would you like to be reminded?",
         reply_markup=InlineKeyboardMarkup(kb)
@@ -586,76 +613,92 @@ async def offer_reminder_presets(query, context, meeting_id):
 
 # --- helper to schedule the reminder job ---
 async def schedule_reminder(query, context, meeting_id: int, minutes_before: int):
-    db = SessionLocal()
-    meeting = db.query(Meeting).filter_by(id=meeting_id).first()
+    meeting = meeting_cache.get(meeting_id)
     if not meeting or not meeting.meet_date:
         await query.answer("❌ Missing meeting date.", show_alert=True)
-        db.close()
         return
 
     time_str = extract_time_from_summary(meeting.summary)
     meeting_dt = parse_meeting_datetime(meeting.meet_date, time_str)
     if not meeting_dt:
         await query.answer("❌ Can't parse meeting time.", show_alert=True)
-        db.close()
         return
 
-    remind_dt = meeting_dt - timedelta(minutes=minutes_before)
-    if remind_dt < datetime.now(pytz.timezone("Asia/Singapore")):
+    overrides = recurrence.load_overrides([meeting_id]).get(meeting_id) if meeting.rrule else None
+    upcoming = next_reminder(meeting, minutes_before, overrides)
+    if upcoming is None:
         await query.answer("❌ That time is already past.", show_alert=True)
-        db.close()
         return
 
-    job_id = f"reminder_{meeting_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    occurrence, remind_dt = upcoming
+    reminder_engine.schedule(context.bot, query.message.chat_id, meeting_id, minutes_before, remind_dt,
+                             occurrence.original_date if meeting.rrule else None)
 
-    scheduler.add_job(
-        send_reminder,
-        DateTrigger(run_date=remind_dt),
-        args=[context.bot, query.message.chat_id, meeting_id, minutes_before],
-        id=job_id,
-        replace_existing=True
-    )
-
-    # build sync link
-    domain = os.getenv('DOMAIN_BASE_URL')
-    user    = getattr(query, 'from_user', query.message.from_user)
-    sync_link = f"{domain}/login?telegram_id={user.id}&meeting_id={meeting_id}"
-
-    # build label
-    label = f"{minutes_before//60}h" + (f"{minutes_before%60}m" if minutes_before%60 else "")
-
-    # include both the Outlook link AND the reminder line
-    final_text = (
-        f"📋 Final Summary:\n\n"
-        f"{meeting.summary}\n\n"
-        f"🔗 [🗓️ Click here to add to Outlook Calendar]({sync_link})\n\n"
-        f"⏰ Reminder set: {label} before meeting"
-    )
-
-    buttons = [
-        [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=f'edit:{meeting_id}')],
-        [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=f'delete_prompt:{meeting_id}')],
-        [InlineKeyboardButton("❌ Cancel Reminder", callback_data=f"cancel_reminder:{meeting_id}")]
-    ]
+    # includes both the Outlook link AND the reminder line
+    view = render.put(render.MeetingView(meeting_id, meeting.chat_id, view_summary(meeting), minutes_before))
 
+    user = getattr(query, 'from_user', query.message.from_user)
     await query.edit_message_text(
-        text=final_text,
+        text=view.text(user.id),
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=view.keyboard
     )
 
+def next_reminder(meeting, minutes_before: int, overrides=None, after: datetime = None):
+    """
+    (Occurrence, remind_at) for the meeting's first occurrence whose
+    reminder is still ahead of `after` (default now), or None. Only the
+    next few occurrences of a recurring meeting are ever expanded.
+    """
+    after = after or datetime.now(pytz.timezone("Asia/Singapore"))
+    lead = timedelta(minutes=minutes_before)
+    time_str = extract_time_from_summary(meeting.summary)
+    for occurrence in recurrence.upcoming(meeting, overrides, start=(after + lead).date(), limit=3):
+        meeting_dt = parse_meeting_datetime(occurrence.meet_date, occurrence.time or time_str)
+        if meeting_dt and meeting_dt - lead > after:
+            return occurrence, meeting_dt - lead
+    return None
+
+def next_reminder_dues(fired):
+    """ReminderEngine.next_due: the following occurrence of each recurring meeting whose reminder just fired."""
+    ids = {r.meeting_id for r in fired}
+    db = SessionLocal()
+    meetings = {m.id: m for m in db.query(Meeting).filter(Meeting.id.in_(ids), Meeting.rrule.isnot(None))}
     db.close()
+    overrides = recurrence.load_overrides(meetings)
+    following = {}
+    for reminder in fired:
+        meeting = meetings.get(reminder.meeting_id)
+        if meeting is None:
+            continue
+        after = datetime.fromtimestamp(reminder.due, pytz.timezone("Asia/Singapore"))
+        upcoming = next_reminder(meeting, reminder.minutes_before, overrides.get(meeting.id), after)
+        if upcoming is not None:
+            following[meeting.id] = (upcoming[0].original_date, upcoming[1])
+    return following
+
+def refresh_reminder(bot, chat_id: int, meeting_id: int):
+    """Re-point an active reminder after the meeting's rule or one of its occurrences changed."""
+    minutes_before = reminder_minutes(meeting_id)
+    meeting = meeting_cache.get(meeting_id)
+    if minutes_before is None or meeting is None:
+        return
+    overrides = recurrence.load_overrides([meeting_id]).get(meeting_id) if meeting.rrule else None
+    upcoming = next_reminder(meeting, minutes_before, overrides)
+    if upcoming is None:
+        reminder_engine.cancel(meeting_id)
+        render.invalidate(meeting_id)
+        return
+    occurrence, remind_dt = upcoming
+    reminder_engine.schedule(bot, chat_id, meeting_id, minutes_before, remind_dt,
+                             occurrence.original_date if meeting.rrule else None)
 
 # --- the actual reminder action ---
 async def send_reminder(bot, chat_id: int, meeting_id: int, mins_before: int):
-    db = SessionLocal()
-    meeting = db.query(Meeting).filter_by(id=meeting_id).first()
-    if not meeting:
+    view = get_meeting_view(meeting_id)
+    if not view:
         return
-    text = f"⏰ Reminder: your meeting is in {mins_before} minutes!\n\n{meeting.summary}"
-    await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+    await bot.send_message(chat_id=chat_id, text=reminder_text(mins_before, view.summary), parse_mode="Markdown")
 
 def parse_custom_duration(text: str) -> int:
     """
@@ -674,9 +717,16 @@ def parse_custom_duration(text: str) -> int:
 
 
 # --- GOOGLE MAPS ---
+@instrument
 async def get_nearest_mrt(place):
+    return await venues.cached_lookup("mrt", place, _lookup_nearest_mrt)
+
+
+async def _lookup_nearest_mrt(place):
     try:
-        geo = gmaps.geocode(place)
+        gmaps = get_gmaps()
+        with timed("external_call", service="maps_geocode"):
+            geo = gmaps.geocode(place)
         if not geo:
             return "❌ Could not find location."
 
@@ -684,12 +734,14 @@ async def get_nearest_mrt(place):
         lat, lng = latlng["lat"], latlng["lng"]
 
         # Search for transit stations within 2km
-        results = gmaps.places_nearby(location=(lat, lng), radius=2000, type="subway_station")
+        with timed("external_call", service="maps_places"):
+            results = gmaps.places_nearby(location=(lat, lng), radius=2000, type="subway_station")
         stations = results.get("results", [])
 
         # If no subway_station found, try transit_station but filter for MRT in name
         if not stations:
-            results = gmaps.places_nearby(location=(lat, lng), radius=2000, type="transit_station")
+            with timed("external_call", service="maps_places"):
+                results = gmaps.places_nearby(location=(lat, lng), radius=2000, type="transit_station")
             candidates = results.get("results", [])
             # Filter to names containing "MRT" or known MRT keywords
             stations = [s for s in candidates if "mrt" in s["name"].lower()]
@@ -703,11 +755,12 @@ async def get_nearest_mrt(place):
 
         for station in stations:
             dest = station["geometry"]["location"]
-            distance_data = gmaps.distance_matrix(
-                [f"{lat},{lng}"],
-                [f"{dest['lat']},{dest['lng']}"],
-                mode="walking"
-            )
+            with timed("external_call", service="maps_distance"):
+                distance_data = gmaps.distance_matrix(
+                    [f"{lat},{lng}"],
+                    [f"{dest['lat']},{dest['lng']}"],
+                    mode="walking"
+                )
             element = distance_data["rows"][0]["elements"][0]
             if element["status"] == "OK":
                 dist_val = element["distance"]["value"]
@@ -729,9 +782,16 @@ async def get_nearest_mrt(place):
 
 
 
+@instrument
 async def find_nearest_bus_stop(location_name):
+    return await venues.cached_lookup("bus", location_name, _lookup_nearest_bus_stop)
+
+
+async def _lookup_nearest_bus_stop(location_name):
     try:
-        geocode_result = gmaps.geocode(location_name)
+        gmaps = get_gmaps()
+        with timed("external_call", service="maps_geocode"):
+            geocode_result = gmaps.geocode(location_name)
         if not geocode_result:
             return "❌ No bus stop nearby."
 
@@ -739,12 +799,13 @@ async def find_nearest_bus_stop(location_name):
         latlng = (location["lat"], location["lng"])
 
         # Increase radius to 1000 meters for better coverage
-        nearby_places = gmaps.places_nearby(
-            location=latlng,
-            radius=1000,
-            keyword="bus stop",
-            type="transit_station"
-        )
+        with timed("external_call", service="maps_places"):
+            nearby_places = gmaps.places_nearby(
+                location=latlng,
+                radius=1000,
+                keyword="bus stop",
+                type="transit_station"
+            )
 
         results = nearby_places.get("results", [])
         if not results:
@@ -756,11 +817,12 @@ async def find_nearest_bus_stop(location_name):
 
         for stop in results:
             dest = stop["geometry"]["location"]
-            distance_data = gmaps.distance_matrix(
-                [f"{latlng[0]},{latlng[1]}"],
-                [f"{dest['lat']},{dest['lng']}"],
-                mode="walking"
-            )
+            with timed("external_call", service="maps_distance"):
+                distance_data = gmaps.distance_matrix(
+                    [f"{latlng[0]},{latlng[1]}"],
+                    [f"{dest['lat']},{dest['lng']}"],
+                    mode="walking"
+                )
             element = distance_data["rows"][0]["elements"][0]
             if element["status"] == "OK":
                 dist_val = element["distance"]["value"]
@@ -781,43 +843,128 @@ async def find_nearest_bus_stop(location_name):
         return "❌ Error occurred during bus stop search."
     
 async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
     voice = update.message.voice
     user = update.message.from_user.full_name
-    chat_id = update.effective_chat.id
-    file = await context.bot.get_file(voice.file_id)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as ogg_file:
-        await file.download_to_drive(ogg_file.name)
-        ogg_path = ogg_file.name
+    # Forwarded or repeated voice notes: answer from the cache without queueing anything
+    cached = transcript_cache.by_file_id(voice.file_unique_id)
+    if cached is not None:
+        await deliver_transcript(context.bot, chat_id, update.effective_user.id, user, cached)
+        return
 
-    # Convert to mp3 using ffmpeg
-    mp3_path = ogg_path.replace(".ogg", ".mp3")
     try:
-        subprocess.run(["ffmpeg", "-y", "-i", ogg_path, "-ar", "16000", "-ac", "1", mp3_path], check=True)
-    except Exception as e:
-        await update.message.reply_text("❌ Audio conversion failed.")
-        print("FFmpeg error:", e)
+        position = await admission.transcriptions.admit(chat_id)
+    except admission.Busy:
+        await update.message.reply_text("🚦 Too many voice notes to transcribe right now, please try again shortly.")
         return
+    if position:
+        await update.message.reply_text(f"🎙️ Busy right now, your voice note is queued (about #{position} in line).")
+    jobs.enqueue("transcribe", {
+        "chat_id": chat_id,
+        "user_id": update.effective_user.id,
+        "user": user,
+        "file_id": voice.file_id,
+        "file_unique_id": voice.file_unique_id,
+        "duration": voice.duration,
+    }, key=f"chat:{chat_id}")
+
+def pending_voice(chat_id: int) -> bool:
+    return bool(late_transcripts.get(chat_id)) or jobs.has_pending("transcribe", key=f"chat:{chat_id}")
+
+async def deliver_transcript(bot, chat_id: int, user_id: int, user: str, transcription: str, message_id: int = None):
+    text = f"📝 *Transcription from {user}:*\n\n{transcription}"
+    if message_id is not None:
+        # Replace the partial transcript posted while a long note was chunked
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode="Markdown")
+    else:
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+
+    # Append to the listening session, or hold it for the summary if /stoplistening came first
+    session = listening_sessions.get(chat_id)
+    if session is None:
+        session = late_transcripts.setdefault(chat_id, {})
+    session.setdefault(user, []).append(f"[voice] {transcription}")
+    freebusy.remember_member(chat_id, user_id, user)
+
+async def on_transcribe_dead(payload, error):
+    if isinstance(error, subprocess.CalledProcessError):
+        print("FFmpeg error:", error.stderr)
+        text = "❌ Audio conversion failed."
+    else:
+        text = "❌ Failed to transcribe voice message."
+    await bot_app.bot.send_message(chat_id=payload["chat_id"], text=text)
+
+@jobs.handler("transcribe", priority=PRIORITY_HIGH, max_attempts=3, on_dead=on_transcribe_dead,
+              admission=admission.transcriptions)
+async def transcribe_job(payload):
+    chat_id, user = payload["chat_id"], payload["user"]
+    file_unique_id = payload.get("file_unique_id")
+    # The same file may have been transcribed while this job waited
+    transcription = transcript_cache.by_file_id(file_unique_id)
+    if transcription is not None:
+        await deliver_transcript(bot_app.bot, chat_id, payload["user_id"], user, transcription)
+        return
+
+    progress = {}
 
-    # Transcribe with OpenAI Whisper
-    transcription = await transcribe_with_whisper(mp3_path)
+    async def post_partial(text, done, total):
+        body = f"📝 *Transcription from {user}* ({done}/{total} parts):\n\n{text} …"
+        try:
+            if "message_id" in progress:
+                await bot_app.bot.edit_message_text(chat_id=chat_id, message_id=progress["message_id"],
+                                                    text=body, parse_mode="Markdown")
+            else:
+                message = await bot_app.bot.send_message(chat_id=chat_id, text=body, parse_mode="Markdown")
+                progress["message_id"] = message.message_id
+        except Exception as e:
+            print(f"⚠️ Couldn't post partial transcript: {e}")
 
-    if transcription:
-        await update.message.reply_text(f"📝 *Transcription from {user}:*\n\n{transcription}", parse_mode="Markdown")
+    with timed("external_call", service="telegram_file"):
+        file = await bot_app.bot.get_file(payload["file_id"])
 
-        # Append to listening session
-        if chat_id not in listening_sessions:
-            listening_sessions[chat_id] = {}
-        if user not in listening_sessions[chat_id]:
-            listening_sessions[chat_id][user] = []
-        listening_sessions[chat_id][user].append(f"[voice] {transcription}")
-    else:
-        await update.message.reply_text("❌ Failed to transcribe voice message.")
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as ogg_file:
+            await file.download_to_drive(ogg_file.name)
+            ogg_path = ogg_file.name
 
+    # Convert to mp3 using ffmpeg (in a thread: it runs for a while)
+    mp3_path = ogg_path.replace(".ogg", ".mp3")
+    try:
+        # Same audio uploaded again under a new file ID
+        audio_hash = await asyncio.to_thread(transcript_cache.sha256_file, ogg_path)
+        transcription = transcript_cache.by_hash(audio_hash)
+
+        if transcription is None and payload.get("duration", 0) >= audio_segments.CHUNK_MIN_SECONDS:
+            transcription = await audio_segments.transcribe_chunked(
+                ogg_path, payload["duration"], transcribe_with_whisper, on_progress=post_partial
+            )
+        elif transcription is None:
+            with timed("external_call", service="ffmpeg"):
+                await asyncio.to_thread(
+                    subprocess.run, ["ffmpeg", "-y", "-i", ogg_path, "-ar", "16000", "-ac", "1", mp3_path],
+                    check=True, capture_output=True
+                )
+
+            # Transcribe with OpenAI Whisper
+            transcription = await transcribe_with_whisper(mp3_path)
+    finally:
+        for path in (ogg_path, mp3_path):
+            if os.path.exists(path):
+                os.remove(path)
+    if not transcription:
+        raise RuntimeError("Whisper returned no transcription")  # retried by the job queue
+
+    # Also cached on a hash hit, so the next forward of this file skips the download
+    await asyncio.to_thread(transcript_cache.store, file_unique_id, audio_hash, transcription,
+                            payload.get("duration", 0))
+    await deliver_transcript(bot_app.bot, chat_id, payload["user_id"], user, transcription,
+                             message_id=progress.get("message_id"))
+
+@instrument
 async def transcribe_with_whisper(audio_file_path):
     try:
         OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-        url = "https://api.openai.com/v1/audio/transcriptions"
+        url = f"{OPENAI_BASE_URL}/audio/transcriptions"
         headers = {
             "Authorization": f"Bearer {OPENAI_API_KEY}"
         }
@@ -829,13 +976,15 @@ async def transcribe_with_whisper(audio_file_path):
                 form.add_field("model", "whisper-1")
                 form.add_field("language", "en")  # Force English transcription
 
-                async with session.post(url, headers=headers, data=form) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        return result.get("text")
-                    else:
-                        print("Whisper API failed:", await resp.text())
-                        return None
+                with timed("external_call", service="whisper"):
+                    async with session.post(url, headers=headers, data=form) as resp:
+                        if resp.status == 200:
+                            result = await resp.json()
+                            return result.get("text")
+                        else:
+                            inc("external_call_errors_total", service="whisper")
+                            print("Whisper API failed:", await resp.text())
+                            return None
     except Exception as e:
         print("Whisper transcription error:", e)
         return None
@@ -844,12 +993,39 @@ async def transcribe_with_whisper(audio_file_path):
 
 # --- PROCESSING WITH GPT ---
 
-async def process_availability(update: Update, context: ContextTypes.DEFAULT_TYPE, chat_id: int):
-    group_data = listening_sessions.get(chat_id, {})
+async def on_summarize_dead(payload, error):
+    error_msg = getattr(error, 'response', str(error))
+    await bot_app.bot.send_message(chat_id=payload["chat_id"], text=f"❌ Error processing with GPT:\n{error_msg}")
+
+@jobs.handler("summarize", max_attempts=3, on_dead=on_summarize_dead, admission=admission.summaries)
+async def summarize_job(payload):
+    chat_id = payload["chat_id"]
+    late = {user: list(messages) for user, messages in late_transcripts.get(chat_id, {}).items()}
+    group_data = {user: list(messages) for user, messages in payload["group_data"].items()}
+    for user, messages in late.items():
+        group_data.setdefault(user, []).extend(messages)
     if not group_data:
-        await update.message.reply_text("❌ No messages were collected.")
+        await bot_app.bot.send_message(chat_id=chat_id, text="❌ No messages were collected.")
         return
+    await process_availability(bot_app.bot, bot_app.chat_data[chat_id], chat_id, payload["user_id"], group_data)
+    # Only now: a failed attempt, or one cancelled by a drain, is retried with them
+    consume_late_transcripts(chat_id, late)
+
+def consume_late_transcripts(chat_id: int, used: dict):
+    """Drop the late transcripts a summary used, keeping any that arrived while it ran."""
+    pending = late_transcripts.get(chat_id, {})
+    for user, messages in used.items():
+        remaining = pending.get(user, [])[len(messages):]
+        if remaining:
+            pending[user] = remaining
+        else:
+            pending.pop(user, None)
+    if not pending:
+        late_transcripts.pop(chat_id, None)
 
+@instrument
+async def process_availability(bot, chat_data, chat_id: int, user_id: int, group_data: dict):
+    """Summarize a listening session and post it. Upstream errors propagate so the job is retried."""
     today = date.today()
     today_str = today.strftime('%A, %B %d, %Y')
 
@@ -872,119 +1048,175 @@ async def process_availability(update: Update, context: ContextTypes.DEFAULT_TYP
         "Do not use HTML or Markdown formatting."
     )
 
+    # Solve the date/time locally; the model only has to pick from these.
+    # Linked Outlook calendars veto slots their owners are busy for.
+    busy = await freebusy.busy_by_member(chat_id)
+    with timed("availability_solve"):
+        windows = availability.extract_windows(group_data, today)
+        slots = availability.rank_slots(windows)
+        if busy:
+            slots = freebusy.rerank(slots, busy)
+    if slots:
+        prompt += (
+            "\n\nCandidate time slots computed from everyone's stated availability (best first):\n"
+            f"{availability.format_candidates(slots, len(group_data))}\n"
+            "Use candidate 1 for the date and time unless the chat clearly agreed on another candidate.\n\n"
+        )
+
     for user, messages in group_data.items():
         prompt += f"{user}:\n"
         for msg in messages:
             prompt += f"- {msg}\n"
         prompt += "\n"
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        summary = response.choices[0].message.content
-
-        # Extract the date from messages and GPT output
-        meet_date = extract_meeting_date(group_data, summary, today)
-        time_str  = extract_time_from_summary(summary)
-        meeting_dt = parse_meeting_datetime(meet_date, time_str)
-        now = datetime.now(pytz.timezone("Asia/Singapore"))
-        if meeting_dt and meeting_dt < now:
-            await update.message.reply_text(
-                "❌ The proposed meeting time "
-                f"({meet_date} {time_str}) has already passed—"
-                "please agree a future date/time and try again."
-            )
-            return
+    # Short sessions with a clear best slot go to the fast model (see model_router.py)
+    summary, _ = await summary_router.complete(
+        prompt, simple=model_router.is_simple(group_data, slots), validate=summary_is_complete
+    )
 
-        # Try to extract place line and fetch nearest MRT
-        place = None
-        for line in summary.split('\n'):
-            if "place" in line.lower():
-                place = line.split(":")[-1].strip()
-                break
+    # Extract the date from messages and GPT output
+    meet_date = extract_meeting_date(group_data, summary, today)
+    time_str  = extract_time_from_summary(summary)
+    meeting_dt = parse_meeting_datetime(meet_date, time_str)
+    now = datetime.now(pytz.timezone("Asia/Singapore"))
+    if meeting_dt and meeting_dt < now:
+        await bot.send_message(
+            chat_id=chat_id,
+            text="❌ The proposed meeting time "
+            f"({meet_date} {time_str}) has already passed—"
+            "please agree a future date/time and try again."
+        )
+        return
 
-        if place:
-            mrt_info = await get_nearest_mrt(place)
-            google_maps_url = f"https://www.google.com/maps/search/?api=1&query={place.replace(' ', '+')}"
-            new_lines = []
-            for line in summary.split('\n'):
-                if "place" in line.lower():
-                    new_line = f"{line.strip()} (Nearest MRT = {mrt_info})"
-                    new_lines.append(new_line)
-                    new_lines.append(f"🌐 Map: {google_maps_url}")
-                else:
-                    new_lines.append(line)
-            summary = "\n".join(new_lines)
+    if busy and meeting_dt:
+        summary += "\n" + freebusy.annotation(busy, meeting_dt.replace(tzinfo=None))
 
-        # Save to DB
-        db = SessionLocal()
-        meeting = Meeting(chat_id=chat_id, summary=summary, meet_date=meet_date)
-        db.add(meeting)
-        db.commit()
-        sync_link = f"{os.getenv('DOMAIN_BASE_URL')}/login?telegram_id={update.effective_user.id}&meeting_id={meeting.id}"
-        final_message = (
-            f"📋 Final Summary:\n\n{summary}\n\n"
-            f"🔗 [🗓️ Click here to add to Outlook Calendar]({sync_link})"
-        )
+    # Try to extract place line and fetch nearest MRT
+    place = None
+    for line in summary.split('\n'):
+        if "place" in line.lower():
+            place = line.split(":")[-1].strip()
+            break
 
-        await send_final_summary_with_buttons(context, chat_id, final_message, meeting.id)
+    if place:
+        mrt_info = await get_nearest_mrt(place)
+        google_maps_url = f"https://www.google.com/maps/search/?api=1&query={place.replace(' ', '+')}"
+        new_lines = []
+        for line in summary.split('\n'):
+            if "place" in line.lower():
+                new_line = f"{line.strip()} (Nearest MRT = {mrt_info})"
+                new_lines.append(new_line)
+                new_lines.append(f"🌐 Map: {google_maps_url}")
+            else:
+                new_lines.append(line)
+        summary = "\n".join(new_lines)
 
+    # Save to DB
+    db = SessionLocal()
+    meeting = Meeting(chat_id=chat_id, summary=summary, meet_date=meet_date)
+    search.index_fields(meeting)
+    db.add(meeting)
+    db.commit()
+    view = render.put(render.MeetingView(meeting.id, chat_id, summary))
+    db.close()
 
+    # The meeting is saved: a retry from here on would duplicate it
+    try:
+        await send_final_summary_with_buttons(bot, chat_data, chat_id, view, user_id, meet_date)
     except Exception as e:
-        error_msg = getattr(e, 'response', str(e))
-        await update.message.reply_text(f"❌ Error processing with GPT:\n{error_msg}")
-
-def escape_ics_text(text: str) -> str:
-    """
-    Escapes characters according to RFC 5545 so that calendar apps can parse it correctly.
-    """
-    return (
-        text.replace('\\', '\\\\')  # Escape backslash
-            .replace('\n', '\\n')   # Escape newlines
-            .replace(',', '\\,')    # Escape commas
-            .replace(';', '\\;')    # Escape semicolons
-    )
+        print(f"❌ Could not post summary for meeting {view.meeting_id}: {e}")
 
 def create_ics_file(meeting_title: str,
                     description: str,
                     start_time: datetime,
-                    duration_minutes: int = 60) -> BytesIO:
+                    duration_minutes: int = 60,
+                    uid: str = None) -> BytesIO:
     """
     Builds an .ics file in memory and returns it as a BytesIO buffer
     named 'meeting.ics', ready to send as an attachment.
     """
-    # 1) Ensure tz-aware
     if start_time.tzinfo is None:
         start_time = pytz.timezone("Asia/Singapore").localize(start_time)
+    if uid is None:
+        # Stable for the same invite, so re-sending it updates rather than duplicates the event
+        digest = hashlib.sha1(f"{meeting_title}|{start_time.isoformat()}|{description}".encode()).hexdigest()
+        uid = f"{digest[:16]}@meetcoord.local"
+    event = Event(uid, meeting_title, description, start_time, start_time + timedelta(minutes=duration_minutes))
+    return calendar_file([event])
+
+def meeting_events(meeting, overrides=None, duration_minutes: int = 60):
+    """
+    ics_writer.Events for a saved meeting ([] if its date/time can't be
+    parsed). A recurring meeting is one event with its RRULE, cancelled
+    occurrences as EXDATEs, plus one RECURRENCE-ID event per changed one.
+    """
+    time_str = extract_time_from_summary(meeting.summary)
+    start = parse_meeting_datetime(meeting.meet_date, time_str)
+    if start is None:
+        return []
+    place = meeting.place
+    if not place:
+        for line in meeting.summary.splitlines():
+            if line.startswith("📍 Place:"):
+                place = line.split("📍 Place:")[1].strip()
+                break
+    duration = timedelta(minutes=duration_minutes)
+    uid = f"meeting-{meeting.id}@meetcoord.local"
+    title = meeting.activity or "Group Meeting"
+    # created_at is stored as naive UTC; ics_writer reads naive datetimes as Singapore time
+    stamp = pytz.utc.localize(meeting.created_at) if meeting.created_at else None
+    if not meeting.rrule:
+        return [Event(uid, title, meeting.summary, start, start + duration, place, stamp)]
+
+    overrides = overrides or {}
+    def rule_start(day):
+        return pytz.timezone("Asia/Singapore").localize(datetime.combine(day, start.time()))
+
+    exdates = tuple(rule_start(day) for day, o in sorted(overrides.items()) if o.cancelled)
+    events = [Event(uid, title, view_summary(meeting), start, start + duration, place, stamp,
+                    recurrence.ics_rule(meeting.rrule), exdates)]
+    for day, override in sorted(overrides.items()):
+        if override.cancelled:
+            continue
+        occurrence = recurrence.Occurrence(meeting.id, day, override.meet_date or day, override.time, override.place)
+        moved = parse_meeting_datetime(occurrence.meet_date, occurrence.time or time_str)
+        if moved is None:
+            continue
+        events.append(Event(uid, title, recurrence.occurrence_summary(meeting.summary, occurrence), moved,
+                            moved + duration, override.place or place, stamp,
+                            recurrence_id=rule_start(day)))
+    return events
+
+async def export_meetings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/exportmeetings: every saved meeting of the chat as one .ics file."""
+    chat_id = update.effective_chat.id
+    db = SessionLocal()
+    meetings = db.query(Meeting).filter_by(chat_id=chat_id).order_by(Meeting.meet_date, Meeting.id).all()
+    db.close()
 
-    # 2) Build Calendar + Event
-    cal = Calendar()
-    ev = IcsEvent()
-    ev.name        = meeting_title.strip()
-    ev.begin       = start_time
-    ev.duration    = timedelta(minutes=duration_minutes)
-    ev.description = description
-    ev.uid         = f"{uuid.uuid4()}@meetcoord.local"
-    # use a timezone-aware UTC now
-    ev.created     = datetime.now(timezone.utc)
-
-    cal.events.add(ev)
-
-    # 3) Serialize to bytes and wrap in BytesIO
-    ics_bytes = cal.serialize().encode("utf-8")
-    buf = BytesIO(ics_bytes)
-    buf.name = "meeting.ics"  # Telegram will use this as filename
-    buf.seek(0)
-    return buf
+    overrides = recurrence.load_overrides(m.id for m in meetings if m.rrule)
+    events = [event for m in meetings for event in meeting_events(m, overrides.get(m.id))]
+    if not events:
+        await update.message.reply_text("📭 No saved meetings with a date and time to export.")
+        return
+
+    buf = await jobs.run_cpu(calendar_file, events, "meetings.ics")
+    await context.bot.send_document(
+        chat_id=chat_id,
+        document=InputFile(buf, filename=buf.name),
+        caption=f"📅 {len(events)} meeting(s). Open to add them all to your calendar."
+    )
 
 async def list_meetings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     db = SessionLocal()
     meetings = db.query(Meeting).filter_by(chat_id=chat_id).all()
+    # Warm the cache: the next click is usually on one of these
+    for m in meetings:
+        meeting_cache.put(snapshot_meeting(m))
     db.close()
+    overrides = recurrence.load_overrides(m.id for m in meetings if m.rrule)
+    today = datetime.now(pytz.timezone("Asia/Singapore")).date()
 
     if not meetings:
         await context.bot.send_message(
@@ -1005,14 +1237,26 @@ async def list_meetings(update: Update, context: ContextTypes.DEFAULT_TYPE):
             elif line.startswith("📍 Place:"):
                 place_str = line.split("📍 Place:")[1].strip()
 
-        header = f"🆔 *ID {m.id}* | 📅 *{date_str}* | 🕒 *{time_str}* | 📍 *{place_str}*"
+        repeat_str = ""
+        if m.rrule:
+            # Only the next occurrence is expanded
+            upcoming = recurrence.upcoming(m, overrides.get(m.id), start=today)
+            if upcoming:
+                date_str = f"next {upcoming[0].meet_date.strftime('%b %d')}"
+                time_str = upcoming[0].time or time_str
+                place_str = upcoming[0].place or place_str
+            else:
+                date_str = "ended"
+            repeat_str = f" | 🔁 {recurrence.describe(m.rrule)}"
+
+        header = f"🆔 *ID {m.id}*{repeat_str} | 📅 *{date_str}* | 🕒 *{time_str}* | 📍 *{place_str}*"
 
         # Four buttons: View, Edit, Delete, Set Reminder
         buttons = [[
-            InlineKeyboardButton("👁️ View",         callback_data=f"view:{m.id}"),
-            InlineKeyboardButton("✏️ Edit",         callback_data=f"edit:{m.id}"),
-            InlineKeyboardButton("🗑️ Delete",       callback_data=f"delete_prompt:{m.id}"),
-            InlineKeyboardButton("⏰ Reminder",      callback_data=f"setreminder:{m.id}")
+            InlineKeyboardButton("👁️ View",         callback_data=encode_callback("view", m.id)),
+            InlineKeyboardButton("✏️ Edit",         callback_data=encode_callback("edit", m.id)),
+            InlineKeyboardButton("🗑️ Delete",       callback_data=encode_callback("delete_prompt", m.id)),
+            InlineKeyboardButton("⏰ Reminder",      callback_data=encode_callback("setreminder", m.id))
         ]]
         markup = InlineKeyboardMarkup(buttons)
 
@@ -1025,10 +1269,49 @@ async def list_meetings(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+async def find_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/findmeeting <text>: ranked search over the chat's meetings."""
+    query_text = " ".join(context.args or [])
+    if not search.terms(query_text):
+        await update.message.reply_text("❌ Usage: /findmeeting <place, activity or anything in the summary>")
+        return
+    text, markup = render_search_page(update.effective_chat.id, query_text, 0, context.chat_data)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=markup)
+
+def render_search_page(chat_id: int, query_text: str, offset: int, chat_data):
+    hits, has_more = search.search(chat_id, query_text, offset)
+    if not hits:
+        return (f"🔎 No meetings match _{query_text}_." if offset == 0 else "🔎 No more results."), None
+
+    lines = [f"🔎 Results for _{query_text}_ ({offset + 1}–{offset + len(hits)}):", ""]
+    buttons = []
+    for hit in hits:
+        date_str = hit.meet_date.strftime('%d %b %Y') if hit.meet_date else "?"
+        time_str = extract_time_from_summary(hit.summary or "") or "?"
+        lines.append(f"🆔 *{hit.id}* | 📅 {date_str} | 🕒 {time_str} | 📍 {hit.place or '?'}"
+                     + (f" | 🎯 {hit.activity}" if hit.activity else ""))
+        buttons.append([InlineKeyboardButton(f"👁️ View #{hit.id}", callback_data=encode_callback("view", hit.id))])
+
+    if has_more:
+        # The query rides in the button when it fits; otherwise the chat remembers it
+        extra = query_text.encode()
+        try:
+            data = encode_callback("findmore", 0, offset + len(hits), extra)
+        except ValueError:
+            chat_data["search_text"] = query_text
+            data = encode_callback("findmore", 0, offset + len(hits))
+        buttons.append([InlineKeyboardButton("More ▶️", callback_data=data)])
+    return "\n".join(lines), InlineKeyboardMarkup(buttons)
+
+@callback_router.route("findmore")
+async def on_find_more(update, context, query, cb):
+    query_text = cb.extra.decode(errors="ignore") or context.chat_data.get("search_text", "")
+    text, markup = render_search_page(query.message.chat.id, query_text, cb.arg, context.chat_data)
+    return await query.edit_message_text(text=text, parse_mode="Markdown", reply_markup=markup)
+
+
 async def perform_edit_start(user_id, chat_id, meeting_id, context):
-    db = SessionLocal()
-    meeting = db.query(Meeting).filter_by(id=meeting_id, chat_id=chat_id).first()
-    if not meeting:
+    if not meeting_cache.get(meeting_id, chat_id=chat_id):
         return False
 
     editing_sessions[user_id] = {
@@ -1038,15 +1321,15 @@ async def perform_edit_start(user_id, chat_id, meeting_id, context):
 
     buttons = [
         [
-            InlineKeyboardButton("📅 Date", callback_data=f"editfield:{meeting_id}:date"),
-            InlineKeyboardButton("🕒 Time", callback_data=f"editfield:{meeting_id}:time")
+            InlineKeyboardButton("📅 Date", callback_data=encode_callback("editfield", meeting_id, "date")),
+            InlineKeyboardButton("🕒 Time", callback_data=encode_callback("editfield", meeting_id, "time"))
         ],
         [
-            InlineKeyboardButton("📍 Place", callback_data=f"editfield:{meeting_id}:place"),
-            InlineKeyboardButton("👥 Pax", callback_data=f"editfield:{meeting_id}:pax")
+            InlineKeyboardButton("📍 Place", callback_data=encode_callback("editfield", meeting_id, "place")),
+            InlineKeyboardButton("👥 Pax", callback_data=encode_callback("editfield", meeting_id, "pax"))
         ],
         [
-            InlineKeyboardButton("🎯 Activity", callback_data=f"editfield:{meeting_id}:activity")
+            InlineKeyboardButton("🎯 Activity", callback_data=encode_callback("editfield", meeting_id, "activity"))
         ]
     ]
 
@@ -1073,13 +1356,125 @@ async def start_edit_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except ValueError:
         await update.message.reply_text("⚠️ Invalid meeting ID.")
 
+async def repeat_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/repeatmeeting <id> <weekly|every 2 weeks|monthly until 31 Dec|...|off>: make a meeting recurring."""
+    args = context.args or []
+    if len(args) < 2 or not args[0].isdigit():
+        await update.message.reply_text(
+            "❌ Usage: /repeatmeeting <meeting_id> <daily|weekdays|weekly|fortnightly|monthly|off>\n"
+            "Add `until 31 Dec` or `x 10` to end it.",
+            parse_mode="Markdown"
+        )
+        return
+
+    chat_id = update.effective_chat.id
+    meeting_id = int(args[0])
+    rule_text = " ".join(args[1:])
+    db = SessionLocal()
+    try:
+        meeting = db.query(Meeting).filter_by(id=meeting_id, chat_id=chat_id).first()
+        if not meeting:
+            await update.message.reply_text("❌ Meeting not found.")
+            return
+        if not meeting.meet_date:
+            await update.message.reply_text("❌ Give the meeting a date first (/editmeeting).")
+            return
+
+        if rule_text.lower() in ("off", "none", "stop"):
+            meeting.rrule = meeting.recur_until = None
+            reply = f"✅ Meeting {meeting_id} no longer repeats."
+        else:
+            try:
+                meeting.rrule = recurrence.parse_rule(rule_text, meeting.meet_date)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {e}")
+                return
+            meeting.recur_until = recurrence.last_date(meeting.rrule, meeting.meet_date)
+            reply = f"🔁 Meeting {meeting_id} now repeats {recurrence.describe(meeting.rrule)}."
+        db.commit()
+    finally:
+        db.close()
+
+    invalidate_meeting(meeting_id)
+    refresh_reminder(context.bot, chat_id, meeting_id)
+    await update.message.reply_text(reply)
+
+
+OCCURRENCE_ACTIONS = ("skip", "cancel", "restore", "time", "place", "date")
+
+def parse_day(text: str):
+    """A date typed in chat: ISO, or day first like `19/8` or `19 Aug`. None if unreadable."""
+    try:
+        return date.fromisoformat(text.strip())
+    except ValueError:
+        parsed = dateparser.parse(text, settings={"DATE_ORDER": "DMY"})
+        return parsed.date() if parsed else None
+
+async def edit_occurrence(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/editoccurrence <id> <date> skip|restore|time <time>|place <place>|date <new date>: change one occurrence."""
+    args = context.args or []
+    action_at = next((i for i, arg in enumerate(args) if i >= 2 and arg.lower() in OCCURRENCE_ACTIONS), None)
+    if not args or not args[0].isdigit() or action_at is None:
+        await update.message.reply_text(
+            "❌ Usage: /editoccurrence <meeting_id> <date> skip | restore | time <time> | place <place> | date <new date>"
+        )
+        return
+
+    chat_id = update.effective_chat.id
+    meeting_id = int(args[0])
+    meeting = meeting_cache.get(meeting_id, chat_id=chat_id)
+    if not meeting or not meeting.rrule:
+        await update.message.reply_text("❌ No recurring meeting with that ID here. See /repeatmeeting.")
+        return
+
+    occurrence_date = parse_day(" ".join(args[1:action_at]))
+    if not occurrence_date or not recurrence.is_occurrence(meeting, occurrence_date):
+        await update.message.reply_text("❌ The meeting doesn't happen on that date.")
+        return
+    label = occurrence_date.strftime("%d %b %Y")
+    action, value = args[action_at].lower(), " ".join(args[action_at + 1:]).strip()
+
+    if action == "restore":
+        recurrence.clear_override(meeting_id, occurrence_date)
+        reply = f"✅ The {label} meeting is back to normal."
+    elif action in ("skip", "cancel"):
+        recurrence.save_override(meeting_id, occurrence_date, cancelled=True)
+        reply = f"🚫 The {label} meeting is cancelled."
+    elif not value:
+        await update.message.reply_text(f"❌ Please give the new {action}.")
+        return
+    elif action == "time":
+        if not dateparser.parse(value):
+            await update.message.reply_text("❌ Invalid time. Please enter like `7pm` or `19:30`.")
+            return
+        recurrence.save_override(meeting_id, occurrence_date, cancelled=False, time=value)
+        reply = f"🕒 The {label} meeting is now at {value}."
+    elif action == "place":
+        recurrence.save_override(meeting_id, occurrence_date, cancelled=False, place=value)
+        reply = f"📍 The {label} meeting is now at {value}."
+    else:
+        moved = parse_day(value)
+        if not moved or abs((moved - occurrence_date).days) > recurrence.MAX_MOVE_DAYS:
+            await update.message.reply_text(
+                f"❌ Invalid date. An occurrence can move at most {recurrence.MAX_MOVE_DAYS} days.")
+            return
+        recurrence.save_override(meeting_id, occurrence_date, cancelled=False, meet_date=moved)
+        reply = f"📅 The {label} meeting moves to {moved.strftime('%d %b %Y')}."
+
+    refresh_reminder(context.bot, chat_id, meeting_id)
+    await update.message.reply_text(reply)
+
+
 async def perform_meeting_deletion(chat_id, meeting_id, context):
     db = SessionLocal()
     meeting = db.query(Meeting).filter_by(id=meeting_id, chat_id=chat_id).first()
     if meeting:
         db.delete(meeting)
         db.commit()
+        db.close()
+        forget_meetings([meeting_id])
         return True
+    db.close()
     return False
 
 
@@ -1103,51 +1498,204 @@ async def delete_meeting(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def clear_meetings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     db = SessionLocal()
-    deleted_count = db.query(Meeting).filter(Meeting.chat_id == chat_id).delete()
-    db.commit()
+    has_meetings = db.query(Meeting.id).filter(Meeting.chat_id == chat_id).first() is not None
     db.close()
-
-    if deleted_count > 0:
-        await context.bot.send_message(chat_id=chat_id, text=f"🧹 Cleared {deleted_count} meeting(s) from *this chat*.", parse_mode="Markdown")
-    else:
+    if not has_meetings:
         await context.bot.send_message(chat_id=chat_id, text="ℹ️ No meetings found to delete in this chat.")
+        return
+
+    # Large chats are deleted in batches off the event loop (see retention.py)
+    context.application.create_task(clear_chat_meetings(context.bot, chat_id))
+
+
+async def clear_chat_meetings(bot, chat_id: int):
+    deleted_count = await retention.purge_chat(chat_id, on_removed=forget_meetings)
+    meeting_cache.invalidate_chat(chat_id)
+    render.invalidate_chat(chat_id)
+    await bot.send_message(chat_id=chat_id, text=f"🧹 Cleared {deleted_count} meeting(s) from *this chat*.", parse_mode="Markdown")
+
+
+async def run_retention():
+    try:
+        await retention.apply_retention(on_removed=forget_meetings)
+    except Exception as e:
+        print(f"❌ Retention run failed: {e}")
+
+# --- ADMIN ---
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        await update.message.reply_text("⛔ This command is for bot admins only.")
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else 10.0
+    except ValueError:
+        await update.message.reply_text("❌ Usage: /profile [seconds]")
+        return
+
+    seconds = min(seconds, profiler.MAX_SECONDS)
+    await update.message.reply_text(f"🔬 Profiling the bot for {seconds:g}s...")
+    # Run in the background so this handler doesn't hold up other updates
+    context.application.create_task(send_profile(context.bot, update.effective_chat.id, seconds))
+
+
+async def send_profile(bot, chat_id: int, seconds: float):
+    try:
+        result = await profiler.run_profile(seconds)
+    except RuntimeError as e:
+        await bot.send_message(chat_id=chat_id, text=f"⚠️ {e}")
+        return
+
+    lag = result["loop_lag_ms"]
+    top = "\n".join(f"• {frame} — {n}" for frame, n in profiler.top_frames(result["collapsed"]))
+    await bot.send_message(
+        chat_id=chat_id,
+        text=(
+            f"🔬 Profile: {result['samples']} samples over {result['seconds']}s\n"
+            f"⏱️ Event-loop lag (ms): p50 {lag['p50']}, p99 {lag['p99']}, max {lag['max']}\n\n"
+            f"Hottest frames:\n{top}"
+        )
+    )
+
+    buf = BytesIO(result["collapsed"].encode("utf-8"))
+    buf.name = "profile.collapsed"
+    await bot.send_document(
+        chat_id=chat_id,
+        document=InputFile(buf, filename=buf.name),
+        caption="🔥 Collapsed stacks — open with speedscope or flamegraph.pl"
+    )
+
+# --- OUTLOOK SYNC (enqueued by the auth server's OAuth callback) ---
+async def on_outlook_event_dead(payload, error):
+    # The OAuth page already said the meeting was on its way. A private chat only
+    # works if the user has messaged the bot, so fall back to the meeting's group.
+    text = f"❌ Couldn't add the meeting to your Outlook Calendar:\n{error}"
+    for chat_id in (payload["telegram_user_id"], payload.get("chat_id")):
+        if chat_id is None:
+            continue
+        try:
+            await bot_app.bot.send_message(chat_id=chat_id, text=text)
+            return
+        except Exception as e:
+            print(f"❌ Could not report the failed Outlook sync to {chat_id}: {e}")
+
+@jobs.handler("outlook_event", priority=PRIORITY_LOW, on_dead=on_outlook_event_dead)
+async def outlook_event_job(payload):
+    import auth_server  # FastAPI is only needed here, not at bot startup
+    meeting = meeting_cache.fresh(payload["meeting_id"])  # what goes to Outlook must be current
+    if not meeting:
+        return
+    await asyncio.to_thread(auth_server.create_outlook_event, payload["telegram_user_id"], meeting)
+
+# --- RESTART HANDOFF (see drain.py) ---
+def checkpoint_state():
+    """In-memory state worth handing to the next instance, as JSON-ready lists."""
+    return {
+        "listening_sessions": [{"chat_id": c, "messages": m} for c, m in listening_sessions.items()],
+        "late_transcripts": [{"chat_id": c, "messages": m} for c, m in late_transcripts.items()],
+        "editing_sessions": [{"user_id": u, **session} for u, session in editing_sessions.items()],
+        "reminders": reminder_engine.checkpoint(),
+    }
+
+@jobs.handler(drain.CHECKPOINT_JOB, priority=PRIORITY_HIGH)
+async def restore_state_job(payload):
+    # Messages that reached this instance first stay after the handed-over ones
+    for item in payload.get("listening_sessions", []):
+        session = listening_sessions.setdefault(item["chat_id"], {})
+        for user, messages in item["messages"].items():
+            session[user] = messages + session.get(user, [])
+    for item in payload.get("late_transcripts", []):
+        session = late_transcripts.setdefault(item["chat_id"], {})
+        for user, messages in item["messages"].items():
+            session[user] = messages + session.get(user, [])
+    for item in payload.get("editing_sessions", []):
+        editing_sessions.setdefault(item["user_id"], {k: v for k, v in item.items() if k != "user_id"})
+    reminder_engine.restore(bot_app.bot, payload.get("reminders", []))
+    print(f"♻️ Restored {len(payload.get('listening_sessions', []))} listening session(s) and "
+          f"{len(payload.get('reminders', []))} reminder(s) from the previous instance")
 
 # --- APP SETUP ---
-async def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-
-    # Commands for control
-    app.add_handler(ChatMemberHandler(welcome_on_add, chat_member_types=["member"]))
-    app.add_handler(CommandHandler("startlistening", start_listening))
-    app.add_handler(CommandHandler("stoplistening", stop_listening))
-    app.add_handler(CommandHandler("listmeetings", list_meetings))
-    app.add_handler(CommandHandler("deletemeeting", delete_meeting))
-    app.add_handler(CommandHandler("editmeeting", start_edit_meeting))
-    app.add_handler(CommandHandler("clearmeetings", clear_meetings)) 
-    app.add_handler(CallbackQueryHandler(meeting_button_handler))
-    app.add_handler(MessageHandler(filters.VOICE, handle_voice_message))
+def build_application():
+    global bot_app
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    if TELEGRAM_FILE_BASE_URL:
+        builder = builder.base_file_url(TELEGRAM_FILE_BASE_URL)
+    # Chats run in parallel; each chat's (and user's) updates stay in order
+    builder = builder.concurrent_updates(ChatOrderedUpdateProcessor())
+    app = builder.build()
+
+    # Commands for control (every callback is wrapped for latency metrics)
+    app.add_handler(ChatMemberHandler(instrument_handler(welcome_on_add), chat_member_types=["member"]))
+    app.add_handler(CommandHandler("startlistening", instrument_handler(start_listening)))
+    app.add_handler(CommandHandler("stoplistening", instrument_handler(stop_listening)))
+    app.add_handler(CommandHandler("listmeetings", instrument_handler(list_meetings)))
+    app.add_handler(CommandHandler("exportmeetings", instrument_handler(export_meetings)))
+    app.add_handler(CommandHandler("findmeeting", instrument_handler(find_meeting)))
+    app.add_handler(CommandHandler("deletemeeting", instrument_handler(delete_meeting)))
+    app.add_handler(CommandHandler("editmeeting", instrument_handler(start_edit_meeting)))
+    app.add_handler(CommandHandler("repeatmeeting", instrument_handler(repeat_meeting)))
+    app.add_handler(CommandHandler("editoccurrence", instrument_handler(edit_occurrence)))
+    app.add_handler(CommandHandler("clearmeetings", instrument_handler(clear_meetings)))
+    app.add_handler(CommandHandler("profile", instrument_handler(profile_command)))
+    app.add_handler(CallbackQueryHandler(instrument_handler(meeting_button_handler)))
+    app.add_handler(MessageHandler(filters.VOICE, instrument_handler(handle_voice_message)))
 
     # Passive message tracking
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_group_message))
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), instrument_handler(handle_group_message)))
+    bot_app = app
+    return app
 
+
+async def start_bot():
+    """Build the bot, start the scheduler and begin polling. Returns the Application."""
+    app = build_application()
+    scheduler = get_scheduler()
+    scheduler.add_job(run_retention, "interval", hours=24, id="retention",
+                      next_run_time=datetime.now(timezone.utc) + timedelta(minutes=5), replace_existing=True)
     scheduler.start()
     await app.initialize()
+    await jobs.start()
+    await asyncio.to_thread(venues.venues.load)
+    if METRICS_PORT:
+        app.bot_data["metrics_server"] = await metrics.serve(METRICS_PORT)
+        print(f"📈 Metrics on :{METRICS_PORT}/metrics")
 
     print("✅ Bot is running and ready for group chat...")
 
     # Start polling
     await app.start()
     await app.updater.start_polling()
+    return app
+
+
+async def stop_bot(app):
+    """Drain in-flight updates and jobs, hand the rest to the next instance, then stop."""
+    await drain.shutdown(app, jobs, checkpoint_state)
+    metrics_server = app.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+    scheduler = get_scheduler()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await app.stop()
+    await app.shutdown()
+
+
+async def main():
+    app = await start_bot()
 
-    # Keep the application running
+    # Run until the process manager asks us to stop (SIGTERM) or Ctrl+C
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
     try:
-        await asyncio.Event().wait()
-    except KeyboardInterrupt:
+        await stop.wait()
         print("🛑 Shutting down...")
     finally:
-        await app.updater.stop()
-        await app.stop()
-        await app.shutdown()
+        await stop_bot(app)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Admission control for expensive background work (GPT summaries, Whisper
+transcription).
+
+Each controller caps how many jobs of its kind run at once (enforced by
+the job queue when claiming work), how many may wait, and how many one chat
+may have in flight, so a burst from one group cannot crowd out the rest.
+Jobs are keyed by chat, so a chat never runs two at once and the queue
+takes the oldest runnable job across chats.
+
+    position = await admission.summaries.admit(chat_id)   # 0 = starts now, N = about Nth in line
+    # raises admission.Busy when the queue or the chat's share is full
+
+The position counts every queued job of the kind, ignoring priorities and
+per-chat ordering, so it is only an estimate for the user. The counts run
+on a worker thread, off the event loop.
+
+Environment (per kind, e.g. SUMMARIZE_*, TRANSCRIBE_*):
+    <KIND>_MAX_RUNNING     concurrent jobs
+    <KIND>_MAX_WAITING     queued jobs before new ones are turned away
+    <KIND>_MAX_PER_CHAT    queued + running jobs per chat
+"""
+import asyncio
+import os
+from sqlalchemy import func
+from db import SessionLocal, Job
+import metrics
+
+
+class Busy(Exception):
+    pass
+
+
+class AdmissionController:
+    def __init__(self, kind: str, max_running: int, max_waiting: int, max_per_chat: int):
+        prefix = kind.upper()
+        self.kind = kind
+        self.max_running = int(os.getenv(f"{prefix}_MAX_RUNNING", max_running))
+        self.max_waiting = int(os.getenv(f"{prefix}_MAX_WAITING", max_waiting))
+        self.max_per_chat = int(os.getenv(f"{prefix}_MAX_PER_CHAT", max_per_chat))
+
+    async def admit(self, chat_id: int) -> int:
+        """Approximate queue position for a new job from `chat_id` (0 = runs now). Raises Busy if full."""
+        counts, in_chat = await asyncio.to_thread(self._counts, chat_id)
+        return self._decide(counts, in_chat)
+
+    def _counts(self, chat_id: int):
+        db = SessionLocal()
+        try:
+            counts = dict(
+                db.query(Job.status, func.count(Job.id))
+                .filter(Job.kind == self.kind, Job.status.in_(("queued", "running")))
+                .group_by(Job.status)
+                .all()
+            )
+            in_chat = (
+                db.query(func.count(Job.id))
+                .filter(Job.kind == self.kind, Job.key == f"chat:{chat_id}",
+                        Job.status.in_(("queued", "running")))
+                .scalar()
+            )
+        finally:
+            db.close()
+        return counts, in_chat
+
+    def _decide(self, counts, in_chat: int) -> int:
+        queued, running = counts.get("queued", 0), counts.get("running", 0)
+        metrics.set_gauge("admission_waiting", queued, kind=self.kind)
+        if in_chat >= self.max_per_chat:
+            metrics.inc("admission_total", kind=self.kind, result="rejected_chat")
+            raise Busy(f"{in_chat} {self.kind} job(s) already pending in this chat")
+        if queued >= self.max_waiting:
+            metrics.inc("admission_total", kind=self.kind, result="rejected_full")
+            raise Busy(f"{queued} {self.kind} job(s) already waiting")
+
+        if running < self.max_running and queued == 0 and in_chat == 0:
+            metrics.inc("admission_total", kind=self.kind, result="admitted")
+            return 0
+        metrics.inc("admission_total", kind=self.kind, result="queued")
+        return queued + 1
+
+
+summaries = AdmissionController("summarize", max_running=4, max_waiting=50, max_per_chat=2)
+transcriptions = AdmissionController("transcribe", max_running=4, max_waiting=100, max_per_chat=5)
@@ -1,7 +1,76 @@
-from fastapi import FastAPI
+import os
+import hmac
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse
 from auth_server import app as auth_app  # Import your Outlook calendar app
+import drain
+import metrics
+import profiler
+import search
+
+# Set RUN_BOT_IN_APP=1 to run the Telegram bot inside this process, so its
+# handler metrics show up on /metrics. Use a single worker in that case:
+# every worker would otherwise start its own poller.
+RUN_BOT_IN_APP = os.getenv("RUN_BOT_IN_APP", "").lower() in ("1", "true", "yes")
+# Shared secret for /admin/* endpoints, sent as the X-Admin-Token header
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    drain.flip_readiness_on_sigterm()
+    bot_app = None
+    if RUN_BOT_IN_APP:
+        import MeetCoordinator
+        bot_app = await MeetCoordinator.start_bot()
+    yield
+    if bot_app is not None:
+        await MeetCoordinator.stop_bot(bot_app)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# Registered before the mount below, which would otherwise capture every path
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profile")
+async def admin_profile(seconds: float = 10.0, x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        return PlainTextResponse("Forbidden", status_code=403)
+
+    try:
+        result = await profiler.run_profile(seconds)
+    except RuntimeError as e:
+        return PlainTextResponse(str(e), status_code=409)
+
+    lag = result["loop_lag_ms"]
+    headers = {
+        "Content-Disposition": 'attachment; filename="profile.collapsed"',
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Loop-Lag-P50-Ms": str(lag["p50"]),
+        "X-Loop-Lag-P99-Ms": str(lag["p99"]),
+        "X-Loop-Lag-Max-Ms": str(lag["max"]),
+    }
+    return PlainTextResponse(result["collapsed"], headers=headers)
+
+
+@app.get("/admin/meetings/search")
+async def admin_meeting_search(chat_id: int, q: str, offset: int = 0, limit: int = search.PAGE_SIZE,
+                               x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        return PlainTextResponse("Forbidden", status_code=403)
+
+    hits, has_more = search.search(chat_id, q, max(0, offset), min(max(1, limit), 50))
+    return {
+        "results": [hit._asdict() for hit in hits],
+        "next_offset": offset + len(hits) if has_more else None,
+    }
 
-app = FastAPI()
 
 # Mount your Outlook auth routes (optional if already inside FastAPI)
 app.mount("/", auth_app)
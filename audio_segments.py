@@ -0,0 +1,152 @@
+"""
+Chunked transcription for long voice notes.
+
+A long note is cut into segments of about SEGMENT_SECONDS at the quietest
+points ffmpeg's silencedetect finds, each starting OVERLAP_SECONDS early
+so a word clipped at a hard cut is heard whole in one of the two. The
+segments are converted and transcribed concurrently (at most CONCURRENCY
+at a time, each retried on its own) and the texts are stitched back in
+order, dropping the words repeated by the overlap. Progress is reported
+each time the in-order prefix grows, so a transcript can be posted while
+the tail is still being transcribed.
+
+Environment:
+    TRANSCRIBE_CHUNK_MIN_SECONDS   notes at least this long are chunked (default 90)
+    TRANSCRIBE_SEGMENT_SECONDS     target segment length (default 60)
+    TRANSCRIBE_OVERLAP_SECONDS     overlap between segments (default 1)
+    TRANSCRIBE_CONCURRENCY         segments in flight per note (default 4)
+"""
+import asyncio
+import os
+import re
+import subprocess
+import metrics
+
+CHUNK_MIN_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_MIN_SECONDS", "90"))
+SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "60"))
+OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "1"))
+CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+SEGMENT_ATTEMPTS = 2
+SILENCE_NOISE = "-30dB"
+SILENCE_MIN_SECONDS = 0.4
+MAX_OVERLAP_WORDS = 8
+
+_SILENCE_RE = re.compile(r"silence_(start|end):\s*(-?[\d.]+)")
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):([\d.]+)")
+
+
+def detect_silences(path: str):
+    """([(start, end)] silent stretches, duration or None) for an audio file, in seconds."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path,
+         "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_SECONDS}", "-f", "null", "-"],
+        check=True, capture_output=True, text=True,
+    )
+    duration = None
+    match = _DURATION_RE.search(result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences, start = [], None
+    for kind, value in _SILENCE_RE.findall(result.stderr):
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    if start is not None and duration:
+        silences.append((start, duration))
+    return silences, duration
+
+
+def plan_segments(duration: float, silences, target: float = SEGMENT_SECONDS, overlap: float = OVERLAP_SECONDS):
+    """[(start, end)] segments of about `target` seconds, cut at the silence nearest each boundary."""
+    cuts = []
+    position = 0.0
+    while duration - position > target * 1.5:
+        ideal = position + target
+        middles = [(s + e) / 2 for s, e in silences if position + target / 2 <= (s + e) / 2 <= position + target * 1.5]
+        cut = min(middles, key=lambda m: abs(m - ideal)) if middles else ideal
+        cuts.append(cut)
+        position = cut
+    bounds = [0.0, *cuts, duration]
+    return [(max(0.0, bounds[i] - overlap) if i else 0.0, bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def extract_segment(src: str, start: float, end: float, dst: str):
+    """Cut [start, end) out of `src` as 16 kHz mono mp3, as the single-request path sends."""
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-ss", f"{start:.2f}", "-t", f"{end - start:.2f}", "-i", src,
+         "-ar", "16000", "-ac", "1", dst],
+        check=True, capture_output=True,
+    )
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch(texts, max_overlap: int = MAX_OVERLAP_WORDS) -> str:
+    """Join segment texts in order, dropping words the overlap transcribed twice."""
+    words = []
+    for text in texts:
+        incoming = (text or "").split()
+        tail = [_norm(w) for w in words[-max_overlap:]]
+        head = [_norm(w) for w in incoming[:max_overlap]]
+        repeated = 0
+        for n in range(min(len(tail), len(head)), 0, -1):
+            if tail[-n:] == head[:n]:
+                repeated = n
+                break
+        words.extend(incoming[repeated:])
+    return " ".join(words)
+
+
+async def transcribe_chunked(path: str, duration: float, transcribe, on_progress=None,
+                             concurrency: int = CONCURRENCY) -> str:
+    """
+    Transcript of the audio at `path`. `transcribe(mp3_path)` returns text or
+    None on failure; `on_progress(text, done, total)` is awaited whenever the
+    in-order prefix of finished segments grows.
+    """
+    silences, probed = await asyncio.to_thread(detect_silences, path)
+    spans = plan_segments(probed or duration, silences)
+    metrics.observe("transcription_segments", len(spans))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def segment(index, start, end):
+        async with semaphore:
+            mp3_path = f"{path}.{index}.mp3"
+            try:
+                with metrics.timed("external_call", service="ffmpeg"):
+                    await asyncio.to_thread(extract_segment, path, start, end, mp3_path)
+                for _ in range(SEGMENT_ATTEMPTS):
+                    text = await transcribe(mp3_path)
+                    if text is not None:
+                        return index, text
+                    metrics.inc("transcription_segment_retries_total")
+                raise RuntimeError(f"segment {index + 1}/{len(spans)} ({start:.0f}-{end:.0f}s) failed")
+            finally:
+                if os.path.exists(mp3_path):
+                    os.remove(mp3_path)
+
+    texts = [None] * len(spans)
+    done = 0
+    tasks = [asyncio.create_task(segment(i, start, end)) for i, (start, end) in enumerate(spans)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, text = await finished
+            texts[index] = text
+            ready = done
+            while ready < len(texts) and texts[ready] is not None:
+                ready += 1
+            if ready > done:
+                done = ready
+                if on_progress is not None and done < len(texts):
+                    await on_progress(stitch(texts[:done]), done, len(texts))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return stitch(texts)
@@ -1,13 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
-import os, requests, base64, json, logging, sys
+import os, base64, json, logging, sys
 from urllib.parse import urlencode
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from db import SessionLocal, OutlookToken, Meeting
-from dateutil import parser
+from db import SessionLocal, OutlookToken
+from meeting_cache import meetings as meeting_cache
+from lazy import lazy_import
+from metrics import timed, inc, correlation_id
+from jobqueue import jobs, PRIORITY_LOW
+import drain
+import recurrence
+import uuid
+import pytz
+
+# Only loaded when the OAuth callback first needs them
+requests = lazy_import("requests")
+parser = lazy_import("dateutil.parser")
 
 # Load environment variables
 load_dotenv()
@@ -21,14 +33,43 @@ CLIENT_ID = os.getenv("MS_CLIENT_ID")
 CLIENT_SECRET = os.getenv("MS_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("MS_REDIRECT_URI")
 TENANT_ID = os.getenv("MS_TENANT_ID") or "common"
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+MS_LOGIN_BASE_URL = os.getenv("MS_LOGIN_BASE_URL", "https://login.microsoftonline.com")
+GRAPH_BASE_URL = os.getenv("MS_GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+AUTHORITY = f"{MS_LOGIN_BASE_URL}/{TENANT_ID}"
 SCOPES = ["https://graph.microsoft.com/Calendars.ReadWrite", "offline_access", "User.Read"]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only runs when this app is served directly (startup.sh); appentry does the same in its own
+    drain.flip_readiness_on_sigterm()
+    yield
+
+
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key="any-random-secret")
 
 
+_known_paths = None
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Label by route path; unknown paths share one label to bound cardinality
+    global _known_paths
+    if _known_paths is None:  # routes are all registered by the first request
+        _known_paths = frozenset(route.path for route in app.routes)
+    path = request.url.path if request.url.path in _known_paths else "unmatched"
+    token = correlation_id.set(request.headers.get("x-request-id") or uuid.uuid4().hex[:12])
+    try:
+        with timed("http_request", path=path):
+            response = await call_next(request)
+        inc("http_responses_total", path=path, status=response.status_code)
+        return response
+    finally:
+        correlation_id.reset(token)
+
+
 # --- Helper functions ---
 
 def generate_title_from_summary(summary: str) -> str:
@@ -58,6 +99,13 @@ async def home():
     return HTMLResponse("<a href='/login'>🔗 Connect Outlook Calendar</a>")
 
 
+@app.get("/readyz")
+async def readyz():
+    # 503 while the process drains for a restart, so the proxy sends new requests elsewhere
+    ready, reason = drain.is_ready()
+    return PlainTextResponse(reason, status_code=200 if ready else 503)
+
+
 @app.get("/login")
 async def login(request: Request):
     telegram_user_id = request.query_params.get("telegram_id")
@@ -111,7 +159,8 @@ async def callback(request: Request, code: str = None, state: str = None):
     }
 
     try:
-        token_response = requests.post(f"{AUTHORITY}/oauth2/v2.0/token", data=token_data)
+        with timed("external_call", service="ms_token"):
+            token_response = requests.post(f"{AUTHORITY}/oauth2/v2.0/token", data=token_data)
         token_json = token_response.json()
     except Exception as e:
         logger.error(f"❌ Token exchange failed: {e}")
@@ -126,65 +175,111 @@ async def callback(request: Request, code: str = None, state: str = None):
         logger.error(f"❌ Full token response: {token_json}")
         return HTMLResponse(f"❌ Token error: {token_json}")
 
-    db: Session = SessionLocal()
-    meeting = db.query(Meeting).filter_by(id=meeting_id).first()
+    # The address lets the bot check this user's free/busy later (see freebusy.py)
+    email = None
+    try:
+        with timed("external_call", service="graph_me"):
+            me_response = requests.get(f"{GRAPH_BASE_URL}/me", headers={"Authorization": f"Bearer {access_token}"})
+        if me_response.ok:
+            me = me_response.json()
+            email = me.get("mail") or me.get("userPrincipalName")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read Outlook profile: {e}")
+
+    # Read from the database: this process never sees the bot's invalidations
+    meeting = meeting_cache.fresh(meeting_id)
     if not meeting:
-        db.close()
         return HTMLResponse("❌ Meeting not found")
 
+    db: Session = SessionLocal()
     existing = db.query(OutlookToken).filter_by(telegram_user_id=telegram_user_id).first()
     if existing:
         existing.access_token = access_token
         existing.refresh_token = refresh_token
         existing.expires_at = expires_at
+        existing.email = email or existing.email
     else:
         db.add(OutlookToken(
             telegram_user_id=telegram_user_id,
             access_token=access_token,
             refresh_token=refresh_token,
-            expires_at=expires_at
+            expires_at=expires_at,
+            email=email
         ))
     db.commit()
+    db.close()
 
-    # Time extraction logic
-    time_str = meeting.time or extract_time_from_summary(meeting.summary or "")
     try:
-        start_dt = datetime.combine(
-            meeting.meet_date,
-            datetime.strptime(time_str, "%H:%M").time()
-        )
-    except ValueError:
-        db.close()
-        return HTMLResponse("⚠️ Invalid time format in DB or summary")
+        event_details(meeting)
+    except ValueError as e:
+        return HTMLResponse(f"⚠️ Outlook connected, but the meeting can't be added: {e}")
+
+    # The calendar write happens in the bot's job queue (retried if Graph is slow or down)
+    jobs.enqueue("outlook_event", {"telegram_user_id": telegram_user_id, "meeting_id": meeting_id,
+                                   "chat_id": meeting.chat_id}, priority=PRIORITY_LOW)
+    return HTMLResponse("✅ Outlook connected. The meeting will appear in your Outlook Calendar shortly.")
+
+
+def event_details(meeting):
+    """
+    (start, place, description) of the Outlook event for a meeting. A
+    recurring meeting gets its next occurrence, with any override applied.
+    Raises ValueError (with a message for the user) if there is none.
+    """
+    if not meeting.meet_date:
+        raise ValueError("the meeting has no date")
+    day, place, description = meeting.meet_date, meeting.place, meeting.summary or ""
+    time_str = meeting.time or extract_time_from_summary(description)
+    if meeting.rrule:
+        overrides = recurrence.load_overrides([meeting.id]).get(meeting.id)
+        today = datetime.now(pytz.timezone("Asia/Singapore")).date()
+        upcoming = recurrence.upcoming(meeting, overrides, start=today)
+        if not upcoming:
+            raise ValueError("the meeting has no upcoming occurrences")
+        occurrence = upcoming[0]
+        day, place = occurrence.meet_date, occurrence.place or place
+        description = recurrence.occurrence_summary(description, occurrence)
+        if occurrence.time:
+            time_str = extract_time_from_summary(f"🕒 Time: {occurrence.time}")
+    try:
+        start = datetime.combine(day, datetime.strptime(time_str, "%H:%M").time())
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid time format in DB or summary ({time_str!r})")
+    return start, place, description
+
 
+def create_outlook_event(telegram_user_id, meeting):
+    """Create the Outlook event for a meeting snapshot. Raises on any failure so the job is retried."""
+    db: Session = SessionLocal()
+    token = db.query(OutlookToken).filter_by(telegram_user_id=telegram_user_id).first()
+    db.close()
+    if not token:
+        raise RuntimeError(f"No Outlook token for {telegram_user_id}")
+
+    start_dt, place, description = event_details(meeting)
     end_dt = start_dt + timedelta(hours=1)
 
     calendar_data = {
+        # Graph drops a POST repeating a transactionId, so a retry after a timed-out
+        # but successful request doesn't create a second event
+        "transactionId": f"meetbot-{telegram_user_id}-{meeting.id}-{start_dt:%Y%m%d}",
         "subject": generate_title_from_summary(meeting.summary or "") or meeting.activity or "Meeting",
         "start": {"dateTime": start_dt.isoformat(), "timeZone": "Asia/Singapore"},
         "end": {"dateTime": end_dt.isoformat(), "timeZone": "Asia/Singapore"},
-        "location": {"displayName": meeting.place or "Unknown Location"},
-        "body": {"contentType": "text", "content": meeting.summary or "Planned via MeetingBot"}
+        "location": {"displayName": place or "Unknown Location"},
+        "body": {"contentType": "text", "content": description or "Planned via MeetingBot"}
     }
 
     headers = {
-        "Authorization": f"Bearer {access_token}",
+        "Authorization": f"Bearer {token.access_token}",
         "Content-Type": "application/json"
     }
 
-    try:
+    with timed("external_call", service="graph_events"):
         event_response = requests.post(
-            "https://graph.microsoft.com/v1.0/me/events",
+            f"{GRAPH_BASE_URL}/me/events",
             headers=headers,
             json=calendar_data
         )
-    except Exception as e:
-        db.close()
-        return HTMLResponse(f"❌ Calendar API error: {e}")
-
-    if event_response.status_code == 201:
-        db.close()
-        return HTMLResponse("✅ Event created and added to your Outlook Calendar.")
-    else:
-        db.close()
-        return HTMLResponse(f"⚠️ Token saved but event creation failed: {event_response.text}")
+    if event_response.status_code != 201:
+        raise RuntimeError(f"Event creation failed ({event_response.status_code}): {event_response.text}")
@@ -0,0 +1,313 @@
+"""
+Availability engine: turns what each participant said while the bot was
+listening ("I'm free Sat 2-6", "only after 4", "can't do sunday") into
+time intervals and finds the slots that suit the most people with a
+sweep line over all interval endpoints, O(n log n) in the number of
+windows. Only the ranked slots are handed to the summarizer.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter, namedtuple
+from itertools import groupby
+from datetime import date, datetime, time, timedelta
+
+# Bounds used for open-ended windows ("after 4", "sat") and whole days
+DAY_START = time(9, 0)
+DAY_END = time(23, 0)
+POINT_MINUTES = 120  # "7pm" alone means 7pm-9pm
+MIN_SLOT_MINUTES = 60
+MAX_CANDIDATES = 5
+
+Slot = namedtuple("Slot", "start end count participants")
+
+_WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?"
+_TIME_RE = re.compile(
+    r"\b(?:"
+    rf"(?:from\s+)?(?P<range>{_TIME}\s*(?:-|–|—|to|till|until)\s*{_TIME})"
+    rf"|(?:after|from|past)\s+(?P<after>{_TIME})"
+    rf"|(?:before|until|till|by)\s+(?P<before>{_TIME})"
+    r"|(?P<point>\d{1,2}(?:[:.]\d{2})?\s*(?:am|pm)|at\s+\d{1,2}(?:[:.]\d{2})?|\d{1,2}:\d{2})"
+    r"|(?P<period>morning|afternoon|evening|night|lunch|dinner|all\s+day|whole\s+day)"
+    r")\b",
+    re.IGNORECASE,
+)
+_PERIODS = {
+    "morning": (time(9, 0), time(12, 0)),
+    "afternoon": (time(12, 0), time(18, 0)),
+    "evening": (time(18, 0), time(22, 0)),
+    "night": (time(19, 0), time(23, 0)),
+    "lunch": (time(11, 30), time(14, 0)),
+    "dinner": (time(18, 0), time(21, 0)),
+}
+
+_WEEKDAY = r"(?:mon(?:day)?|tue(?:s|sday)?|wed(?:nesday)?|thu(?:r|rs|rsday)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)"
+_DAY_RE = re.compile(
+    r"\b(?:"
+    rf"(?P<next>next)\s+(?P<next_day>{_WEEKDAY})"
+    rf"|(?:this\s+)?(?P<weekday>{_WEEKDAY})"
+    r"|(?P<tomorrow>tomorrow|tmr)"
+    r"|(?P<today>today|tdy|tonight)"
+    r"|(?P<dm_day>\d{1,2})(?:st|nd|rd|th)?\s+(?P<dm_month>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+    r"|(?P<slash_day>\d{1,2})/(?P<slash_month>\d{1,2})"
+    r")\b",
+    re.IGNORECASE,
+)
+
+_NEGATIVE_RE = re.compile(r"\b(?:can'?t|cannot|not\s+(?:free|available|ok)|busy|unavailable|no\s+can\s+do)\b",
+                          re.IGNORECASE)
+_POSITIVE_RE = re.compile(r"\b(?:ok|okay|free|works?|good|fine|can|available|prefer)\b", re.IGNORECASE)
+_CLAUSE_RE = re.compile(r"\s*(;|,|\bbut\b)\s*", re.IGNORECASE)
+
+
+def _clock(hour, minute, meridiem, assume_pm=None):
+    """time for a spoken hour; without am/pm, 1-7 are read as pm, as people mean in chat."""
+    hour, minute = int(hour), int(minute or 0)
+    if hour > 23 or minute > 59:
+        return None
+    meridiem = (meridiem or "").lower()
+    if assume_pm is None:
+        assume_pm = 1 <= hour <= 7
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    elif not meridiem and assume_pm and hour < 12:
+        hour += 12
+    return time(hour, minute)
+
+
+def _time_windows(text):
+    """[(start_time, end_time)] stated in `text`, plus the spans they cover."""
+    windows, spans = [], []
+    for match in _TIME_RE.finditer(text):
+        kind = match.lastgroup
+        g = match.groups()
+        if kind == "range":
+            sh, sm, smer, eh, em, emer = g[1:7]
+            # "2-6pm" is 2pm-6pm, but "11-2pm" is 11am-2pm
+            start_pm = None
+            if not smer and emer and emer.lower() == "pm":
+                start_pm = int(sh) <= int(eh) % 12
+            start, end = _clock(sh, sm, smer, start_pm), _clock(eh, em, emer)
+            if start and end and end <= start and not emer:
+                end = _clock(eh, em, None, assume_pm=True)  # "3 to 8" is 3pm-8pm
+        elif kind == "after":
+            start, end = _clock(*g[8:11]), DAY_END
+        elif kind == "before":
+            start, end = DAY_START, _clock(*g[12:15])
+        elif kind == "point":
+            raw = re.sub(r"^at\s+", "", match.group("point").lower())
+            m = re.match(_TIME, raw)
+            start = _clock(*m.groups())
+            end = (datetime.combine(date.min, start) + timedelta(minutes=POINT_MINUTES)).time() if start else None
+            if end is not None and end < start:
+                end = time(23, 59)
+        else:
+            period = re.sub(r"\s+", " ", match.group("period").lower())
+            start, end = _PERIODS.get(period, (DAY_START, DAY_END))
+        if start is not None and end is not None and start < end:
+            windows.append((start, end))
+            spans.append(match.span())
+    return windows, spans
+
+
+def _resolve_day(match, today):
+    if match.group("next"):
+        # "next friday" is the friday after the coming one
+        ahead = (_WEEKDAY_NAMES.index(match.group("next_day")[:3].lower()) - today.weekday()) % 7
+        return today + timedelta(days=ahead + 7)
+    if match.group("weekday"):
+        ahead = (_WEEKDAY_NAMES.index(match.group("weekday")[:3].lower()) - today.weekday()) % 7
+        return today + timedelta(days=ahead)
+    if match.group("tomorrow"):
+        return today + timedelta(days=1)
+    if match.group("today"):
+        return today
+    if match.group("dm_day"):
+        day, month = int(match.group("dm_day")), _MONTH_NAMES.index(match.group("dm_month").lower()) + 1
+    else:
+        day, month = int(match.group("slash_day")), int(match.group("slash_month"))
+    try:
+        found = date(today.year, month, day)
+    except ValueError:
+        return None
+    if found < today:
+        try:
+            found = found.replace(year=today.year + 1)
+        except ValueError:
+            return None
+    return found
+
+
+def _days(text, spans, today):
+    """Dates mentioned in `text`, ignoring anything inside a time window span."""
+    found = []
+    for match in _DAY_RE.finditer(text):
+        if any(s <= match.start() < e for s, e in spans):
+            continue
+        day = _resolve_day(match, today)
+        if day is not None and day not in found:
+            found.append(day)
+    return found
+
+
+def _clauses(text):
+    """
+    [(clause, negative)] for a message split on commas, semicolons and
+    "but", so that in "can't do sunday, sat 3 to 8 ok" only sunday is busy.
+    A bare list item after a comma keeps the sense of the clause before it
+    ("can't do sat, sun").
+    """
+    parts = _CLAUSE_RE.split(text)
+    result = []
+    negative = False
+    for i in range(0, len(parts), 2):
+        separator = parts[i - 1] if i else None
+        if _NEGATIVE_RE.search(parts[i]):
+            negative = True
+        elif separator != "," or _POSITIVE_RE.search(parts[i]):
+            negative = False
+        result.append((parts[i], negative))
+    return result
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(iv) for iv in merged]
+
+
+def _subtract(free, busy):
+    """Merged `free` intervals minus merged `busy` intervals."""
+    result = []
+    j = 0
+    for start, end in free:
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > start:
+                result.append((start, busy[k][0]))
+            start = max(start, busy[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def extract_windows(group_data, today: date = None):
+    """
+    {participant: [(start_datetime, end_datetime)]} from listening_sessions data
+    ({participant: [messages]}). A time without a day applies to the last day
+    that participant mentioned, or else to the day the group mentions most.
+    """
+    today = today or date.today()
+    parsed = {}  # {user: [(days, windows, negative)]}
+    day_votes = Counter()
+    for user, messages in group_data.items():
+        rows = []
+        for msg in messages:
+            for clause, negative in _clauses(msg):
+                windows, spans = _time_windows(clause)
+                days = _days(clause, spans, today)
+                day_votes.update(days)
+                if days or windows:
+                    rows.append((days, windows, negative))
+        parsed[user] = rows
+
+    group_day = day_votes.most_common(1)[0][0] if day_votes else None
+    result = {}
+    for user, rows in parsed.items():
+        free, busy = [], []
+        context_day = None
+        for days, windows, negative in rows:
+            if days:
+                context_day = days[-1]
+            else:
+                days = [context_day or group_day] if (context_day or group_day) else []
+            for day in days:
+                for start, end in windows or [(DAY_START, DAY_END)]:
+                    (busy if negative else free).append(
+                        (datetime.combine(day, start), datetime.combine(day, end))
+                    )
+        windows = _subtract(_merge(free), _merge(busy))
+        if windows:
+            result[user] = windows
+    return result
+
+
+def rank_slots(windows, now: datetime = None, limit: int = MAX_CANDIDATES,
+               min_minutes: int = MIN_SLOT_MINUTES):
+    """
+    Best common slots for `windows` ({participant: merged intervals}):
+    most participants first, then longest, then earliest.
+    """
+    now = now or datetime.now()
+    events = []
+    for who, intervals in enumerate(windows.values()):
+        for start, end in intervals:
+            start = max(start, now)
+            if start < end:
+                events.append((start, 1, who))
+                events.append((end, -1, who))
+    events.sort()
+
+    segments = []
+    count = 0
+    previous = None
+    changed = True
+    for at, group in groupby(events, key=lambda e: e[0]):
+        if count:
+            # Extend the last segment only if nobody joined or left at `previous`:
+            # the same count can be a different set of people ("A until 2" + "B from 2")
+            if segments and segments[-1][1] == previous and not changed:
+                segments[-1][1] = at
+            else:
+                segments.append([previous, at, count])
+        net = Counter()
+        for _, delta, who in group:
+            net[who] += delta
+            count += delta
+        changed = any(net.values())
+        previous = at
+
+    min_length = timedelta(minutes=min_minutes)
+    segments = [s for s in segments if s[1] - s[0] >= min_length]
+    segments.sort(key=lambda s: (-s[2], -(s[1] - s[0]), s[0]))
+
+    starts = {user: [iv[0] for iv in intervals] for user, intervals in windows.items()}
+    slots = []
+    for start, end, count in segments[:limit]:
+        participants = []
+        for user, intervals in windows.items():
+            i = bisect_right(starts[user], start) - 1
+            if i >= 0 and intervals[i][1] >= end:
+                participants.append(user)
+        slots.append(Slot(start, end, count, participants))
+    return slots
+
+
+def _clock_text(moment):
+    return moment.strftime("%I:%M %p").lstrip("0")
+
+
+def format_candidates(slots, total_participants: int) -> str:
+    """Numbered slot list for the summarizer prompt."""
+    lines = []
+    for i, slot in enumerate(slots, 1):
+        names = ", ".join(str(p) for p in slot.participants[:10])
+        if len(slot.participants) > 10:
+            names += f" +{len(slot.participants) - 10} more"
+        lines.append(
+            f"{i}. {slot.start.strftime('%A %d %B %Y')}, {_clock_text(slot.start)}–{_clock_text(slot.end)}: "
+            f"{slot.count}/{total_participants} free ({names})"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+"""
+Compare the raw-chat date fallback before and after the single-pass scanner.
+
+    python -m benchmarks.bench_date_scanner
+"""
+import random
+import re
+import time
+from datetime import date, datetime
+import dateparser
+from date_scanner import find_fallback_date
+
+CHATTER = [
+    "haha ok", "can't wait", "who's bringing snacks", "lol same",
+    "i'm down for anything", "let me check with my boss", "we lost 45-50 lol",
+    "brb", "what about the usual place", "sounds good to me", "room 13/40?",
+]
+DATES = ["tmr", "next friday", "this saturday", "12th aug", "3/9", "today"]
+
+
+def legacy_fallback(all_messages, current_date):
+    """The loop extract_meeting_date used before date_scanner."""
+    date_patterns = [
+        r'\b(tomorrow|tmr)\b',
+        r'\b(today|tdy)\b',
+        r'\b(next\s+(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday))\b',
+        r'\b(this\s+(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday))\b',
+        r'\b(\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*)\b',
+        r'\b(\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b',
+        r'\b(\d{1,2}-\d{1,2}(?:-\d{2,4})?)\b'
+    ]
+    for message in all_messages:
+        msg_low = message.lower()
+        for pat in date_patterns:
+            for match in re.findall(pat, msg_low, re.IGNORECASE):
+                parsed = dateparser.parse(
+                    match,
+                    settings={
+                        'RELATIVE_BASE': datetime.combine(current_date, datetime.min.time()),
+                        'PREFER_DATES_FROM': 'future'
+                    }
+                )
+                if parsed:
+                    if parsed.month == current_date.month and parsed.day == current_date.day:
+                        parsed = parsed.replace(year=current_date.year)
+                    if parsed.date() >= current_date:
+                        return parsed.date()
+    return None
+
+
+def make_session(n_messages, seed=0):
+    """
+    Mostly chatter with number pairs that look like dates but never parse;
+    the real date is agreed in the last few messages, as it usually is.
+    """
+    rng = random.Random(seed)
+    messages = [rng.choice(CHATTER) for _ in range(n_messages)]
+    for i in range(n_messages - 5, n_messages):
+        messages[i] += " " + rng.choice(DATES)
+    return messages
+
+
+def timeit(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    current_date = date.today()
+    dateparser.parse("warm up")
+
+    print(f"{'messages':>10} {'legacy ms':>12} {'scanner ms':>12} {'speedup':>9}")
+    for n in (1_000, 10_000):
+        messages = make_session(n)
+        legacy = timeit(legacy_fallback, messages, current_date)
+        scanner = timeit(find_fallback_date, messages, current_date)
+        print(f"{n:>10} {legacy * 1000:>12.1f} {scanner * 1000:>12.1f} {legacy / scanner:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
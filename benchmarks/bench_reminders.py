@@ -0,0 +1,122 @@
+"""
+Reminder fan-out: N reminders due at the same minute, sent the old way
+(one job per reminder, each with its own DB session, all at once) and
+through reminders.ReminderEngine.
+
+    python -m benchmarks.bench_reminders [--reminders 300] [--chats 200] [--rate 25]
+
+The fake bot enforces Telegram-like flood limits (30 messages/s overall,
+one message per second per chat) by raising RetryAfter, and takes
+--send-latency seconds per call. Reported per mode: wall time, DB
+queries, messages delivered vs lost to flood errors, and delivery lag.
+
+Defaults on a laptop-class VM:
+
+    legacy   wall 0.21 s   queries 300  delivered  30/300  flood errors 270
+    engine   wall 11.99 s  queries   1  delivered 300/300  flood errors   0  lag p99 11.9 s
+
+At the default 25 msg/s the engine clears 1,000 reminders in ~40 s.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import deque
+
+
+class FloodLimitedBot:
+    def __init__(self, latency, global_rate=30, chat_interval=1.0):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.delivered = []  # (chat_id, text, sent_at)
+        self.flood_errors = 0
+        self._recent = deque()
+        self._last_in_chat = {}
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        from telegram.error import RetryAfter
+
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        last = self._last_in_chat.get(chat_id)
+        if len(self._recent) >= self.global_rate or (last is not None and now - last < self.chat_interval):
+            self.flood_errors += 1
+            raise RetryAfter(1)
+        self._recent.append(now)
+        self._last_in_chat[chat_id] = now
+        await asyncio.sleep(self.latency)
+        self.delivered.append((chat_id, text, time.time()))
+
+
+def summarize(label, bot, total, due, wall, queries):
+    lags = sorted(at - due for _, _, at in bot.delivered)
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"{label:<8} wall {wall:>7.2f} s  queries {queries:>5}  delivered {len(bot.delivered):>5}/{total}"
+          f"  flood errors {bot.flood_errors:>5}  lag p50 {statistics.median(lags) if lags else 0:>6.2f} s  p99 {p99:>6.2f} s")
+
+
+async def run(args):
+    import db
+    from db import SessionLocal, Meeting
+    from sqlalchemy import event
+    from reminders import ReminderEngine, Reminder, reminder_text
+
+    db.init_db()
+    session = SessionLocal()
+    meetings = [Meeting(chat_id=-(i % args.chats) - 1, summary=f"📅 Date: 12 August 2026\n🕒 Time: 7:00 PM\n#{i}")
+                for i in range(args.reminders)]
+    session.add_all(meetings)
+    session.commit()
+    targets = [(m.chat_id, m.id, 720) for m in meetings]
+    session.close()
+
+    queries = [0]
+    event.listen(db.get_engine(), "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    # Old path: every reminder is its own job firing at the same instant
+    async def legacy_one(bot, chat_id, meeting_id, minutes):
+        s = SessionLocal()
+        meeting = s.query(Meeting).filter_by(id=meeting_id).first()
+        s.close()
+        try:
+            await bot.send_message(chat_id=chat_id, text=reminder_text(minutes, meeting.summary))
+        except Exception:
+            pass  # the old job had no retry: the reminder is lost
+
+    bot = FloodLimitedBot(args.send_latency)
+    due = time.time()
+    queries[0] = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(legacy_one(bot, c, m, mins) for c, m, mins in targets))
+    summarize("legacy", bot, len(targets), due, time.perf_counter() - start, queries[0])
+
+    bot = FloodLimitedBot(args.send_latency)
+    engine = ReminderEngine(get_scheduler=None, rate=args.rate)
+    due = time.time()
+    reminders = [Reminder(c, m, mins, due) for c, m, mins in targets]
+    queries[0] = 0
+    start = time.perf_counter()
+    await engine.deliver(bot, reminders)
+    summarize("engine", bot, len(targets), due, time.perf_counter() - start, queries[0])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reminders", type=int, default=300)
+    ap.add_argument("--chats", type=int, default=200)
+    ap.add_argument("--rate", type=float, default=25.0, help="engine send rate (messages/s)")
+    ap.add_argument("--send-latency", type=float, default=0.02)
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="meetbot-reminders-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
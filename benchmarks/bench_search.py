@@ -0,0 +1,74 @@
+"""
+/findmeeting latency on a chat with tens of thousands of meetings, against
+whatever DATABASE_URL points at (default: a fresh SQLite file, i.e. FTS5).
+
+    python -m benchmarks.bench_search [--meetings 30000] [--chats 3]
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_search
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+PLACES = ["Jem", "Jewel Changi", "VivoCity", "Bugis Junction", "Plaza Singapura", "Tampines Mall",
+          "Northpoint City", "Suntec City", "ION Orchard", "Westgate", "Causeway Point", "Marina Bay Sands"]
+ACTIVITIES = ["Dinner", "Lunch", "Bowling", "Movie", "Karaoke", "Board games", "Project meeting",
+              "Birthday party", "Badminton", "Hotpot", "Study session", "Escape room"]
+QUERIES = ["jem", "bowling", "jewel dinner", "karaoke bugis", "birthday", "marina", "escape", "hotpot 6",
+           "study", "nothing matches this"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--meetings", type=int, default=30000, help="meetings in the searched chat")
+    ap.add_argument("--chats", type=int, default=3, help="chats of that size in the table")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="meetbot-search-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    import db
+    import search
+    from db import SessionLocal, Meeting
+
+    db.init_db()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    session = SessionLocal()
+    for chat in range(args.chats):
+        rows = []
+        for i in range(args.meetings):
+            place, activity = rng.choice(PLACES), rng.choice(ACTIVITIES)
+            pax = str(rng.randint(2, 12))
+            day = date(2026, 1, 1) + timedelta(days=rng.randint(0, 700))
+            summary = (f"📅 Date: {day:%d %B %Y}\n🕒 Time: {rng.randint(1, 11)}:00 PM\n"
+                       f"📍 Place: {place} (Nearest MRT = somewhere)\n👥 Pax: {pax}\n🎯 Activity: {activity}")
+            meeting = Meeting(chat_id=-chat - 1, summary=summary, meet_date=day)
+            search.index_fields(meeting)
+            rows.append(meeting)
+        session.add_all(rows)
+        session.commit()
+    session.close()
+    print(f"backend: {db.get_engine().dialect.name}, {args.chats} x {args.meetings} meetings "
+          f"loaded in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'query':<24} {'hits':>5} {'more':>5} {'p50 ms':>9} {'max ms':>9}")
+    for query in QUERIES:
+        times = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            hits, more = search.search(-1, query)
+            times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        page, _ = search.search(-1, query, offset=500)
+        print(f"{query:<24} {len(hits):>5} {str(more):>5} {1000 * statistics.median(times):>9.2f} "
+              f"{1000 * max(times):>9.2f}   page 101: {1000 * (time.perf_counter() - t):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cold-start profile: wall time and per-module import time for each entry
+point, measured in fresh interpreters with `python -X importtime`.
+
+    python -m benchmarks.bench_startup [--runs 5] [--top 15] [--json out.json]
+
+Pass --json to keep a machine-readable copy so numbers can be compared
+across commits.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "bot": "import MeetCoordinator",
+    "auth_server": "import auth_server",
+    "appentry": "import appentry",
+}
+
+# Harmless placeholders so module-level config reads don't fail
+ENV_DEFAULTS = {
+    "DATABASE_URL": "sqlite:///:memory:",
+    "OPENAI_API_KEY": "bench",
+    "GOOGLE_MAPS_API_KEY": "AIzaBench",
+    "BOT_TOKEN": "0:bench",
+}
+
+
+def run_once(statement):
+    env = {**ENV_DEFAULTS, **os.environ}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return time.perf_counter() - start, proc.stderr
+
+
+def parse_importtime(stderr):
+    """Return {top-level package: cumulative microseconds} from -X importtime output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        name = name.rstrip()[1:]  # drop the separator space
+        # Only count modules imported directly by the entry point (depth 1),
+        # so nested imports are not double counted
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth != 1:
+            continue
+        root = name.strip().split(".")[0]
+        totals[root] = totals.get(root, 0) + int(cumulative_us)
+    return totals
+
+
+def profile(statement, runs):
+    walls = []
+    modules = {}
+    for _ in range(runs):
+        wall, stderr = run_once(statement)
+        walls.append(wall)
+        for name, us in parse_importtime(stderr).items():
+            modules.setdefault(name, []).append(us)
+    return {
+        "wall_ms_median": statistics.median(walls) * 1000,
+        "wall_ms_min": min(walls) * 1000,
+        "modules_ms": {name: statistics.median(us) / 1000 for name, us in modules.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", help="write the full report to this file")
+    args = ap.parse_args()
+
+    report = {}
+    for label, statement in ENTRY_POINTS.items():
+        result = profile(statement, args.runs)
+        report[label] = result
+        print(f"\n== {label}: {statement}")
+        print(f"   wall (median of {args.runs}): {result['wall_ms_median']:.0f} ms, min {result['wall_ms_min']:.0f} ms")
+        ranked = sorted(result["modules_ms"].items(), key=lambda kv: kv[1], reverse=True)
+        for name, ms in ranked[:args.top]:
+            print(f"   {ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Long voice notes against the fake Whisper server: one request for the whole
+note versus audio_segments.transcribe_chunked at several concurrency levels.
+
+    python -m benchmarks.bench_transcription [--minutes 5] [--seconds-per-mb 20]
+
+The clip is a tone broken by a short pause every 9 s, so silencedetect has
+somewhere to cut. The fake charges --whisper-latency per call plus
+--seconds-per-mb of upload, so a single request grows with the note's
+length while chunked wall time grows with segments / concurrency.
+Needs ffmpeg with libopus.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeServices
+
+
+def make_clip(directory, seconds):
+    path = os.path.join(directory, f"note-{seconds}s.ogg")
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"aevalsrc='if(lt(mod(t,9),8),0.5*sin(440*2*PI*t),0)':s=16000:d={seconds}",
+         "-c:a", "libopus", path],
+        check=True,
+    )
+    return path
+
+
+async def single(path, transcribe):
+    mp3_path = path.replace(".ogg", ".mp3")
+    await asyncio.to_thread(
+        subprocess.run, ["ffmpeg", "-y", "-i", path, "-ar", "16000", "-ac", "1", mp3_path],
+        check=True, capture_output=True
+    )
+    try:
+        return await transcribe(mp3_path)
+    finally:
+        os.remove(mp3_path)
+
+
+async def run(args, workdir):
+    import audio_segments
+    from MeetCoordinator import transcribe_with_whisper
+
+    seconds = int(args.minutes * 60)
+    path = make_clip(workdir, seconds)
+    silences, duration = audio_segments.detect_silences(path)
+    spans = audio_segments.plan_segments(duration or seconds, silences)
+    print(f"{seconds} s note, {len(silences)} pauses, {len(spans)} segments of ~{audio_segments.SEGMENT_SECONDS:.0f} s")
+
+    start = time.perf_counter()
+    text = await single(path, transcribe_with_whisper)
+    print(f"{'single request':<18} wall {time.perf_counter() - start:7.2f} s  {'ok' if text else 'FAILED'}")
+
+    for concurrency in args.concurrency:
+        progress = []
+        start = time.perf_counter()
+
+        async def on_progress(_, done, total):
+            progress.append(time.perf_counter() - start)
+
+        text = await audio_segments.transcribe_chunked(path, seconds, transcribe_with_whisper,
+                                                       on_progress=on_progress, concurrency=concurrency)
+        first = f"first partial {progress[0]:6.2f} s" if progress else ""
+        print(f"{f'chunked x{concurrency}':<18} wall {time.perf_counter() - start:7.2f} s  "
+              f"{'ok' if text else 'FAILED'}  {first}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--minutes", type=float, default=5)
+    ap.add_argument("--whisper-latency", type=float, default=0.5, help="fixed seconds per Whisper call")
+    ap.add_argument("--seconds-per-mb", type=float, default=20.0, help="Whisper seconds per MB uploaded")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = ap.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg not found")
+    workdir = tempfile.mkdtemp(prefix="meetbot-transcription-")
+    try:
+        with FakeServices(latency={"whisper": args.whisper_latency},
+                          whisper_seconds_per_mb=args.seconds_per_mb) as fakes:
+            os.environ.update(fakes.env())
+            os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+            asyncio.run(run(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
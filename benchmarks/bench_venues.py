@@ -0,0 +1,147 @@
+"""
+Transit lookups saved by venue canonicalization: a stream of place names
+as people type them ("jem", "JEM mall", "Jem, Jurong East", typos) with
+the MRT and bus-stop answers cached by exact string versus by canonical
+venue key. Remote lookups are counted, not made.
+
+    python -m benchmarks.bench_venues [--lookups 5000] [--history 2000]
+
+`--history` past meetings are written to a fresh SQLite file first, so
+some venues are already known when the stream starts.
+
+    5000 lookups of 17 venues
+      remote lookups, cached by exact string      703
+      remote lookups, cached by canonical venue    21   x33.5 fewer
+      canonical venues 21, 0 shared by different real venues
+      resolve + cache  p50 8 us   max 1276 us
+
+The known-answer cases in check() run first and stop the benchmark if any
+pair of different venues is merged, or a plain respelling is not.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+VENUES = ["Jem", "Jewel Changi", "VivoCity", "Bugis Junction", "Plaza Singapura", "Tampines Mall",
+          "Tampines Hub", "Northpoint City", "Suntec City", "ION Orchard", "Westgate", "Causeway Point",
+          "Marina Bay Sands", "Jurong Point", "Kallang Wave Mall", "313@Somerset", "Eastgate"]
+AREAS = ["Jurong East", "Singapore", "Orchard", "Downtown", "East"]
+
+# (known venue, new place, same venue?)
+CASES = [
+    ("Changi Airport T1", "Changi Airport T4", False),
+    ("Blk 12 Bedok North", "Blk 85 Bedok North", False),
+    ("Tampines Mall", "Tampines 1", False),
+    ("Hougang Mall", "Hougang 1", False),
+    ("Tampines Mall", "Tampines Hub", False),
+    ("Changi Airport T1", "changi airport t1", True),
+    ("313@Somerset", "313 Somerset", True),
+    ("VivoCity", "vivo city", True),
+    ("Plaza Singapura", "plaza sing", True),
+    ("Jem", "Jem, Jurong East", True),
+    ("Starbucks, Jurong Point", "Starbucks, Tampines Mall", False),
+    ("McDonald's, Bishan", "McDonalds, Orchard", False),
+    ("Blk 85, Bedok North", "Blk 85, Fengshan", False),
+]
+
+
+def spelling(rng, venue):
+    """One way somebody might type `venue`."""
+    name = rng.choice([venue, venue.lower(), venue.upper()])
+    roll = rng.random()
+    if roll < 0.15:
+        name = f"{name} Mall"
+    elif roll < 0.3:
+        name = f"{name}, {rng.choice(AREAS)}"
+    elif roll < 0.4 and len(name) > 5:
+        i = rng.randrange(1, len(name) - 1)
+        name = name[:i] + name[i] + name[i:]  # doubled letter
+    elif roll < 0.45:
+        name = f"the {name}"
+    return name
+
+
+def check(venues):
+    """Known-answer cases; returns a list of failures."""
+    failures = []
+    for known, place, same in CASES:
+        index = venues.VenueIndex()
+        index.learn([(known, 1)])
+        key, score = index.match(index.normalized(place))
+        if (key is not None) != same:
+            failures.append(f"{place!r} {'merged into' if key else 'not matched to'} {known!r} (score {score:.2f})")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lookups", type=int, default=5000)
+    ap.add_argument("--history", type=int, default=2000, help="past meetings to learn venues from")
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="meetbot-venues-"), "bench.db")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{path}")
+
+    import db
+    import venues
+    from db import SessionLocal, Meeting
+
+    failures = check(venues)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+    db.init_db()
+    rng = random.Random(0)
+    session = SessionLocal()
+    session.add_all(Meeting(chat_id=1, summary="", meet_date=date(2026, 1, 1),
+                            place=spelling(rng, rng.choice(VENUES))) for _ in range(args.history))
+    session.commit()
+    session.close()
+
+    start = time.perf_counter()
+    venues.venues.load()
+    print(f"learned {len(venues.venues.names)} venues from {args.history} meetings "
+          f"in {1000 * (time.perf_counter() - start):.1f} ms")
+
+    truth = [rng.choice(VENUES) for _ in range(args.lookups)]
+    stream = [spelling(rng, venue) for venue in truth]
+    remote = {}
+
+    async def lookup(place):
+        remote[place] = remote.get(place, 0) + 1
+        return f"{place} MRT (200 m, 3 mins walk)"
+
+    async def run():
+        exact = set()
+        timings = []
+        for place in stream:
+            exact.add(place)
+            start = time.perf_counter()
+            await venues.cached_lookup("mrt", place, lookup)
+            timings.append(time.perf_counter() - start)
+        return len(exact), timings
+
+    by_string, timings = asyncio.run(run())
+    by_venue = sum(remote.values())
+    claimed = {}
+    for place, venue in zip(stream, truth):
+        claimed.setdefault(venues.venues.resolve(place), set()).add(venue)
+    merged = sum(1 for names in claimed.values() if len(names) > 1)
+    print(f"{args.lookups} lookups of {len(VENUES)} venues")
+    print(f"  remote lookups, cached by exact string   {by_string:6}")
+    print(f"  remote lookups, cached by canonical venue {by_venue:5}   x{by_string / max(by_venue, 1):.1f} fewer")
+    print(f"  canonical venues {len(venues.venues.names)}, {merged} shared by different real venues")
+    print(f"  resolve + cache  p50 {1e6 * statistics.median(timings):.0f} us   "
+          f"max {1e6 * max(timings):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Local stand-ins for the services the bot and auth server talk to:
+Telegram Bot API, OpenAI (chat + audio), Google Maps and Microsoft
+login/Graph. They run in a background thread on 127.0.0.1 so blocking
+clients (requests, googlemaps) and asyncio clients can both reach them.
+
+    with FakeServices(latency={"openai_chat": 0.8}, error_rate=0.01) as fakes:
+        os.environ.update(fakes.env())
+        ...
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from aiohttp import web
+
+# Default per-service latency in seconds, roughly what production sees
+DEFAULT_LATENCY = {
+    "telegram": 0.0,
+    "openai_chat": 0.0,
+    "whisper": 0.0,
+    "maps": 0.0,
+    "ms_login": 0.0,
+    "graph": 0.0,
+}
+
+
+class FakeServices:
+    def __init__(self, latency=None, error_rate=0.0, seed=0, audio_bytes=b"", whisper_seconds_per_mb=0.0):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.whisper_seconds_per_mb = whisper_seconds_per_mb  # extra Whisper latency, proportional to upload size
+        self.error_rate = error_rate
+        self.audio_bytes = audio_bytes
+        self.calls = Counter()
+        self.sent = []  # every message the bot sent or edited, newest last
+        self.port = None
+        self._rng = random.Random(seed)
+        self._message_ids = itertools.count(1000)
+        self._token_ids = itertools.count(1)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # --- lifecycle ---
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-services", daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._build_app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def env(self):
+        """Environment variables that point the app at these fakes."""
+        return {
+            "BOT_TOKEN": "123456:fake-token",
+            "TELEGRAM_API_BASE_URL": f"{self.base_url}/bot",
+            "TELEGRAM_FILE_BASE_URL": f"{self.base_url}/file/bot",
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "GOOGLE_MAPS_API_KEY": "AIzaFakeKey",
+            "GOOGLE_MAPS_BASE_URL": self.base_url,
+            "MS_CLIENT_ID": "fake-client",
+            "MS_CLIENT_SECRET": "fake-secret",
+            "MS_REDIRECT_URI": "http://localhost/callback",
+            "MS_LOGIN_BASE_URL": self.base_url,
+            "MS_GRAPH_BASE_URL": f"{self.base_url}/v1.0",
+            "DOMAIN_BASE_URL": "http://localhost",
+        }
+
+    # --- helpers ---
+
+    async def _delay_or_fail(self, service):
+        """Apply the configured latency; return True if this call should fail."""
+        self.calls[service] += 1
+        delay = self.latency.get(service, 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._rng.random() < self.error_rate
+
+    @staticmethod
+    async def _params(request):
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.method == "GET":
+            return dict(request.query)
+        form = await request.post()
+        params = {}
+        for key, value in form.items():
+            if isinstance(value, web.FileField):
+                continue
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    def _build_app(self):
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.telegram)
+        app.router.add_get("/file/bot{token}/{path:.*}", self.telegram_file)
+        app.router.add_post("/v1/chat/completions", self.openai_chat)
+        app.router.add_post("/v1/audio/transcriptions", self.whisper)
+        app.router.add_get("/maps/api/geocode/json", self.maps_geocode)
+        app.router.add_get("/maps/api/place/nearbysearch/json", self.maps_nearby)
+        app.router.add_get("/maps/api/distancematrix/json", self.maps_distance)
+        app.router.add_post("/{tenant}/oauth2/v2.0/token", self.ms_token)
+        app.router.add_post("/v1.0/me/events", self.graph_events)
+        app.router.add_get("/v1.0/me", self.graph_me)
+        app.router.add_post("/v1.0/me/calendar/getSchedule", self.graph_schedule)
+        return app
+
+    # --- Telegram Bot API ---
+
+    async def telegram(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if await self._delay_or_fail("telegram"):
+            return web.json_response({"ok": False, "error_code": 500, "description": "Injected error"})
+        self.calls[f"telegram.{method}"] += 1
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                      "can_join_groups": True, "can_read_all_group_messages": True,
+                      "supports_inline_queries": False}
+        elif method in ("sendMessage", "sendDocument", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            message_id = int(params.get("message_id") or next(self._message_ids))
+            markup = params.get("reply_markup")
+            self.sent.append({
+                "method": method,
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "text": params.get("text") or params.get("caption"),
+                "reply_markup": markup if isinstance(markup, dict) else None,
+            })
+            result = {"message_id": message_id, "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "group", "title": "Bench"},
+                      "text": params.get("text") or ""}
+        elif method == "getFile":
+            file_id = params.get("file_id", "voice")
+            result = {"file_id": file_id, "file_unique_id": f"u-{file_id}",
+                      "file_size": len(self.audio_bytes), "file_path": f"voice/{file_id}.ogg"}
+        else:
+            # answerCallbackQuery, deleteWebhook, setMyCommands, ...
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def telegram_file(self, request):
+        if await self._delay_or_fail("telegram"):
+            return web.Response(status=500)
+        return web.Response(body=self.audio_bytes, content_type="audio/ogg")
+
+    # --- OpenAI ---
+
+    async def openai_chat(self, request):
+        body = await request.json()
+        # Optional per-model latency on top of openai_chat's, e.g. latency={"openai_chat:gpt-4o": 2.0}
+        extra = self.latency.get(f"openai_chat:{body.get('model')}", 0.0)
+        if extra:
+            await asyncio.sleep(extra)
+        if await self._delay_or_fail("openai_chat"):
+            return web.json_response({"error": {"message": "Injected error", "type": "server_error"}}, status=500)
+        meet_day = date.today() + timedelta(days=7)
+        content = (
+            f"📅 Date: {meet_day.strftime('%d %B %Y')}\n"
+            "🕒 Time: 7:00 PM\n"
+            "📍 Place: Jem\n"
+            "🚇 Nearest MRT: <nearest_mrt_info>\n"
+            "🚌 Nearest Bus Stop: <bus_stop_info>\n"
+            "👥 Pax: 4\n"
+            "🎯 Activity: Dinner"
+        )
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        return web.json_response({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 60,
+                      "total_tokens": prompt_chars // 4 + 60},
+        })
+
+    async def whisper(self, request):
+        body = await request.read()
+        if self.whisper_seconds_per_mb:
+            await asyncio.sleep(len(body) / 1e6 * self.whisper_seconds_per_mb)
+        if await self._delay_or_fail("whisper"):
+            return web.json_response({"error": {"message": "Injected error"}}, status=500)
+        return web.json_response({"text": "I'm free next Saturday after 4pm at Jem"})
+
+    # --- Google Maps ---
+
+    async def maps_geocode(self, request):
+        if await self._delay_or_fail("maps"):
+            return web.json_response({"status": "UNKNOWN_ERROR", "results": []}, status=500)
+        return web.json_response({"status": "OK", "results": [
+            {"geometry": {"location": {"lat": 1.3329, "lng": 103.7436}}}
+        ]})
+
+    async def maps_nearby(self, request):
+        if await self._delay_or_fail("maps"):
+            return web.json_response({"status": "UNKNOWN_ERROR", "results": []}, status=500)
+        return web.json_response({"status": "OK", "results": [
+            {"name": f"Jurong East MRT {i}", "geometry": {"location": {"lat": 1.3331 + i / 1000, "lng": 103.7422}}}
+            for i in range(3)
+        ]})
+
+    async def maps_distance(self, request):
+        if await self._delay_or_fail("maps"):
+            return web.json_response({"status": "UNKNOWN_ERROR", "rows": []}, status=500)
+        meters = self._rng.randint(100, 1500)
+        return web.json_response({"status": "OK", "rows": [{"elements": [{
+            "status": "OK",
+            "distance": {"value": meters, "text": f"{meters / 1000:.1f} km"},
+            "duration": {"value": meters, "text": f"{meters // 80 + 1} mins"},
+        }]}]})
+
+    # --- Microsoft login / Graph ---
+
+    async def ms_token(self, request):
+        await request.post()
+        if await self._delay_or_fail("ms_login"):
+            return web.json_response({"error": "server_error"}, status=500)
+        return web.json_response({"access_token": f"fake-access-{next(self._token_ids)}", "refresh_token": "fake-refresh",
+                                  "expires_in": 3600, "token_type": "Bearer"})
+
+    async def graph_events(self, request):
+        await request.read()
+        if await self._delay_or_fail("graph"):
+            return web.json_response({"error": {"code": "ServiceUnavailable"}}, status=503)
+        return web.json_response({"id": "fake-event"}, status=201)
+
+    async def graph_me(self, request):
+        if await self._delay_or_fail("graph"):
+            return web.json_response({"error": {"code": "ServiceUnavailable"}}, status=503)
+        # One mailbox per issued token: "Bearer fake-access-7" -> user7@example.com
+        number = request.headers.get("Authorization", "").rsplit("-", 1)[-1]
+        return web.json_response({"mail": f"user{number}@example.com", "displayName": f"User {number}"})
+
+    async def graph_schedule(self, request):
+        body = await request.json()
+        if await self._delay_or_fail("graph"):
+            return web.json_response({"error": {"code": "ServiceUnavailable"}}, status=503)
+        self.calls["graph.getSchedule"] += 1
+        start = datetime.fromisoformat(body["startTime"]["dateTime"])
+        value = []
+        for email in body.get("schedules", []):
+            # Busy 01:00-03:00 UTC (9-11am Singapore) every day, plus one random evening
+            items = [
+                {"status": "busy",
+                 "start": {"dateTime": (start + timedelta(days=d, hours=1)).isoformat(), "timeZone": "UTC"},
+                 "end": {"dateTime": (start + timedelta(days=d, hours=3)).isoformat(), "timeZone": "UTC"}}
+                for d in range(7)
+            ]
+            evening = start + timedelta(days=self._rng.randint(0, 13), hours=11)
+            items.append({"status": "tentative",
+                          "start": {"dateTime": evening.isoformat(), "timeZone": "UTC"},
+                          "end": {"dateTime": (evening + timedelta(hours=2)).isoformat(), "timeZone": "UTC"}})
+            value.append({"scheduleId": email, "availabilityView": "", "scheduleItems": items})
+        return web.json_response({"value": value})
@@ -0,0 +1,376 @@
+"""
+End-to-end replay benchmark. Synthetic group conversations are fed through
+the real bot handlers (and the OAuth callback) while every external
+service is served by benchmarks.fakes, so it runs offline on a laptop.
+
+    python -m benchmarks.replay --chats 20 --messages 40 --concurrency 5 \\
+        --latency openai_chat=0.8 --latency maps=0.05 --error-rate 0.01
+
+Reports per-step p50/p99 latency, overall update throughput and peak memory,
+and DB queries per handler call, then drains the bot as a redeploy would
+and reports how long that took. Calls over their QUERY_BUDGETS entry, or
+repeating one statement DB_REPEAT_THRESHOLD times, are counted as errors.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import timedelta
+from benchmarks.fakes import FakeServices
+
+CHAT_LINES = [
+    "hey guys when are we meeting",
+    "i'm free next saturday after 4",
+    "sat works, maybe 7pm?",
+    "can we do jem? easy for everyone",
+    "ok jem 7pm, 4 of us",
+    "dinner then arcade?",
+    "sounds good",
+    "i might be 10 mins late",
+]
+
+# Most queries one call may make. A regression that adds a lookup (or an
+# N+1 loop) to one of these fails the replay.
+QUERY_BUDGETS = {
+    "start_listening": 1,
+    "handle_group_message": 3,
+    "stop_listening": 4,
+    "find_meeting": 2,
+    "list_meetings": 2,
+    "repeat_meeting": 4,
+    "edit_occurrence": 3,
+    "meeting_button_handler": 1,
+    "callback:edit": 1,
+    "callback:editfield": 1,
+    "callback:setreminder": 1,
+    "callback:remind": 1,
+    "job:summarize": 3,
+    "job:transcribe": 4,
+    "job:outlook_event": 2,  # the meeting (read fresh, not from the cache) and the token
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(len(ordered) * pct / 100.0 + 0.5)) - 1)]
+
+
+class Replayer:
+    def __init__(self, app, fakes, voice_enabled=False):
+        self.app = app
+        self.fakes = fakes
+        self.voice_enabled = voice_enabled
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.updates = 0
+        app.add_error_handler(self._on_error)
+
+    async def _on_error(self, update, context):
+        self.errors[type(context.error).__name__] += 1
+
+    # --- update builders ---
+
+    @staticmethod
+    def _user(user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id % 100}"}
+
+    def _message(self, chat_id, user_id, **fields):
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group", "title": f"Chat {chat_id}"},
+            "from": self._user(user_id),
+            **fields,
+        }
+
+    async def _dispatch(self, kind, payload):
+        from telegram import Update
+        update = Update.de_json({"update_id": next(self.update_ids), **payload}, self.app.bot)
+        start = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        self.latencies[kind].append(time.perf_counter() - start)
+        self.updates += 1
+
+    async def command(self, chat_id, user_id, command, *args, kind=None):
+        text = " ".join([f"/{command}", *args])
+        entities = [{"type": "bot_command", "offset": 0, "length": len(command) + 1}]
+        await self._dispatch(kind or command, {"message": self._message(chat_id, user_id, text=text, entities=entities)})
+
+    async def text(self, chat_id, user_id, text, kind="message"):
+        await self._dispatch(kind, {"message": self._message(chat_id, user_id, text=text)})
+
+    async def voice(self, chat_id, user_id):
+        voice = {"file_id": f"voice-{chat_id}", "file_unique_id": f"uvoice-{chat_id}", "duration": 2}
+        await self._dispatch("voice", {"message": self._message(chat_id, user_id, voice=voice)})
+
+    async def click(self, chat_id, user_id, label, kind):
+        """Press the button containing `label` on the newest keyboard the bot sent to this chat."""
+        for sent in reversed(self.fakes.sent):
+            if sent["chat_id"] != chat_id or not sent["reply_markup"]:
+                continue
+            for row in sent["reply_markup"].get("inline_keyboard", []):
+                for button in row:
+                    if label in button.get("text", ""):
+                        message = self._message(chat_id, 1, text=sent["text"] or "")
+                        message["message_id"] = sent["message_id"]
+                        await self._dispatch(kind, {"callback_query": {
+                            "id": str(next(self.update_ids)),
+                            "from": self._user(user_id),
+                            "chat_instance": str(chat_id),
+                            "data": button["callback_data"],
+                            "message": message,
+                        }})
+                        return True
+            return False
+        return False
+
+    # --- non-Telegram entry points ---
+
+    async def reminder(self, chat_id, meeting_id):
+        import MeetCoordinator
+        start = time.perf_counter()
+        await MeetCoordinator.send_reminder(self.app.bot, chat_id, meeting_id, 1440)
+        self.latencies["reminder"].append(time.perf_counter() - start)
+
+    async def oauth_callback(self, http, user_id, meeting_id):
+        state = json.dumps({"telegram_id": user_id, "meeting_id": meeting_id})
+        state = base64.urlsafe_b64encode(state.encode()).decode().rstrip("=")
+        start = time.perf_counter()
+        response = await http.get("/callback", params={"code": "fake-code", "state": state})
+        self.latencies["oauth_callback"].append(time.perf_counter() - start)
+        if "✅" not in response.text:
+            self.errors["oauth_callback"] += 1
+
+    # --- scenario ---
+
+    async def listen(self, chat_id, users, n_messages, stop_kind="stoplistening"):
+        await self.command(chat_id, users[0], "startlistening")
+        for i in range(n_messages):
+            await self.text(chat_id, users[i % len(users)], CHAT_LINES[i % len(CHAT_LINES)])
+        if self.voice_enabled:
+            await self.voice(chat_id, users[-1])
+        await self.command(chat_id, users[0], "stoplistening", kind=stop_kind)
+        await self.wait_for_jobs(f"{stop_kind}_summary_ready")
+
+    async def wait_for_jobs(self, kind):
+        """Summaries, transcription and Outlook sync run in the job queue; time until it drains."""
+        from jobqueue import jobs
+        start = time.perf_counter()
+        if not await jobs.join(timeout=60):
+            self.errors["job_queue_timeout"] += 1
+        self.latencies[kind].append(time.perf_counter() - start)
+
+    async def replay_chat(self, http, chat_id, n_messages, n_users):
+        from db import SessionLocal, Meeting
+
+        users = [chat_id * 100 + i for i in range(n_users)]
+        await self.listen(chat_id, users, n_messages)
+
+        db = SessionLocal()
+        meeting = db.query(Meeting).filter_by(chat_id=chat_id).order_by(Meeting.id.desc()).first()
+        meeting_id = meeting.id if meeting else None
+        meet_date = meeting.meet_date if meeting else None
+        db.close()
+        if meeting_id is None:
+            self.errors["no_meeting_saved"] += 1
+            return
+
+        # Edit the time through the inline keyboard
+        if await self.click(chat_id, users[0], "Edit", "click_edit"):
+            if await self.click(chat_id, users[0], "Time", "click_edit_field"):
+                await self.text(chat_id, users[0], "8pm", kind="edit_value")
+
+        # Set a reminder, then fire it
+        if await self.click(chat_id, users[0], "Set Reminder", "click_set_reminder"):
+            await self.click(chat_id, users[0], "24 h", "click_reminder_preset")
+        await self.reminder(chat_id, meeting_id)
+
+        await self.oauth_callback(http, users[0], meeting_id)
+        await self.wait_for_jobs("outlook_sync_ready")
+
+        # Plan again now that a member has linked Outlook (free/busy lookup)
+        await self.listen(chat_id, users, n_messages, stop_kind="stoplistening_linked")
+
+        await self.command(chat_id, users[1], "findmeeting", "jem", "dinner")
+
+        # Make it weekly, skip the second week and list what's coming up
+        if meet_date:
+            await self.command(chat_id, users[0], "repeatmeeting", str(meeting_id), "weekly")
+            second = (meet_date + timedelta(days=7)).isoformat()
+            await self.command(chat_id, users[0], "editoccurrence", str(meeting_id), second, "skip")
+            await self.command(chat_id, users[1], "listmeetings")
+            if not any(sent["chat_id"] == chat_id and "🔁" in (sent["text"] or "") for sent in self.fakes.sent):
+                self.errors["recurring_not_listed"] += 1
+
+
+def make_test_audio(directory):
+    """A short Opus clip for the voice path; None when ffmpeg is unavailable."""
+    if not shutil.which("ffmpeg"):
+        return None
+    path = os.path.join(directory, "tone.ogg")
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=2",
+         "-c:a", "libopus", path],
+        check=True,
+    )
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def run(args, fakes, workdir):
+    import httpx
+    import db
+    import MeetCoordinator
+    import auth_server
+    import venues
+    import drain
+
+    from jobqueue import jobs
+
+    db.init_db()
+    app = MeetCoordinator.build_application()
+    await app.initialize()
+    await jobs.start()
+    venues.venues.load()
+    replayer = Replayer(app, fakes, voice_enabled=bool(fakes.audio_bytes))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=auth_server.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        if (await http.get("/readyz")).status_code != 200:
+            replayer.errors["readyz"] += 1
+
+        async def one_chat(chat_id):
+            async with semaphore:
+                await replayer.replay_chat(http, chat_id, args.messages, args.users)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_chat(-1000 - i) for i in range(args.chats)))
+        wall = time.perf_counter() - start
+
+    drained = await drain.shutdown(app, jobs, MeetCoordinator.checkpoint_state)
+    if drain.is_ready()[0]:
+        replayer.errors["ready_while_draining"] += 1
+    await app.shutdown()
+    return replayer, wall, drained
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chats", type=int, default=10)
+    ap.add_argument("--messages", type=int, default=20, help="chat messages per conversation")
+    ap.add_argument("--users", type=int, default=4, help="participants per chat")
+    ap.add_argument("--concurrency", type=int, default=1, help="conversations replayed at once")
+    ap.add_argument("--latency", action="append", default=[], metavar="SERVICE=SECONDS",
+                    help="per-service latency (telegram, openai_chat, openai_chat:<model>, whisper, maps, ms_login, graph)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake calls that fail")
+    ap.add_argument("--tracemalloc", action="store_true", help="also report peak Python heap (slower)")
+    ap.add_argument("--json", help="write the report to this file")
+    args = ap.parse_args()
+
+    latency = {}
+    for item in args.latency:
+        service, _, seconds = item.partition("=")
+        latency[service] = float(seconds)
+
+    workdir = tempfile.mkdtemp(prefix="meetbot-bench-")
+    audio = make_test_audio(workdir) or b""
+    fakes = FakeServices(latency=latency, error_rate=args.error_rate, audio_bytes=audio).start()
+
+    # Must be in place before the app modules read their configuration
+    os.environ.update(fakes.env())
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    logging.disable(logging.WARNING)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        replayer, wall, drained = asyncio.run(run(args, fakes, workdir))
+    finally:
+        fakes.stop()
+    heap_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    import MeetCoordinator
+    import metrics
+    queries = metrics.query_budget_report()
+    for name, row in sorted(queries.items()):
+        budget = QUERY_BUDGETS.get(name)
+        if budget is not None and row["max_queries"] > budget:
+            replayer.errors[f"query_budget:{name}"] += 1
+        if row["max_repeats"] >= metrics.REPEAT_THRESHOLD:
+            replayer.errors[f"repeated_query:{name}"] += 1
+    costs = {dict(key)["route"]: value for key, value in metrics.snapshot("summary_cost_usd_total").items()}
+    routes = {
+        route: {"calls": row["calls"], "p50_ms": round(1000 * row["p50"], 2), "p99_ms": round(1000 * row["p99"], 2),
+                "cost_usd": round(costs.get(route, 0.0), 6)}
+        for route, row in sorted(MeetCoordinator.summary_router.stats().items())
+    }
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    report = {
+        "chats": args.chats,
+        "updates": replayer.updates,
+        "wall_seconds": round(wall, 3),
+        "drain_seconds": round(drained, 3),
+        "updates_per_second": round(replayer.updates / wall, 1) if wall else 0.0,
+        "peak_rss_mb": round(rss_peak / 2**20, 1),
+        "peak_heap_mb": round(heap_peak / 2**20, 1) if heap_peak is not None else None,
+        "errors": dict(replayer.errors),
+        "fake_calls": dict(fakes.calls),
+        "summary_routes": routes,
+        "queries": {name: {**row, "budget": QUERY_BUDGETS.get(name)} for name, row in sorted(queries.items())},
+        "steps": {
+            kind: {
+                "count": len(values),
+                "p50_ms": round(1000 * percentile(values, 50), 2),
+                "p99_ms": round(1000 * percentile(values, 99), 2),
+                "mean_ms": round(1000 * statistics.mean(values), 2),
+            }
+            for kind, values in sorted(replayer.latencies.items())
+        },
+    }
+
+    print(f"{'step':<24} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for kind, row in report["steps"].items():
+        print(f"{kind:<24} {row['count']:>6} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['mean_ms']:>9.2f}")
+    for route, row in routes.items():
+        print(f"summary route {route:<10} {row['calls']:>6} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+              f"   ${row['cost_usd']:.4f}")
+    print(f"\n{'queries per call':<24} {'calls':>6} {'mean':>9} {'max':>9} {'budget':>9}")
+    for name, row in report["queries"].items():
+        print(f"{name:<24} {row['calls']:>6} {row['mean_queries']:>9} {row['max_queries']:>9} "
+              f"{row['budget'] if row['budget'] is not None else '-':>9}")
+    print(f"\n{report['updates']} updates across {args.chats} chats in {report['wall_seconds']} s "
+          f"({report['updates_per_second']} updates/s)")
+    print(f"drained in {report['drain_seconds']} s")
+    print(f"peak RSS {report['peak_rss_mb']} MB"
+          + (f", peak Python heap {report['peak_heap_mb']} MB" if heap_peak is not None else ""))
+    if not audio:
+        print("voice path skipped: ffmpeg not found")
+    if replayer.errors:
+        print(f"errors: {dict(replayer.errors)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Compact callback_data codec and constant-time callback dispatch.
+
+Payload layout (before base64url, no padding, prefixed with "~"):
+
+    [version:1][action:1][meeting_id:varint][arg:varint][extra:bytes]
+
+Typical payloads are 8-12 characters, leaving most of Telegram's 64-byte
+callback_data limit for `extra` (e.g. pagination cursors). A payload with
+an unknown version or action is rejected after reading two bytes.
+"""
+import base64
+import metrics
+from collections import namedtuple
+
+CODEC_VERSION = 1
+PREFIX = "~"
+
+# Wire codes. Never renumber: buttons already sent to chats carry these.
+ACTIONS = {
+    "edit": 1,
+    "editfield": 2,
+    "delete_prompt": 3,
+    "confirm_delete": 4,
+    "cancel_delete": 5,
+    "view": 6,
+    "setreminder": 7,
+    "cancel_reminder": 8,
+    "remind": 9,
+    "remindcustom": 10,
+    "findmore": 11,
+}
+ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+
+# Actions whose argument is one of a fixed set of strings, sent as its index
+ARG_CHOICES = {
+    "editfield": ("date", "time", "place", "pax", "activity"),
+}
+
+Callback = namedtuple("Callback", "action meeting_id arg extra")
+
+
+def _put_varint(out: bytearray, value: int):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _get_varint(raw: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode(action: str, meeting_id: int, arg=0, extra: bytes = b"") -> str:
+    """callback_data string for `action` on `meeting_id`."""
+    if action in ARG_CHOICES:
+        arg = ARG_CHOICES[action].index(arg)
+    out = bytearray((CODEC_VERSION, ACTIONS[action]))
+    _put_varint(out, meeting_id)
+    _put_varint(out, arg)
+    out += extra
+    data = PREFIX + base64.urlsafe_b64encode(bytes(out)).decode().rstrip("=")
+    if len(data.encode()) > 64:
+        raise ValueError(f"callback_data too long ({len(data)} bytes)")
+    return data
+
+
+def _decode_legacy(data: str):
+    """Buttons sent before the codec existed: 'action:meeting_id[:arg]'."""
+    name, _, rest = data.partition(":")
+    if name not in ACTIONS or not rest:
+        return None
+    parts = rest.split(":")
+    arg = parts[1] if len(parts) > 1 else 0
+    if name in ARG_CHOICES:
+        if arg not in ARG_CHOICES[name]:
+            return None
+    else:
+        arg = int(arg)
+    return Callback(name, int(parts[0]), arg, b"")
+
+
+def decode(data: str):
+    """Callback tuple for `data`, or None if it is malformed or from another codec version."""
+    try:
+        if not data.startswith(PREFIX):
+            return _decode_legacy(data)
+        raw = base64.urlsafe_b64decode(data[1:] + "=" * (-(len(data) - 1) % 4))
+        if len(raw) < 4 or raw[0] != CODEC_VERSION or raw[1] not in ACTION_NAMES:
+            return None
+        name = ACTION_NAMES[raw[1]]
+        meeting_id, pos = _get_varint(raw, 2)
+        arg, pos = _get_varint(raw, pos)
+        if name in ARG_CHOICES:
+            arg = ARG_CHOICES[name][arg]
+        return Callback(name, meeting_id, arg, raw[pos:])
+    except (ValueError, IndexError):
+        return None
+
+
+class CallbackRouter:
+    """Maps decoded action names to handlers: handler(update, context, query, callback)."""
+
+    def __init__(self):
+        self._routes = {}
+
+    def route(self, action: str):
+        if action not in ACTIONS:
+            raise KeyError(f"Unknown callback action {action!r}")
+
+        def register(handler):
+            self._routes[action] = handler
+            return handler
+        return register
+
+    async def dispatch(self, update, context):
+        query = update.callback_query
+        callback = decode(query.data or "")
+        handler = self._routes.get(callback.action) if callback else None
+        if handler is None:
+            # catch any unknown or stale callback_data
+            return await query.answer("⚠️ This action is no longer available.", show_alert=True)
+        await query.answer()
+        with metrics.query_scope(f"callback:{callback.action}"):
+            return await handler(update, context, query, callback)
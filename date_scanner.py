@@ -0,0 +1,100 @@
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+from lazy import lazy_import
+
+dateparser = lazy_import("dateparser")
+
+_WEEKDAYS = r"(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+
+# All date tokens the raw-chat fallback understands, as one alternation.
+# Each kind gets its own named group so a single finditer() pass tells us
+# both where a candidate is and how explicit it is. The leading lookahead
+# lets the engine skip positions that cannot start any alternative.
+DATE_CANDIDATE_RE = re.compile(
+    r"(?=[0-9tn])\b(?:"
+    rf"(?P<day_month>\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTHS})"
+    r"|(?P<slash>\d{1,2}/\d{1,2}(?:/\d{2,4})?)"
+    r"|(?P<dash>\d{1,2}-\d{1,2}(?:-\d{2,4})?)"
+    rf"|(?P<next_weekday>next\s+{_WEEKDAYS})"
+    rf"|(?P<this_weekday>this\s+{_WEEKDAYS})"
+    r"|(?P<tomorrow>tomorrow|tmr)"
+    r"|(?P<today>today|tdy)"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# Higher = more explicit. A spelled-out "12th Aug" beats "12/8", which beats
+# a relative "next friday", which beats a bare "tmr".
+EXPLICITNESS = {
+    "day_month": 6,
+    "slash": 5,
+    "dash": 4,
+    "next_weekday": 3,
+    "this_weekday": 3,
+    "tomorrow": 2,
+    "today": 1,
+}
+
+# Chat shorthand dateparser does not know.
+SHORTHAND = {"tmr": "tomorrow", "tdy": "today"}
+
+# Only this many of the best-ranked candidates are handed to dateparser.
+MAX_PARSES = 3
+
+
+def _plausible(kind, text):
+    """Cheap check that numeric tokens like "45-50" or "13/40" could be a date."""
+    if kind not in ("slash", "dash"):
+        return True
+    first, second = (int(p) for p in re.split(r"[/-]", text)[:2])
+    return 1 <= first <= 31 and 1 <= second <= 31 and min(first, second) <= 12
+
+
+def scan_date_candidates(messages):
+    """
+    Scan every message in one regex pass over the joined transcript.
+    Returns (text, explicitness, message_index) tuples, best first:
+    most explicit, then most recent. Duplicate texts keep their latest hit,
+    and number pairs that cannot be a day/month are dropped before ranking.
+    """
+    offsets = []
+    position = 0
+    for msg in messages:
+        offsets.append(position)
+        position += len(msg) + 1  # +1 for the joining newline
+
+    transcript = "\n".join(messages)
+    best = {}
+    for match in DATE_CANDIDATE_RE.finditer(transcript):
+        text = match.group(0).lower()
+        if not _plausible(match.lastgroup, text):
+            continue
+        index = bisect_right(offsets, match.start()) - 1
+        best[text] = (text, EXPLICITNESS[match.lastgroup], index)
+
+    return sorted(best.values(), key=lambda c: (c[1], c[2]), reverse=True)
+
+
+def find_fallback_date(messages, current_date: date, max_parses: int = MAX_PARSES):
+    """
+    Return the best future date mentioned in `messages`, or None.
+    Only the top `max_parses` candidates are parsed.
+    Same-month/day parses are clamped back to the current year.
+    """
+    settings = {
+        'RELATIVE_BASE': datetime.combine(current_date, datetime.min.time()),
+        'PREFER_DATES_FROM': 'future'
+    }
+
+    for text, _, _ in scan_date_candidates(messages)[:max_parses]:
+        parsed = dateparser.parse(SHORTHAND.get(text, text), settings=settings)
+        if not parsed:
+            continue
+        if parsed.month == current_date.month and parsed.day == current_date.day:
+            parsed = parsed.replace(year=current_date.year)
+        if parsed.date() >= current_date:
+            return parsed.date()
+
+    return None
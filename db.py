@@ -1,17 +1,109 @@
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, DateTime, Date
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import (create_engine, event, inspect, text, Index, UniqueConstraint, ForeignKey, Column, Integer,
+                        BigInteger, String, Text, DateTime, Date, Boolean)
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from datetime import datetime, date
+from functools import lru_cache
 import os
+import time
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
-# Use Railway PostgreSQL URL from your .env
-DATABASE_URL = os.getenv("DATABASE_URL")  # e.g., postgresql://...
+# Use Railway PostgreSQL URL from your .env. An embedded SQLite file (for
+# single-node installs) has to be asked for with DB_BACKEND=sqlite: a deploy
+# that lost DATABASE_URL must fail, not start over on an empty local file.
+DB_BACKEND = os.getenv("DB_BACKEND", "").lower()
+DATABASE_URL = os.getenv("DATABASE_URL") or (
+    f"sqlite:///{os.getenv('SQLITE_PATH', 'meetbot.db')}" if DB_BACKEND == "sqlite" else "")
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
+
+@event.listens_for(Base, "load", propagate=True)
+def _count_loaded_row(target, context):
+    metrics.record_rows(1)
+
+# Applied to every SQLite connection. WAL lets readers run alongside the
+# single writer; synchronous=NORMAL only fsyncs at checkpoints, which is
+# safe against application crashes in WAL mode.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", "5000"),
+    ("foreign_keys", "ON"),
+    ("temp_store", "MEMORY"),
+    ("cache_size", "-16000"),     # 16 MB page cache
+    ("mmap_size", "134217728"),   # 128 MB memory-mapped reads
+)
+
+def is_sqlite() -> bool:
+    return DATABASE_URL.startswith("sqlite")
+
+def _create_sqlite_engine():
+    # A regular pool: connections (and their page cache) are reused, and any
+    # thread may check one out. ":memory:" keeps SQLAlchemy's default, one
+    # connection per thread, since every new connection would be a new database.
+    options = {} if ":memory:" in DATABASE_URL else {"poolclass": QueuePool, "pool_size": 8, "max_overflow": 8}
+    engine = create_engine(DATABASE_URL, echo=False, **options)
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    # Nobody provisions an embedded database, so create the schema here
+    Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    ensure_search_index(engine)
+    return engine
+
+def _count_queries(engine):
+    """Report every statement's time (and rows written) to the current handler's metrics.query_scope."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        # rowcount is only meaningful for writes; rows read are counted as the ORM loads them
+        written = cursor.rowcount if cursor.rowcount > 0 and statement.lstrip()[:6].upper() != "SELECT" else 0
+        metrics.record_query(statement, elapsed, written)
+
+    return engine
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """Engine (and DB driver) are only created when the first session is opened."""
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set (set DB_BACKEND=sqlite to use a local SQLite file)")
+    if is_sqlite():
+        return _count_queries(_create_sqlite_engine())
+    return _count_queries(create_engine(DATABASE_URL, echo=False))
+
+class InstrumentedSession(Session):
+    """Records how long each session stays open, labelled by the handler that opened it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._opened_at = time.perf_counter()
+        self._handler = metrics.current_handler.get() or "none"
+
+    def close(self):
+        if self._opened_at is not None:
+            metrics.observe("db_session_seconds", time.perf_counter() - self._opened_at, handler=self._handler)
+            self._opened_at = None
+        super().close()
+
+@lru_cache(maxsize=None)
+def get_sessionmaker():
+    return sessionmaker(bind=get_engine(), class_=InstrumentedSession)
+
+def SessionLocal():
+    return get_sessionmaker()()
 
 # Define models
 class Meeting(Base):
@@ -23,9 +115,39 @@ class Meeting(Base):
     place = Column(String, nullable=True)
     pax = Column(String, nullable=True)
     activity = Column(String, nullable=True)
-    meet_date = Column(Date, nullable=True)
+    meet_date = Column(Date, nullable=True)  # first occurrence, for recurring meetings
+    rrule = Column(String, nullable=True)  # RFC 5545 recurrence rule, see recurrence.py
+    recur_until = Column(Date, nullable=True)  # last occurrence of a finite rule
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class MeetingOverride(Base):
+    """One changed or cancelled occurrence of a recurring meeting (see recurrence.py)."""
+    __tablename__ = "meeting_overrides"
+    id = Column(Integer, primary_key=True)
+    meeting_id = Column(Integer, ForeignKey("meetings.id", ondelete="CASCADE"), nullable=False, index=True)
+    occurrence_date = Column(Date, nullable=False)  # the date the rule gives this occurrence
+    cancelled = Column(Boolean, default=False)
+    meet_date = Column(Date, nullable=True)  # moved to
+    time = Column(String, nullable=True)
+    place = Column(String, nullable=True)
+
+    __table_args__ = (UniqueConstraint("meeting_id", "occurrence_date"),)
+
+class ArchivedMeeting(Base):
+    """Past meetings moved out of `meetings` by the retention job (see retention.py)."""
+    __tablename__ = "meetings_archive"
+    id = Column(Integer, primary_key=True)  # same ID the meeting had in `meetings`
+    chat_id = Column(BigInteger, index=True)
+    summary = Column(Text)
+    time = Column(String, nullable=True)
+    place = Column(String, nullable=True)
+    pax = Column(String, nullable=True)
+    activity = Column(String, nullable=True)
+    meet_date = Column(Date, nullable=True)
+    rrule = Column(String, nullable=True)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 class OutlookToken(Base):
     __tablename__ = "outlook_tokens"
     id = Column(Integer, primary_key=True, index=True)
@@ -33,11 +155,115 @@ class OutlookToken(Base):
     access_token = Column(Text, nullable=False)
     refresh_token = Column(Text)
     expires_at = Column(DateTime)
+    email = Column(String, nullable=True)  # Graph address, used for free/busy lookups
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Transcript(Base):
+    """Cached Whisper output, see transcript_cache.py."""
+    __tablename__ = "transcripts"
+    id = Column(Integer, primary_key=True)
+    file_unique_id = Column(String, unique=True, index=True)  # Telegram's ID, stable across chats and forwards
+    sha256 = Column(String(64), index=True)  # of the downloaded audio, for re-uploads of the same clip
+    text = Column(Text, nullable=False)
+    duration = Column(Integer, default=0)  # seconds
+    hits = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Job(Base):
+    """Background work item, see jobqueue.py."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=True, index=True)  # jobs sharing a key run one at a time, in order
+    payload = Column(Text, nullable=False)  # JSON
+    priority = Column(Integer, default=5)  # lower runs first
+    status = Column(String, default="queued")  # queued | running | done | dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_at = Column(DateTime, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_jobs_claim", "status", "priority", "run_at"),)
+
+# Columns added after their table first shipped. create_all() never alters an
+# existing table, so these are added in place: (table, column, SQL type)
+ADDED_COLUMNS = (
+    ("outlook_tokens", "email", "VARCHAR"),
+    ("meetings", "rrule", "VARCHAR"),
+    ("meetings", "recur_until", "DATE"),
+    ("meetings_archive", "rrule", "VARCHAR"),
+)
+
+def ensure_columns(engine):
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column, sql_type in ADDED_COLUMNS:
+            if table in tables and column not in {c["name"] for c in inspector.get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+
+# Full-text search over meetings (see search.py). Place weighs most, then
+# activity, pax and the rest of the summary.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(place, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(activity, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(pax, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(summary, '')), 'D')"
+)
+
+POSTGRES_SEARCH_DDL = (
+    f"CREATE INDEX IF NOT EXISTS ix_meetings_search ON meetings USING GIN (({SEARCH_VECTOR_SQL}))",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_meetings_place_trgm ON meetings USING GIN (lower(place) gin_trgm_ops)",
+)
+
+# External-content FTS5 table kept in step with `meetings` by triggers
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS meetings_fts USING fts5("
+    "place, activity, pax, summary, content='meetings', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS meetings_fts_ai AFTER INSERT ON meetings BEGIN "
+    "INSERT INTO meetings_fts(rowid, place, activity, pax, summary) "
+    "VALUES (new.id, new.place, new.activity, new.pax, new.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS meetings_fts_ad AFTER DELETE ON meetings BEGIN "
+    "INSERT INTO meetings_fts(meetings_fts, rowid, place, activity, pax, summary) "
+    "VALUES ('delete', old.id, old.place, old.activity, old.pax, old.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS meetings_fts_au AFTER UPDATE ON meetings BEGIN "
+    "INSERT INTO meetings_fts(meetings_fts, rowid, place, activity, pax, summary) "
+    "VALUES ('delete', old.id, old.place, old.activity, old.pax, old.summary); "
+    "INSERT INTO meetings_fts(rowid, place, activity, pax, summary) "
+    "VALUES (new.id, new.place, new.activity, new.pax, new.summary); END",
+)
+
+def ensure_search_index(engine):
+    """Create the meeting search index; failures only disable ranked search (search.py falls back to LIKE)."""
+    if engine.dialect.name == "sqlite":
+        existed = "meetings_fts" in inspect(engine).get_table_names()
+        statements = SQLITE_SEARCH_DDL if existed else SQLITE_SEARCH_DDL + (
+            "INSERT INTO meetings_fts(meetings_fts) VALUES ('rebuild')",  # index rows saved before the table existed
+        )
+    elif engine.dialect.name == "postgresql":
+        statements = POSTGRES_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        except Exception as e:
+            print(f"⚠️ Meeting search index unavailable ({statement.split('(')[0][:60]}...): {e}")
+            if engine.dialect.name == "sqlite":
+                return
 
 # Initialize tables
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+    ensure_columns(get_engine())
+    ensure_search_index(get_engine())
 
 if __name__ == "__main__":
     init_db()
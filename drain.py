@@ -0,0 +1,144 @@
+"""
+Graceful drain for restarts and redeploys.
+
+Web servers (the gunicorn workers from startup.sh, or appentry) call
+flip_readiness_on_sigterm() at startup. On SIGTERM /readyz then answers
+503 straight away, while the server keeps serving for DRAIN_READY_GRACE
+seconds so the load balancer has time to notice before the server itself
+stops accepting connections.
+
+On SIGTERM (or the web app's lifespan shutdown) the bot:
+
+1. stops taking work: Telegram polling stops, so updates not fetched yet
+   wait on Telegram's side for the next instance;
+2. drains: updates already fetched and handlers already running get to
+   finish, then running jobs, all within DRAIN_TIMEOUT seconds. Jobs
+   still running at the deadline are cancelled, which puts them back in
+   the queue (see jobqueue.py);
+3. checkpoints the in-memory state (open listening sessions, edit flows,
+   pending reminders) as a "restore_state" job. The job sits in the
+   durable queue until the next instance, or one already running,
+   claims it and restores the state.
+
+    drain_seconds{phase}        histogram, phase updates/jobs/checkpoint/total
+    drain_cut_short_total{what} updates or jobs still running at the deadline
+    drain_checkpointed{kind}    gauge, items handed over in the last checkpoint
+
+Environment:
+    DRAIN_TIMEOUT       seconds for updates and jobs to finish (default 25,
+                        keep it under the process manager's kill timeout)
+    DRAIN_READY_GRACE   seconds a web server keeps serving with /readyz at
+                        503 before acting on SIGTERM (default 5)
+"""
+import asyncio
+import os
+import signal
+import threading
+import time
+from sqlalchemy import text
+from db import SessionLocal
+import metrics
+
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+READY_GRACE = float(os.getenv("DRAIN_READY_GRACE", "5"))
+CHECKPOINT_JOB = "restore_state"
+
+draining = False
+
+
+def is_ready():
+    """(ready, reason) for /readyz: not while draining, and only with a reachable database."""
+    if draining:
+        return False, "draining"
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    except Exception as e:
+        return False, f"database: {type(e).__name__}"
+    finally:
+        db.close()
+    return True, "ready"
+
+
+def flip_readiness_on_sigterm(grace: float = READY_GRACE):
+    """
+    Make SIGTERM mark this process not ready at once and reach the
+    server's own handler only `grace` seconds later (a second SIGTERM
+    passes straight through). Call from the server's lifespan startup,
+    after the server has installed its signal handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # signal handlers can only be set from the main thread
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def forward(sig):
+        signal.signal(sig, previous if previous is not None else signal.SIG_DFL)
+        if callable(previous):
+            previous(sig, None)
+        else:
+            signal.raise_signal(sig)
+
+    def handle(sig, frame):
+        global draining
+        if draining:
+            forward(sig)
+            return
+        draining = True
+        print(f"🛑 SIGTERM: not ready, stopping in {grace:.0f}s")
+        loop.call_soon_threadsafe(loop.call_later, grace, forward, sig)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+def updates_pending(app) -> int:
+    """Updates fetched but not yet finished: queued for dispatch or running in the update processor."""
+    return app.update_queue.qsize() + getattr(app.update_processor, "pending", 0)
+
+
+async def _wait_for_updates(app, deadline: float) -> int:
+    while updates_pending(app) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return updates_pending(app)
+
+
+async def shutdown(app, jobs, checkpoint, timeout: float = DRAIN_TIMEOUT):
+    """
+    Drain `app` and `jobs` within `timeout` seconds, then enqueue what
+    `checkpoint()` returns ({kind: [items]}) for the next instance.
+    Returns the seconds it took.
+    """
+    global draining
+    draining = True
+    start = time.monotonic()
+    deadline = start + timeout
+
+    if app.updater is not None and app.updater.running:
+        await app.updater.stop()
+    left = await _wait_for_updates(app, deadline)
+    metrics.observe("drain_seconds", time.monotonic() - start, phase="updates")
+    if left:
+        print(f"⚠️ Drain deadline: {left} update(s) still in progress")
+        metrics.inc("drain_cut_short_total", left, what="updates")
+
+    jobs_start = time.monotonic()
+    cut = await jobs.drain(max(0.0, deadline - jobs_start))
+    metrics.observe("drain_seconds", time.monotonic() - jobs_start, phase="jobs")
+    if cut:
+        print(f"⚠️ Drain deadline: {cut} job(s) requeued unfinished")
+        metrics.inc("drain_cut_short_total", cut, what="jobs")
+
+    checkpoint_start = time.monotonic()
+    state = checkpoint()
+    for kind, items in state.items():
+        metrics.set_gauge("drain_checkpointed", len(items), kind=kind)
+    if any(state.values()):
+        # Enqueued after our own workers stopped, so another instance picks it up
+        jobs.enqueue(CHECKPOINT_JOB, state, priority=1)
+    metrics.observe("drain_seconds", time.monotonic() - checkpoint_start, phase="checkpoint")
+
+    elapsed = time.monotonic() - start
+    metrics.observe("drain_seconds", elapsed, phase="total")
+    print(f"🛑 Drained in {elapsed:.2f}s; checkpointed "
+          + ", ".join(f"{len(items)} {kind}" for kind, items in state.items()))
+    return elapsed
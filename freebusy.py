@@ -0,0 +1,142 @@
+"""
+Outlook free/busy for the members of a chat.
+
+Members who linked Outlook (an `OutlookToken` with an email) are looked up
+together with one Graph `getSchedule` request, made with any one member's
+token, covering the next FREEBUSY_WINDOW_DAYS days. Busy intervals are
+cached per address for FREEBUSY_TTL seconds, so repeated summaries in a
+chat cost about one Graph call per chat per window rather than one per
+user per summary. At most MAX_CACHED addresses are kept, least recently
+used dropped first.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import pytz
+from db import SessionLocal, OutlookToken
+from lazy import lazy_import
+import metrics
+from availability import Slot
+
+aiohttp = lazy_import("aiohttp")
+
+GRAPH_BASE_URL = os.getenv("MS_GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+FREEBUSY_TTL = int(os.getenv("FREEBUSY_TTL", "300"))
+WINDOW_DAYS = int(os.getenv("FREEBUSY_WINDOW_DAYS", "14"))
+MAX_SCHEDULES_PER_CALL = 20  # Graph getSchedule limit
+MAX_CACHED = 5000
+SG_TZ = pytz.timezone("Asia/Singapore")
+
+# {chat_id: {telegram_user_id: display name}}, filled while the bot listens
+chat_members = {}
+
+_busy = OrderedDict()  # {email: (expires_at, window_end, [(start, end)])}, least recently used first
+
+
+def remember_member(chat_id: int, user_id: int, name: str):
+    chat_members.setdefault(chat_id, {})[user_id] = name
+
+
+def _local(graph_time: dict) -> datetime:
+    """Graph dateTimeTimeZone (requested in UTC) -> naive Singapore time."""
+    moment = datetime.fromisoformat(graph_time["dateTime"][:19])
+    return pytz.utc.localize(moment).astimezone(SG_TZ).replace(tzinfo=None)
+
+
+async def _get_schedule(access_token: str, emails, start: datetime, end: datetime):
+    body = {
+        "schedules": list(emails),
+        "startTime": {"dateTime": SG_TZ.localize(start).astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S"), "timeZone": "UTC"},
+        "endTime": {"dateTime": SG_TZ.localize(end).astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S"), "timeZone": "UTC"},
+        "availabilityViewInterval": 30,
+    }
+    headers = {"Authorization": f"Bearer {access_token}", "Prefer": 'outlook.timezone="UTC"'}
+    async with aiohttp.ClientSession() as session:
+        with metrics.timed("external_call", service="graph_schedule"):
+            async with session.post(f"{GRAPH_BASE_URL}/me/calendar/getSchedule", json=body, headers=headers) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+
+    busy = {}
+    for schedule in data.get("value", []):
+        busy[schedule["scheduleId"].lower()] = [
+            (_local(item["start"]), _local(item["end"]))
+            for item in schedule.get("scheduleItems", [])
+            if item.get("status") != "free"
+        ]
+    return busy
+
+
+async def busy_by_member(chat_id: int, now: datetime = None):
+    """{display name: [(start, end)]} busy intervals for the chat's linked members."""
+    members = chat_members.get(chat_id)
+    if not members:
+        return {}
+
+    db = SessionLocal()
+    rows = (
+        db.query(OutlookToken.telegram_user_id, OutlookToken.email, OutlookToken.access_token, OutlookToken.expires_at)
+        .filter(OutlookToken.telegram_user_id.in_(list(members)), OutlookToken.email.isnot(None))
+        .all()
+    )
+    db.close()
+    if not rows:
+        return {}
+
+    now = now or datetime.now(SG_TZ).replace(tzinfo=None)
+    names = {row.email.lower(): members[row.telegram_user_id] for row in rows}
+    clock = time.monotonic()
+    stale = [email for email in names if email not in _busy or _busy[email][0] < clock or _busy[email][1] < now + timedelta(days=1)]
+    metrics.inc("freebusy_lookups_total", len(names) - len(stale), result="hit")
+    metrics.inc("freebusy_lookups_total", len(stale), result="miss")
+
+    if stale:
+        valid = [row for row in rows if not row.expires_at or row.expires_at > datetime.utcnow()]
+        if valid:
+            token = max(valid, key=lambda row: row.expires_at or datetime.max).access_token
+            start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            end = start + timedelta(days=WINDOW_DAYS)
+            for i in range(0, len(stale), MAX_SCHEDULES_PER_CALL):
+                batch = stale[i:i + MAX_SCHEDULES_PER_CALL]
+                try:
+                    fetched = await _get_schedule(token, batch, start, end)
+                except Exception as e:
+                    print(f"⚠️ Free/busy lookup failed: {e}")
+                    metrics.inc("freebusy_errors_total")
+                    continue
+                for email in batch:
+                    _busy[email] = (clock + FREEBUSY_TTL, end, fetched.get(email, []))
+
+    found = {}
+    for email in names:
+        if email in _busy:
+            _busy.move_to_end(email)
+            found[names[email]] = _busy[email][2]
+    while len(_busy) > MAX_CACHED:
+        _busy.popitem(last=False)
+    return found
+
+
+def conflicts(busy, start: datetime, end: datetime):
+    """Names whose busy intervals overlap [start, end)."""
+    return [name for name, intervals in busy.items() if any(s < end and start < e for s, e in intervals)]
+
+
+def rerank(slots, busy):
+    """Drop participants whose calendar is busy during each slot, then re-sort as rank_slots does."""
+    adjusted = []
+    for slot in slots:
+        clash = set(conflicts({p: busy[p] for p in slot.participants if p in busy}, slot.start, slot.end))
+        free = [p for p in slot.participants if p not in clash]
+        adjusted.append(Slot(slot.start, slot.end, len(free), free))
+    adjusted.sort(key=lambda s: (-s.count, -(s.end - s.start), s.start))
+    return adjusted
+
+
+def annotation(busy, start: datetime, minutes: int = 60) -> str:
+    """Summary line saying whether the linked calendars are free for the meeting."""
+    clash = conflicts(busy, start, start + timedelta(minutes=minutes))
+    if clash:
+        return f"⚠️ Outlook: {', '.join(clash)} busy at this time"
+    return f"🗓️ Outlook: all {len(busy)} linked calendar(s) free"
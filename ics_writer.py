@@ -0,0 +1,128 @@
+"""
+Minimal RFC 5545 writer for meeting invites.
+
+Events are streamed straight into a binary buffer, one content line at a
+time, instead of building an `ics.Calendar` object graph. Output depends
+only on the events passed in (UIDs and DTSTAMPs come from the caller),
+so the same meetings always serialize to the same bytes and the result
+can be cached or compared.
+
+    buf = BytesIO()
+    write_calendar(buf, [Event(uid, "Group Meeting", summary, start, end)])
+"""
+from collections import namedtuple
+from datetime import datetime
+from io import BytesIO
+import pytz
+
+TZID = "Asia/Singapore"
+PRODID = "-//MeetCoordinator//Meeting Bot//EN"
+MAX_LINE_OCTETS = 75
+CRLF = b"\r\n"
+
+SG_TZ = pytz.timezone(TZID)
+
+# Singapore has had a fixed +08:00 offset and no DST since 1982
+_VTIMEZONE = (
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TZID}",
+    "BEGIN:STANDARD",
+    "DTSTART:19820101T000000",
+    "TZOFFSETFROM:+0800",
+    "TZOFFSETTO:+0800",
+    "TZNAME:+08",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+)
+
+# `start`/`end` are datetimes (naive ones are Singapore time); `stamp`
+# defaults to `start` so that output never depends on the clock. A
+# recurring event has an `rrule` (without the "RRULE:" prefix) and may skip
+# `exdates` (occurrence start datetimes); an event with a `recurrence_id`
+# replaces the occurrence of the same UID that would have started then.
+Event = namedtuple("Event", "uid title description start end location stamp rrule exdates recurrence_id",
+                   defaults=(None, None, None, (), None))
+
+
+def escape_ics_text(text: str) -> str:
+    """
+    Escapes characters according to RFC 5545 so that calendar apps can parse it correctly.
+    """
+    return (
+        text.replace('\\', '\\\\')  # Escape backslash
+            .replace('\r\n', '\n')  # Normalize Windows newlines
+            .replace('\n', '\\n')   # Escape newlines
+            .replace(',', '\\,')    # Escape commas
+            .replace(';', '\\;')    # Escape semicolons
+    )
+
+
+def fold(line: str) -> bytes:
+    """One content line as UTF-8, folded at 75 octets without splitting a character."""
+    data = line.encode("utf-8")
+    if len(data) <= MAX_LINE_OCTETS:
+        return data + CRLF
+    parts = []
+    start, limit = 0, MAX_LINE_OCTETS
+    while len(data) - start > limit:
+        cut = start + limit
+        while data[cut] & 0xC0 == 0x80:  # UTF-8 continuation byte: back up to the character start
+            cut -= 1
+        parts.append(data[start:cut])
+        start, limit = cut, MAX_LINE_OCTETS - 1  # continuation lines start with a space
+    parts.append(data[start:])
+    return b"\r\n ".join(parts) + CRLF
+
+
+def _local(moment: datetime) -> str:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(SG_TZ)
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _utc(moment: datetime) -> str:
+    if moment.tzinfo is None:
+        moment = SG_TZ.localize(moment)
+    return moment.astimezone(pytz.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def write_event(out, event: Event):
+    write = out.write
+    write(b"BEGIN:VEVENT\r\n")
+    write(fold(f"UID:{event.uid}"))
+    write(fold(f"DTSTAMP:{_utc(event.stamp or event.start)}"))
+    write(fold(f"DTSTART;TZID={TZID}:{_local(event.start)}"))
+    write(fold(f"DTEND;TZID={TZID}:{_local(event.end)}"))
+    if event.recurrence_id:
+        write(fold(f"RECURRENCE-ID;TZID={TZID}:{_local(event.recurrence_id)}"))
+    if event.rrule:
+        write(fold(f"RRULE:{event.rrule}"))
+    if event.exdates:
+        write(fold(f"EXDATE;TZID={TZID}:{','.join(_local(moment) for moment in event.exdates)}"))
+    write(fold(f"SUMMARY:{escape_ics_text(event.title.strip())}"))
+    if event.description:
+        write(fold(f"DESCRIPTION:{escape_ics_text(event.description)}"))
+    if event.location:
+        write(fold(f"LOCATION:{escape_ics_text(event.location)}"))
+    write(b"END:VEVENT\r\n")
+
+
+def write_calendar(out, events):
+    """Write a VCALENDAR with every event in `events` (any iterable) to the binary stream `out`."""
+    out.write(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n")
+    out.write(fold(f"PRODID:{PRODID}"))
+    out.write(b"CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n")
+    for line in _VTIMEZONE:
+        out.write(fold(line))
+    for event in events:
+        write_event(out, event)
+    out.write(b"END:VCALENDAR\r\n")
+
+
+def calendar_file(events, name: str = "meeting.ics") -> BytesIO:
+    """The calendar as a rewound BytesIO named for Telegram uploads."""
+    buf = BytesIO()
+    write_calendar(buf, events)
+    buf.name = name
+    buf.seek(0)
+    return buf
@@ -0,0 +1,328 @@
+"""
+Persistent background job queue.
+
+Update handlers and HTTP routes enqueue a job (a row in `jobs`) and return
+straight away; worker tasks in the bot process claim jobs by priority and
+run the registered handler. A slow upstream therefore shows up as queue
+depth rather than as handler timeouts.
+
+- Jobs sharing a `key` (e.g. a chat) run one at a time, oldest first.
+- A failing job is retried with exponential backoff and jitter; after
+  `max_attempts` it is dead-lettered (status "dead", kept for inspection)
+  and the handler's `on_dead` callback is told.
+- A running job's lease (`locked_at`) is renewed by its process every
+  LEASE_SECONDS / 3 at most, so only jobs left "running" by a crashed
+  process are requeued once their lease expires, not slow ones.
+- CPU-bound steps run in a process pool via `jobs.run_cpu()`.
+- `drain()` stops claiming new jobs and gives running ones a deadline
+  before shutting down (see drain.py).
+
+Environment:
+    JOB_WORKERS          concurrent asyncio workers (default 4)
+    JOB_CPU_WORKERS      processes in the CPU pool (default 2)
+    JOB_POLL_SECONDS     idle poll interval (default 1)
+    JOB_LEASE_SECONDS    time without a lease renewal after which a running job
+                         is presumed lost (default 300)
+"""
+import asyncio
+import json
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import exists, func, or_
+from sqlalchemy.orm import aliased
+from db import SessionLocal, Job
+import metrics
+
+WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+CPU_WORKERS = int(os.getenv("JOB_CPU_WORKERS", "2"))
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+KEEP_DONE = timedelta(hours=24)
+MAINTENANCE_SECONDS = min(60.0, LEASE_SECONDS / 3)
+
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+
+class JobQueue:
+    def __init__(self, workers: int = WORKERS, cpu_workers: int = CPU_WORKERS):
+        self.workers = workers
+        self.cpu_workers = cpu_workers
+        self._handlers = {}  # {kind: (handle, priority, max_attempts, on_dead)}
+        self._max_running = {}  # {kind: cap}, from the kind's admission controller
+        self._running = Counter()  # {kind: jobs running in this process}
+        self._leased = set()  # ids of the jobs running in this process, whose leases we renew
+        self._tasks = []
+        self._wakeup = None
+        self._pool = None
+        self._draining = False
+
+    # --- producer API ---
+
+    def handler(self, kind: str, priority: int = PRIORITY_NORMAL, max_attempts: int = 5, on_dead=None,
+                admission=None):
+        """Register `async def handle(payload)` for jobs of `kind`, optionally capped by an AdmissionController."""
+        def register(handle):
+            self._handlers[kind] = (handle, priority, max_attempts, on_dead)
+            if admission is not None:
+                self._max_running[kind] = admission.max_running
+            return handle
+        return register
+
+    def enqueue(self, kind: str, payload: dict, key: str = None, priority: int = None,
+                max_attempts: int = None, delay: float = 0) -> int:
+        """Persist a job and wake an idle worker. Returns the job ID."""
+        _, default_priority, default_attempts, _ = self._handlers.get(kind, (None, PRIORITY_NORMAL, 5, None))
+        db = SessionLocal()
+        try:
+            job = Job(
+                kind=kind,
+                key=key,
+                payload=json.dumps(payload),
+                priority=default_priority if priority is None else priority,
+                max_attempts=max_attempts or default_attempts,
+                run_at=datetime.utcnow() + timedelta(seconds=delay),
+            )
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        finally:
+            db.close()
+        metrics.inc("jobs_enqueued_total", kind=kind)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def has_pending(self, kind: str, key: str = None) -> bool:
+        """Whether a job of `kind` (with `key`) is queued or running."""
+        db = SessionLocal()
+        try:
+            query = db.query(Job.id).filter(Job.kind == kind, Job.status.in_(("queued", "running")))
+            if key is not None:
+                query = query.filter(Job.key == key)
+            return query.first() is not None
+        finally:
+            db.close()
+
+    async def run_cpu(self, func, *args):
+        """Run a picklable, module-level function in the CPU process pool."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    # --- lifecycle ---
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._draining = False
+        self._wakeup = asyncio.Event()
+        self._requeue_stale()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+
+    async def drain(self, timeout: float) -> int:
+        """Stop claiming jobs, wait up to `timeout` for running ones, then stop. Returns how many were cut short."""
+        self._draining = True
+        deadline = asyncio.get_running_loop().time() + timeout
+        while sum(self._running.values()) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+        cut_short = sum(self._running.values())
+        await self.stop()  # cancelled jobs go back to "queued"
+        return cut_short
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def join(self, timeout: float = 30.0, kinds=None):
+        """Wait until no job (of `kinds`, if given) is queued and due, or running."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            if not self._pending(kinds):
+                return True
+            await asyncio.sleep(0.02)
+        return False
+
+    # --- internals ---
+
+    def _pending(self, kinds=None) -> int:
+        db = SessionLocal()
+        try:
+            query = db.query(Job.id).filter(or_(
+                Job.status == "running",
+                (Job.status == "queued") & (Job.run_at <= datetime.utcnow()),
+            ))
+            if kinds:
+                query = query.filter(Job.kind.in_(list(kinds)))
+            return query.count()
+        finally:
+            db.close()
+
+    def _claim(self):
+        """Mark the most urgent runnable job as running; returns the arguments for `_run`, or None."""
+        kinds = [kind for kind in self._handlers
+                 if self._running[kind] < self._max_running.get(kind, self.workers)]
+        if not kinds:
+            return None
+        now = datetime.utcnow()
+        older = aliased(Job)
+        blocked = exists().where(older.key == Job.key, older.id < Job.id, older.status.in_(("queued", "running")))
+        db = SessionLocal()
+        try:
+            candidates = (
+                db.query(Job.id)
+                .filter(Job.status == "queued", Job.run_at <= now, Job.kind.in_(kinds),
+                        or_(Job.key.is_(None), ~blocked))
+                .order_by(Job.priority, Job.run_at, Job.id)
+                .limit(self.workers)
+                .all()
+            )
+            for (job_id,) in candidates:
+                # Conditional update: only one worker (in any process) wins each job
+                claimed = (
+                    db.query(Job)
+                    .filter(Job.id == job_id, Job.status == "queued")
+                    .update({"status": "running", "locked_at": now, "attempts": Job.attempts + 1},
+                            synchronize_session=False)
+                )
+                db.commit()
+                if claimed:
+                    job = db.get(Job, job_id)
+                    self._running[job.kind] += 1
+                    self._leased.add(job.id)
+                    return job.id, job.kind, json.loads(job.payload), job.attempts, job.max_attempts, job.created_at
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, **fields):
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == job_id).update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _renew_leases(self):
+        if not self._leased:
+            return
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id.in_(list(self._leased)), Job.status == "running") \
+                .update({"locked_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+        db = SessionLocal()
+        try:
+            stale = (
+                db.query(Job)
+                .filter(Job.status == "running", Job.locked_at < cutoff)
+                .update({"status": "queued", "locked_at": None}, synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        if stale:
+            print(f"♻️ Requeued {stale} job(s) whose worker went away")
+
+    async def _worker(self):
+        while not self._draining:
+            try:
+                claimed = self._claim()
+                if claimed is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(*claimed)
+            except Exception as e:
+                # e.g. a dropped connection or "database is locked": keep the worker alive.
+                # A job whose final update failed stays "running" and is requeued when its lease lapses.
+                print(f"❌ Job worker error: {type(e).__name__}: {e}")
+                metrics.inc("job_worker_errors_total")
+                await asyncio.sleep(POLL_SECONDS)
+
+    async def _run(self, job_id, kind, payload, attempts, max_attempts, created_at):
+        handle, _, _, on_dead = self._handlers[kind]
+        if attempts == 1:
+            metrics.observe("job_wait_seconds", (datetime.utcnow() - created_at).total_seconds(), kind=kind)
+        try:
+            with metrics.timed("job", kind=kind), metrics.query_scope(f"job:{kind}"):
+                await handle(payload)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back for the next start
+            try:
+                self._finish(job_id, status="queued", locked_at=None, attempts=attempts - 1)
+            except Exception as e:
+                print(f"❌ Could not requeue job {job_id} ({kind}): {e}")
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= max_attempts:
+                print(f"☠️ Job {job_id} ({kind}) dead after {attempts} attempts: {error}")
+                self._finish(job_id, status="dead", last_error=error, finished_at=datetime.utcnow())
+                metrics.inc("jobs_completed_total", kind=kind, result="dead")
+                if on_dead is not None:
+                    try:
+                        await on_dead(payload, e)
+                    except Exception as callback_error:
+                        print(f"❌ on_dead for job {job_id} failed: {callback_error}")
+            else:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)) * (0.5 + random.random())
+                self._finish(job_id, status="queued", locked_at=None, last_error=error,
+                             run_at=datetime.utcnow() + timedelta(seconds=delay))
+                metrics.inc("jobs_completed_total", kind=kind, result="retry")
+            return
+        finally:
+            # Free the slot and let a worker idling on a full kind look again
+            self._running[kind] -= 1
+            self._leased.discard(job_id)
+            self._wakeup.set()
+        self._finish(job_id, status="done", locked_at=None, finished_at=datetime.utcnow())
+        metrics.inc("jobs_completed_total", kind=kind, result="done")
+
+    async def _maintenance(self):
+        while True:
+            await asyncio.sleep(MAINTENANCE_SECONDS)
+            try:
+                self._renew_leases()
+                self._requeue_stale()
+                db = SessionLocal()
+                try:
+                    db.query(Job).filter(Job.status == "done", Job.finished_at < datetime.utcnow() - KEEP_DONE) \
+                        .delete(synchronize_session=False)
+                    db.commit()
+                    depth = dict(
+                        db.query(Job.status, func.count(Job.id))
+                        .filter(Job.status.in_(("queued", "running", "dead")))
+                        .group_by(Job.status)
+                        .all()
+                    )
+                    for status in ("queued", "running", "dead"):
+                        metrics.set_gauge("job_queue_depth", depth.get(status, 0), status=status)
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"❌ Job maintenance failed: {e}")
+
+
+# Shared by the bot (which runs the workers) and the auth server (which only enqueues)
+jobs = JobQueue()
@@ -0,0 +1,23 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Return module `name` without executing it yet.
+    The real import runs on first attribute access, so heavy libraries
+    only cost startup time in processes that actually use them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
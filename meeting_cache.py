@@ -0,0 +1,100 @@
+"""
+Read-through cache of Meeting snapshots keyed by meeting ID.
+
+Interactive flows (button presses, reminders, edits) keep hitting the same
+handful of recent meetings; serving them from memory saves a database
+round trip per click. Entries are immutable snapshots, expire after a TTL
+and are evicted least-recently-used beyond a size bound. Every code path
+that writes a meeting must call `invalidate()` / `invalidate_chat()`.
+
+The cache is per process and only the bot writes meetings, so only the
+bot's cache is ever invalidated. Anything else (the auth server's gunicorn
+workers) would serve an edited or deleted meeting for up to the TTL, and
+reads with `fresh()` instead, as do writes to external calendars.
+"""
+import os
+import time
+from collections import OrderedDict, namedtuple
+from db import SessionLocal, Meeting
+import metrics
+
+MeetingSnapshot = namedtuple(
+    "MeetingSnapshot",
+    "id chat_id summary time place pax activity meet_date created_at rrule",
+)
+
+
+def snapshot(meeting: Meeting) -> MeetingSnapshot:
+    return MeetingSnapshot(*(getattr(meeting, field) for field in MeetingSnapshot._fields))
+
+
+class MeetingCache:
+    def __init__(self, max_size: int = 1000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # {meeting_id: (expires_at, MeetingSnapshot)}
+
+    def get(self, meeting_id: int, chat_id: int = None):
+        """Snapshot of the meeting (None if missing or in another chat), loading it on a miss."""
+        entry = self._entries.get(meeting_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(meeting_id)
+            self._record(hit=True)
+            meeting = entry[1]
+        else:
+            self._record(hit=False)
+            db = SessionLocal()
+            row = db.query(Meeting).filter_by(id=meeting_id).first()
+            meeting = self.put(snapshot(row)) if row else None
+            db.close()
+            if meeting is None:
+                self._entries.pop(meeting_id, None)
+
+        if meeting is not None and chat_id is not None and meeting.chat_id != chat_id:
+            return None
+        return meeting
+
+    def fresh(self, meeting_id: int):
+        """Snapshot read from the database, bypassing (and refreshing) the cache; None if gone."""
+        self.invalidate(meeting_id)
+        return self.get(meeting_id)
+
+    def put(self, meeting: MeetingSnapshot) -> MeetingSnapshot:
+        self._entries[meeting.id] = (time.monotonic() + self.ttl, meeting)
+        self._entries.move_to_end(meeting.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return meeting
+
+    def invalidate(self, meeting_id: int):
+        self._entries.pop(meeting_id, None)
+
+    def invalidate_chat(self, chat_id: int):
+        for meeting_id in [mid for mid, (_, m) in self._entries.items() if m.chat_id == chat_id]:
+            del self._entries[meeting_id]
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.inc("meeting_cache_total", result="hit" if hit else "miss")
+        metrics.set_gauge("meeting_cache_hit_ratio", round(self.hit_rate, 4))
+        metrics.set_gauge("meeting_cache_entries", len(self._entries))
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4),
+                "entries": len(self._entries), "max_size": self.max_size, "ttl": self.ttl}
+
+
+meetings = MeetingCache(
+    max_size=int(os.getenv("MEETING_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("MEETING_CACHE_TTL", "60")),
+)
@@ -0,0 +1,292 @@
+"""
+Lightweight in-process metrics: counters, gauges and latency histograms,
+exported in the Prometheus text format by `render_prometheus()`.
+
+The bot process serves them itself with `serve()` when METRICS_PORT is
+set; a web app run with RUN_BOT_IN_APP (appentry.py) has /metrics instead.
+
+Optional structured trace logs (one JSON line per event, tagged with the
+correlation ID of the Telegram update or HTTP request being handled) are
+enabled with TRACE_LOGS=1.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds. Covers fast DB reads up to slow GPT summaries.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Plain counts, e.g. queries per handler call
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# The same SQL this many times in one handler call is reported as a likely N+1
+REPEAT_THRESHOLD = int(os.getenv("DB_REPEAT_THRESHOLD", "3"))
+
+TRACE_ENABLED = os.getenv("TRACE_LOGS", "").lower() in ("1", "true", "yes")
+trace_logger = logging.getLogger("meetbot.trace")
+
+# Set per Telegram update / HTTP request so nested calls can tag themselves
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+current_handler = contextvars.ContextVar("current_handler", default=None)
+# QueryStats of the handler call / job in progress, filled by db.py's engine hooks
+query_stats = contextvars.ContextVar("query_stats", default=None)
+
+_lock = threading.Lock()
+_metrics = {}  # {name: {"type": str, "buckets": tuple, "series": {labels: value}}}
+_query_budget = {}  # {scope: [calls, queries, max queries per call, max repeats of one statement]}
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _series(name, kind, buckets=DEFAULT_BUCKETS):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = {"type": kind, "buckets": buckets, "series": {}}
+    return metric["series"]
+
+
+def inc(name, amount=1, **labels):
+    """Add `amount` to counter `name`."""
+    with _lock:
+        series = _series(name, "counter")
+        key = _key(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _series(name, "gauge")[_key(labels)] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record `value` (seconds, unless other `buckets` are given) in histogram `name`."""
+    with _lock:
+        series = _series(name, "histogram", buckets)
+        buckets = _metrics[name]["buckets"]
+        key = _key(labels)
+        hist = series.get(key)
+        if hist is None:
+            # per-bucket counts, then sum, then count
+            hist = series[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def snapshot(name):
+    """Copy of the series for `name`, mainly for benchmarks and debugging."""
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            return {}
+        return {key: (list(v) if isinstance(v, list) else v) for key, v in metric["series"].items()}
+
+
+def trace(event, **fields):
+    """Emit one structured trace line when TRACE_LOGS is enabled."""
+    if not TRACE_ENABLED:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "cid": correlation_id.get()}
+    record.update(fields)
+    trace_logger.info(json.dumps(record, default=str))
+
+
+@contextmanager
+def timed(name, **labels):
+    """
+    Time the block into histogram `{name}_seconds`; an exception escaping
+    the block also bumps `{name}_errors_total`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc(f"{name}_errors_total", **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(f"{name}_seconds", elapsed, **labels)
+        trace(name, ms=round(elapsed * 1000, 1), **labels)
+
+
+class QueryStats:
+    """Queries, rows and DB time of one handler call or job."""
+
+    __slots__ = ("name", "queries", "rows", "seconds", "statements")
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def add(self, other):
+        self.queries += other.queries
+        self.rows += other.rows
+        self.seconds += other.seconds
+        self.statements.update(other.statements)
+
+
+def record_query(statement, seconds, rows=0):
+    """Count one SQL statement against the current handler call, if any."""
+    stats = query_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.rows += rows
+        stats.seconds += seconds
+        stats.statements[statement] += 1
+
+
+def record_rows(rows):
+    stats = query_stats.get()
+    if stats is not None:
+        stats.rows += rows
+
+
+@contextmanager
+def query_scope(name):
+    """
+    Count the queries made inside the block (threads started with
+    asyncio.to_thread included) as one call of `name`. A nested scope's
+    queries also count towards the enclosing one.
+    """
+    stats = QueryStats(name)
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+        parent = query_stats.get()
+        if parent is not None:
+            parent.add(stats)
+        _finish_query_scope(stats)
+
+
+def _finish_query_scope(stats):
+    inc("db_queries_total", stats.queries, handler=stats.name)
+    inc("db_rows_total", stats.rows, handler=stats.name)
+    observe("db_queries_per_call", stats.queries, buckets=COUNT_BUCKETS, handler=stats.name)
+    observe("db_time_per_call_seconds", stats.seconds, handler=stats.name)
+    statement, repeats = stats.statements.most_common(1)[0] if stats.statements else ("", 0)
+    if repeats >= REPEAT_THRESHOLD:
+        inc("db_repeated_statements_total", handler=stats.name)
+        print(f"⚠️ {stats.name} ran the same query {repeats}x (N+1?): {' '.join(statement.split())[:160]}")
+    with _lock:
+        budget = _query_budget.setdefault(stats.name, [0, 0, 0, 0])
+        budget[0] += 1
+        budget[1] += stats.queries
+        budget[2] = max(budget[2], stats.queries)
+        budget[3] = max(budget[3], repeats)
+
+
+def query_budget_report():
+    """{scope: {"calls", "mean_queries", "max_queries", "max_repeats"}} since start (or the last reset)."""
+    with _lock:
+        return {
+            name: {"calls": calls, "mean_queries": round(total / calls, 2), "max_queries": most,
+                   "max_repeats": repeats}
+            for name, (calls, total, most, repeats) in _query_budget.items()
+        }
+
+
+def reset_query_budget():
+    with _lock:
+        _query_budget.clear()
+
+
+def instrument(func):
+    """Time every call of coroutine function `func` as function_seconds{function=...}."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with timed("function", function=func.__name__):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_handler(handler):
+    """
+    Wrap a telegram handler callback: latency histogram, error counter and
+    a correlation ID (derived from update_id) for everything it calls.
+    """
+    name = handler.__name__
+
+    @wraps(handler)
+    async def wrapper(update, context, *args, **kwargs):
+        update_id = getattr(update, "update_id", None)
+        cid = f"upd-{update_id}" if update_id is not None else uuid.uuid4().hex[:12]
+        cid_token = correlation_id.set(cid)
+        handler_token = current_handler.set(name)
+        try:
+            with timed("handler", handler=name), query_scope(name):
+                return await handler(update, context, *args, **kwargs)
+        finally:
+            current_handler.reset(handler_token)
+            correlation_id.reset(cid_token)
+
+    return wrapper
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (v0.0.4)."""
+    lines = []
+    with _lock:
+        for name in sorted(_metrics):
+            metric = _metrics[name]
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in metric["series"].items():
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_labels(key)} {value}")
+                    continue
+                for bound, count in zip(metric["buckets"], value):
+                    lines.append(f"{name}_bucket{_labels(key, [('le', str(bound))])} {count}")
+                lines.append(f"{name}_bucket{_labels(key, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(key)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve(port: int, host: str = "0.0.0.0"):
+    """Answer `GET /metrics` on `port` from the running event loop; returns the asyncio Server."""
+    async def handle(reader, writer):
+        try:
+            request = (await reader.readline()).split()
+            while (await reader.readline()).strip():
+                pass  # headers
+            if len(request) > 1 and request[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", render_prometheus().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,150 @@
+"""
+Model routing for meeting summaries.
+
+Short, unambiguous sessions (few messages, and the availability solver
+found a clear best slot) go to FAST_MODEL; everything else goes to
+STRONG_MODEL. A fast answer that fails validation (missing fields,
+"TBD"/"unclear" date or time) is escalated to the strong model, if the
+strong route's typical latency still fits in what is left of the request's
+latency budget. Each call is given the remaining budget as its timeout.
+
+Per route ("fast", "strong", "escalated") the router keeps a rolling
+window of latencies for p50/p99 and accumulates the cost from the token
+usage the API reports:
+
+    summary_route_total{route}
+    summary_route_seconds{route}                  histogram
+    summary_route_latency_seconds{route,quantile} gauge, p50/p99 of the last WINDOW calls
+    summary_cost_usd_total{route}
+
+Environment:
+    SUMMARY_FAST_MODEL          default gpt-4o-mini
+    SUMMARY_STRONG_MODEL        default gpt-4o
+    SUMMARY_LATENCY_BUDGET      seconds per summary, all attempts included (default 30)
+    SUMMARY_FAST_MAX_MESSAGES   longest session sent to the fast model (default 40)
+    SUMMARY_FAST_MAX_CHARS      (default 4000)
+"""
+import asyncio
+import os
+import time
+from collections import deque
+import metrics
+
+FAST_MODEL = os.getenv("SUMMARY_FAST_MODEL", "gpt-4o-mini")
+STRONG_MODEL = os.getenv("SUMMARY_STRONG_MODEL", "gpt-4o")
+LATENCY_BUDGET = float(os.getenv("SUMMARY_LATENCY_BUDGET", "30"))
+FAST_MAX_MESSAGES = int(os.getenv("SUMMARY_FAST_MAX_MESSAGES", "40"))
+FAST_MAX_CHARS = int(os.getenv("SUMMARY_FAST_MAX_CHARS", "4000"))
+WINDOW = 500
+
+# USD per million (input, output) tokens; unknown models are costed as the strong one
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+# Typical strong-model latency before any has been observed
+DEFAULT_STRONG_SECONDS = 8.0
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def is_simple(group_data, slots) -> bool:
+    """Whether a listening session is short and its best slot unambiguous."""
+    messages = [msg for msgs in group_data.values() for msg in msgs]
+    if len(messages) > FAST_MAX_MESSAGES or sum(len(m) for m in messages) > FAST_MAX_CHARS:
+        return False
+    if not slots:
+        return False  # no stated times: the model has to work the date out itself
+    return len(slots) == 1 or slots[0].count > slots[1].count
+
+
+class ModelRouter:
+    def __init__(self, get_client, fast_model: str = FAST_MODEL, strong_model: str = STRONG_MODEL,
+                 budget: float = LATENCY_BUDGET):
+        self.get_client = get_client
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.budget = budget
+        self._latencies = {}  # {route: deque of seconds}
+
+    def stats(self):
+        """{route: {"calls", "p50", "p99"}} over the last WINDOW summaries per route."""
+        return {
+            route: {"calls": len(seconds), "p50": percentile(seconds, 0.5), "p99": percentile(seconds, 0.99)}
+            for route, seconds in self._latencies.items()
+        }
+
+    async def _call(self, model: str, prompt: str, timeout: float, route: str):
+        with metrics.timed("external_call", service="openai_chat", model=model):
+            response = await asyncio.to_thread(
+                self.get_client().chat.completions.create,
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                timeout=timeout,
+            )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prices = PRICES.get(model, PRICES.get(self.strong_model, (0.0, 0.0)))
+            cost = (usage.prompt_tokens * prices[0] + usage.completion_tokens * prices[1]) / 1e6
+            metrics.inc("summary_cost_usd_total", round(cost, 6), route=route)
+        return response.choices[0].message.content
+
+    def _record(self, route: str, seconds: float):
+        window = self._latencies.setdefault(route, deque(maxlen=WINDOW))
+        window.append(seconds)
+        metrics.inc("summary_route_total", route=route)
+        metrics.observe("summary_route_seconds", seconds, route=route)
+        metrics.set_gauge("summary_route_latency_seconds", percentile(window, 0.5), route=route, quantile="0.5")
+        metrics.set_gauge("summary_route_latency_seconds", percentile(window, 0.99), route=route, quantile="0.99")
+
+    def _strong_estimate(self) -> float:
+        seconds = self._latencies.get("strong")
+        return percentile(seconds, 0.5) if seconds else DEFAULT_STRONG_SECONDS
+
+    async def complete(self, prompt: str, simple: bool, validate=None, budget: float = None):
+        """
+        (text, route) for `prompt`. `validate(text)` returns True when an
+        answer is good enough to keep; failures on the fast route escalate.
+        Raises if no model answered within the budget.
+        """
+        budget = self.budget if budget is None else budget
+        start = time.perf_counter()
+        deadline = start + budget
+        route = "strong"
+
+        if simple:
+            route = "fast"
+            try:
+                text = await self._call(self.fast_model, prompt, budget, "fast")
+            except Exception as e:
+                print(f"⚠️ Fast model failed, escalating: {e}")
+                metrics.inc("summary_escalations_total", reason="error")
+                text = None
+            if text is not None and (validate is None or validate(text)):
+                self._record(route, time.perf_counter() - start)
+                return text, route
+            if text is not None:
+                metrics.inc("summary_escalations_total", reason="validation")
+            remaining = deadline - time.perf_counter()
+            if remaining < self._strong_estimate():
+                # No time for the strong model: a weak answer beats none
+                metrics.inc("summary_escalations_total", reason="no_budget")
+                if text is None:
+                    raise TimeoutError(f"no summary within the {budget:g}s budget")
+                self._record(route, time.perf_counter() - start)
+                return text, route
+            route = "escalated"
+
+        remaining = max(1.0, deadline - time.perf_counter())
+        text = await self._call(self.strong_model, prompt, remaining, route)
+        self._record(route, time.perf_counter() - start)
+        return text, route
@@ -0,0 +1,116 @@
+"""
+On-demand sampling profiler for the running process.
+
+Nothing is installed until `run_profile()` is awaited: a daemon thread then
+samples the stack of every thread (event loop and executor threads alike)
+while a coroutine on the event loop measures loop lag and records where
+each pending task is suspended. The result is in the collapsed-stack
+format understood by flamegraph.pl, speedscope and friends.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+import metrics
+
+MAX_SECONDS = 60
+_running = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _sample_threads(counts, stop, interval):
+    me = threading.get_ident()
+    while not stop.is_set():
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                counts[f"thread:{names.get(ident, ident)};{_collapse(frame)}"] += 1
+        stop.wait(interval)
+
+
+def _sample_tasks(counts):
+    """Where each pending task is suspended (only callable on the loop thread)."""
+    for task in asyncio.all_tasks():
+        stack = task.get_stack()
+        if stack:
+            frames = ";".join(_frame_label(f) for f in stack)
+            counts[f"task:{task.get_name()};{frames}"] += 1
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_profile(seconds: float = 10.0, interval: float = 0.01) -> dict:
+    """
+    Profile the live process for `seconds` (capped at MAX_SECONDS).
+    Returns {"collapsed": str, "samples": int, "seconds": float, "loop_lag_ms": {...}}.
+    Raises RuntimeError if another profile is already running.
+    """
+    if not _running.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+
+    seconds = max(0.1, min(float(seconds), MAX_SECONDS))
+    counts = Counter()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_threads, args=(counts, stop, interval),
+                               name="profiler-sampler", daemon=True)
+    loop = asyncio.get_running_loop()
+    lags = []
+    started = time.perf_counter()
+    try:
+        sampler.start()
+        deadline = loop.time() + seconds
+        while loop.time() < deadline:
+            # Lag = how late the loop ran us compared to when we asked to wake
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            lags.append(lag)
+            metrics.observe("event_loop_lag_seconds", lag)
+            _sample_tasks(counts)
+    finally:
+        stop.set()
+        sampler.join(timeout=1)
+        _running.release()
+
+    collapsed = "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+    return {
+        "collapsed": collapsed + "\n",
+        "samples": sum(counts.values()),
+        "seconds": round(time.perf_counter() - started, 3),
+        "loop_lag_ms": {
+            "mean": round(1000 * sum(lags) / len(lags), 2) if lags else 0.0,
+            "p50": round(1000 * _percentile(lags, 50), 2),
+            "p99": round(1000 * _percentile(lags, 99), 2),
+            "max": round(1000 * max(lags, default=0.0), 2),
+        },
+    }
+
+
+def top_frames(collapsed: str, limit: int = 5):
+    """Leaf frames with the most samples, for a quick text summary."""
+    leaves = Counter()
+    for line in collapsed.splitlines():
+        if not line:
+            continue
+        stack, _, n = line.rpartition(" ")
+        leaves[stack.rsplit(";", 1)[-1]] += int(n)
+    return leaves.most_common(limit)
@@ -0,0 +1,266 @@
+"""
+Recurring meetings.
+
+A weekly meeting is one `meetings` row carrying an RFC 5545 RRULE
+("FREQ=WEEKLY", "FREQ=WEEKLY;INTERVAL=2;COUNT=10", ...) whose first
+occurrence is the row's meet_date. Occurrences are never stored: they are
+expanded from the rule when read and only as far as the reader needs (the
+next one for /listmeetings and reminders), and calendar exports carry the
+RRULE itself so the calendar app does the expanding.
+
+A change to a single occurrence is a `meeting_overrides` row keyed by the
+date the rule gives that occurrence: it is cancelled, or moved to another
+date (at most MAX_MOVE_DAYS away), time or place.
+
+Rules are kept to what a meeting needs: at most daily (no
+HOURLY/MINUTELY/SECONDLY and no BYHOUR-style parts), and a rule that ends
+does so within MAX_OCCURRENCES occurrences and MAX_YEARS years. Expanding
+one is then cheap enough to do inline in a handler.
+"""
+import re
+from bisect import insort
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from db import SessionLocal, MeetingOverride
+from lazy import lazy_import
+
+date_parser = lazy_import("dateutil.parser")
+rrule = lazy_import("dateutil.rrule")
+
+MAX_MOVE_DAYS = 31
+MAX_OCCURRENCES = 1000
+MAX_YEARS = 5
+ALLOWED_FREQS = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+ALLOWED_PARTS = {"FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "BYMONTHDAY", "BYMONTH", "WKST"}
+
+NAMED_RULES = {
+    "daily": "FREQ=DAILY",
+    "weekdays": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "weekly": "FREQ=WEEKLY",
+    "fortnightly": "FREQ=WEEKLY;INTERVAL=2",
+    "biweekly": "FREQ=WEEKLY;INTERVAL=2",
+    "monthly": "FREQ=MONTHLY",
+    "yearly": "FREQ=YEARLY",
+}
+_UNITS = {"day": "DAILY", "week": "WEEKLY", "month": "MONTHLY", "year": "YEARLY"}
+_FREQ_WORDS = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month", "YEARLY": "year"}
+_DAY_NAMES = {"MO": "Mon", "TU": "Tue", "WE": "Wed", "TH": "Thu", "FR": "Fri", "SA": "Sat", "SU": "Sun"}
+
+_EVERY_RE = re.compile(r"^every (\d+) (day|week|month|year)s?$")
+_UNTIL_RE = re.compile(r"^(.*?)\s+until\s+(.+)$")
+_COUNT_RE = re.compile(r"^(.*?)\s+(?:x\s*(\d+)|(\d+)\s*times)$")
+
+Override = namedtuple("Override", "cancelled meet_date time place")
+# `original_date` is the rule's date for the occurrence (the override key),
+# `meet_date` where it actually falls; time/place are None unless overridden.
+Occurrence = namedtuple("Occurrence", "meeting_id original_date meet_date time place")
+
+
+@lru_cache(maxsize=1024)
+def _rule(rule_text: str, start: date):
+    return rrule.rrulestr(rule_text, dtstart=datetime.combine(start, time.min))
+
+
+def parse_rule(text: str, start: date) -> str:
+    """
+    RRULE for what a user typed: "weekly", "every 2 weeks", "monthly until
+    31 Dec 2026", "weekly x 10", or a raw "FREQ=..." rule. Raises
+    ValueError with a message fit for the chat.
+    """
+    text = " ".join(text.lower().split())
+    until = count = None
+    until_match, count_match = _UNTIL_RE.match(text), _COUNT_RE.match(text)
+    if until_match:
+        text, until_text = until_match.groups()
+        try:
+            until = date_parser.parse(until_text, dayfirst=True).date()
+        except (ValueError, OverflowError):
+            raise ValueError(f"Can't read the end date '{until_text}'.")
+        if until < start:
+            raise ValueError("The end date is before the first meeting.")
+    elif count_match:
+        text, count = count_match.group(1), int(count_match.group(2) or count_match.group(3))
+        if count < 1:
+            raise ValueError("A meeting has to happen at least once.")
+
+    every = _EVERY_RE.match(text)
+    if text in NAMED_RULES:
+        rule = NAMED_RULES[text]
+    elif every:
+        rule = f"FREQ={_UNITS[every.group(2)]};INTERVAL={int(every.group(1))}"
+    elif text.startswith(("freq=", "rrule:freq=")):
+        rule = text.upper().split(":")[-1]
+    else:
+        raise ValueError("Try daily, weekdays, weekly, fortnightly, monthly, yearly or 'every 3 weeks'.")
+    if until:
+        rule += f";UNTIL={until:%Y%m%d}"
+    elif count:
+        rule += f";COUNT={count}"
+    _check_limits(rule, start)
+
+    try:
+        first = next(iter(_rule(rule, start)), None)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"That rule doesn't work: {e}")
+    if first is None:
+        raise ValueError("That rule never matches a date.")
+    return rule
+
+
+def _check_limits(rule_text: str, start: date):
+    parts = dict(part.split("=", 1) for part in rule_text.split(";") if "=" in part)
+    if parts.get("FREQ") not in ALLOWED_FREQS:
+        raise ValueError("Meetings can repeat daily, weekly, monthly or yearly, not more often.")
+    unknown = sorted(set(parts) - ALLOWED_PARTS)
+    if unknown:
+        raise ValueError(f"Rules can't use {', '.join(unknown)}.")
+    if "COUNT" in parts:
+        if not parts["COUNT"].isdigit():
+            raise ValueError(f"COUNT={parts['COUNT']} isn't a number.")
+        if int(parts["COUNT"]) > MAX_OCCURRENCES:
+            raise ValueError(f"That's more than {MAX_OCCURRENCES} meetings; pick an end date instead.")
+    if "UNTIL" in parts:
+        try:
+            until = datetime.strptime(parts["UNTIL"][:8], "%Y%m%d").date()
+        except ValueError:
+            raise ValueError(f"Can't read UNTIL={parts['UNTIL']}.")
+        if (until - start).days > 366 * MAX_YEARS:
+            raise ValueError(f"A meeting can repeat for at most {MAX_YEARS} years.")
+
+
+def last_date(rule_text: str, start: date):
+    """Date of the final occurrence, or None for a rule that never ends."""
+    if "COUNT=" not in rule_text and "UNTIL=" not in rule_text:
+        return None
+    last = None
+    for last in _rule(rule_text, start):
+        pass
+    return last.date() if last else start
+
+
+def describe(rule_text: str) -> str:
+    """'weekly', 'every 2 weeks until 31 Dec 2026', 'weekdays (10 times)', ..."""
+    parts = dict(part.split("=", 1) for part in rule_text.split(";") if "=" in part)
+    freq = parts.get("FREQ", "")
+    interval = int(parts.get("INTERVAL", "1"))
+    if parts.get("BYDAY") == "MO,TU,WE,TH,FR" and freq == "WEEKLY" and interval == 1:
+        text = "weekdays"
+    elif interval == 1:
+        text = {"DAILY": "daily", "WEEKLY": "weekly", "MONTHLY": "monthly", "YEARLY": "yearly"}.get(freq, freq.lower())
+    else:
+        text = f"every {interval} {_FREQ_WORDS.get(freq, freq.lower())}s"
+    if "BYDAY" in parts and text != "weekdays":
+        text += " on " + ", ".join(_DAY_NAMES.get(day, day) for day in parts["BYDAY"].split(","))
+    if "UNTIL" in parts:
+        text += f" until {datetime.strptime(parts['UNTIL'][:8], '%Y%m%d'):%d %b %Y}"
+    elif "COUNT" in parts:
+        text += f" ({parts['COUNT']} times)"
+    return text
+
+
+def ics_rule(rule_text: str) -> str:
+    """The rule for a VEVENT whose DTSTART has a TZID: UNTIL has to be a UTC date-time there."""
+    def until_utc(match):
+        end_of_day = datetime.strptime(match.group(1), "%Y%m%d") + timedelta(days=1) - timedelta(hours=8, seconds=1)
+        return f"UNTIL={end_of_day:%Y%m%dT%H%M%SZ}"
+    return re.sub(r"UNTIL=(\d{8})(?![T\d])", until_utc, rule_text)
+
+
+def is_occurrence(meeting, day: date) -> bool:
+    return datetime.combine(day, time.min) in _rule(meeting.rrule, meeting.meet_date)
+
+
+def load_overrides(meeting_ids):
+    """{meeting_id: {occurrence_date: Override}} for all of `meeting_ids`, in one query."""
+    found = {}
+    meeting_ids = list(meeting_ids)
+    if not meeting_ids:
+        return found
+    db = SessionLocal()
+    try:
+        for row in db.query(MeetingOverride).filter(MeetingOverride.meeting_id.in_(meeting_ids)):
+            found.setdefault(row.meeting_id, {})[row.occurrence_date] = Override(
+                bool(row.cancelled), row.meet_date, row.time, row.place)
+    finally:
+        db.close()
+    return found
+
+
+def save_override(meeting_id: int, occurrence_date: date, **changes):
+    """Create or update the override for one occurrence; `changes` are Override fields."""
+    db = SessionLocal()
+    try:
+        row = db.query(MeetingOverride).filter_by(meeting_id=meeting_id, occurrence_date=occurrence_date).first()
+        if row is None:
+            row = MeetingOverride(meeting_id=meeting_id, occurrence_date=occurrence_date)
+            db.add(row)
+        for field, value in changes.items():
+            setattr(row, field, value)
+        db.commit()
+    finally:
+        db.close()
+
+
+def clear_override(meeting_id: int, occurrence_date: date) -> bool:
+    db = SessionLocal()
+    try:
+        removed = db.query(MeetingOverride).filter_by(
+            meeting_id=meeting_id, occurrence_date=occurrence_date).delete()
+        db.commit()
+        return bool(removed)
+    finally:
+        db.close()
+
+
+def upcoming(meeting, overrides=None, start: date = None, limit: int = 1):
+    """
+    The next `limit` occurrences on or after `start` (default: the first
+    one), with overrides applied and cancelled ones left out. The rule is
+    only expanded until those are known. A one-off meeting has one
+    occurrence, its own date.
+    """
+    if not meeting.meet_date:
+        return []
+    if not meeting.rrule:
+        if start and meeting.meet_date < start:
+            return []
+        return [Occurrence(meeting.id, meeting.meet_date, meeting.meet_date, None, None)][:limit]
+
+    overrides = overrides or {}
+    start = start or meeting.meet_date
+    move = timedelta(days=MAX_MOVE_DAYS)
+    found = []  # (meet_date, original_date, Occurrence), sorted
+    begin = datetime.combine(max(meeting.meet_date, start - move), time.min)
+    for moment in _rule(meeting.rrule, meeting.meet_date).xafter(begin, inc=True):
+        original = moment.date()
+        if len(found) >= limit and original - move > found[limit - 1][0]:
+            break  # nothing later can be moved in front of what we have
+        override = overrides.get(original)
+        if override is None:
+            occurrence = Occurrence(meeting.id, original, original, None, None)
+        elif override.cancelled:
+            continue
+        else:
+            occurrence = Occurrence(meeting.id, original, override.meet_date or original, override.time, override.place)
+        if occurrence.meet_date >= start:
+            insort(found, (occurrence.meet_date, original, occurrence))
+    return [occurrence for _, _, occurrence in found[:limit]]
+
+
+def occurrence_summary(summary: str, occurrence: Occurrence) -> str:
+    """The meeting's summary with the date (and any overridden time/place) of one occurrence."""
+    day = occurrence.meet_date
+    replacements = {"📅 Date:": f"{day.day} {day:%B %Y}"}
+    if occurrence.time:
+        replacements["🕒 Time:"] = occurrence.time
+    if occurrence.place:
+        replacements["📍 Place:"] = occurrence.place
+    lines = []
+    for line in summary.splitlines():
+        for label, value in replacements.items():
+            if line.strip().startswith(label):
+                line = f"{label} {value}"
+                break
+        lines.append(line)
+    return "\n".join(lines)
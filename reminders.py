@@ -0,0 +1,247 @@
+"""
+Reminder delivery engine.
+
+Reminders cluster on round times (12 h / 24 h before a 7pm meeting), so
+instead of one scheduler job per reminder they are grouped into time
+buckets with a single job each. When a bucket fires, its meetings are
+loaded in one query, each reminder text is rendered once, and messages go
+out through a rate-limited sender that keeps per-chat order and stays
+under Telegram's flood limits.
+
+A recurring meeting only ever has its next occurrence scheduled. When
+that reminder fires, `next_due` is asked for the following one, and the
+reminder text carries the date (and any overridden time or place) of the
+occurrence it is for.
+
+`on_fired` is told the meeting ids whose reminders went out (or were
+dropped as missed), so that cached views stop offering to cancel them.
+
+Environment:
+    REMINDER_BUCKET_SECONDS   bucket width (default 60)
+    REMINDER_RATE             messages per second across all chats (default 25)
+    REMINDER_CHAT_INTERVAL    seconds between messages to the same chat (default 1)
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timezone
+from telegram.error import RetryAfter
+from db import SessionLocal, Meeting
+import metrics
+import recurrence
+
+BUCKET_SECONDS = int(os.getenv("REMINDER_BUCKET_SECONDS", "60"))
+RATE = float(os.getenv("REMINDER_RATE", "25"))
+CHAT_INTERVAL = float(os.getenv("REMINDER_CHAT_INTERVAL", "1"))
+MAX_SEND_ATTEMPTS = 3
+
+# `occurrence` is the rule date of the occurrence, for recurring meetings
+Reminder = namedtuple("Reminder", "chat_id meeting_id minutes_before due occurrence", defaults=(None,))
+
+
+def reminder_text(minutes_before: int, summary: str) -> str:
+    return f"⏰ Reminder: your meeting is in {minutes_before} minutes!\n\n{summary}"
+
+
+class RateLimiter:
+    """Spaces calls to at most `rate` per second (no bursts)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ReminderEngine:
+    def __init__(self, get_scheduler, bucket_seconds: int = BUCKET_SECONDS,
+                 rate: float = RATE, chat_interval: float = CHAT_INTERVAL, next_due=None, on_fired=None):
+        self.get_scheduler = get_scheduler
+        # next_due(reminders) -> {meeting_id: (occurrence, due)} for the recurring ones that just fired
+        self.next_due = next_due
+        # on_fired(meeting_ids), after their reminders fired and any next occurrence was scheduled
+        self.on_fired = on_fired
+        self.bucket_seconds = bucket_seconds
+        self.chat_interval = chat_interval
+        self.limiter = RateLimiter(rate)
+        self.bot = None
+        self._buckets = {}  # {bucket_ts: OrderedDict{meeting_id: Reminder}}
+        self._bucket_of = {}  # {meeting_id: bucket_ts}
+
+    # --- scheduling API ---
+
+    def schedule(self, bot, chat_id: int, meeting_id: int, minutes_before: int, due: datetime, occurrence=None):
+        """Schedule (or move) the reminder for `meeting_id` to fire at `due`."""
+        from apscheduler.triggers.date import DateTrigger
+
+        self.bot = bot
+        self.cancel(meeting_id)
+        due_ts = due.timestamp()
+        # Buckets fire at their end, so a reminder can be late by under a bucket but never early
+        bucket = int(-(-due_ts // self.bucket_seconds)) * self.bucket_seconds
+        if bucket not in self._buckets:
+            self._buckets[bucket] = OrderedDict()
+            self.get_scheduler().add_job(
+                self._fire,
+                DateTrigger(run_date=datetime.fromtimestamp(bucket, timezone.utc)),
+                args=[bucket],
+                id=f"reminders_{bucket}",
+                misfire_grace_time=300,
+                replace_existing=True,
+            )
+        self._buckets[bucket][meeting_id] = Reminder(chat_id, meeting_id, minutes_before, due_ts, occurrence)
+        self._bucket_of[meeting_id] = bucket
+        metrics.set_gauge("reminders_pending", len(self._bucket_of))
+
+    def minutes_before(self, meeting_id: int):
+        """Minutes-before of the pending reminder for this meeting, or None."""
+        bucket = self._bucket_of.get(meeting_id)
+        return self._buckets[bucket][meeting_id].minutes_before if bucket is not None else None
+
+    def cancel(self, meeting_id: int) -> bool:
+        bucket = self._bucket_of.pop(meeting_id, None)
+        if bucket is None:
+            return False
+        reminders = self._buckets[bucket]
+        del reminders[meeting_id]
+        if not reminders:
+            del self._buckets[bucket]
+            job = self.get_scheduler().get_job(f"reminders_{bucket}")
+            if job:
+                job.remove()
+        metrics.set_gauge("reminders_pending", len(self._bucket_of))
+        return True
+
+    # --- checkpoint (see drain.py) ---
+
+    def checkpoint(self):
+        """Pending reminders as JSON-ready dicts, for the next instance."""
+        return [
+            {**reminder._asdict(), "occurrence": reminder.occurrence and reminder.occurrence.isoformat()}
+            for reminders in self._buckets.values() for reminder in reminders.values()
+        ]
+
+    def restore(self, bot, items):
+        """
+        Reschedule checkpointed reminders. One that came due while no
+        instance was running still goes out if its meeting hasn't started;
+        otherwise it is dropped, and a recurring one moves to its next
+        occurrence.
+        """
+        now = time.time()
+        missed = []
+        for item in items:
+            reminder = Reminder(**{**item, "occurrence": item["occurrence"] and date.fromisoformat(item["occurrence"])})
+            if reminder.meeting_id in self._bucket_of:
+                continue  # set again on this instance since
+            if reminder.due + 60 * reminder.minutes_before <= now:
+                missed.append(reminder)
+                continue
+            self.schedule(bot, reminder.chat_id, reminder.meeting_id, reminder.minutes_before,
+                          datetime.fromtimestamp(max(reminder.due, now), timezone.utc), reminder.occurrence)
+        if missed:
+            metrics.inc("reminders_sent_total", len(missed), result="missed")
+            self.bot = bot
+            self._schedule_next([r for r in missed if r.occurrence is not None])
+            self._notify_fired(missed)
+
+    # --- delivery ---
+
+    async def _fire(self, bucket: int):
+        reminders = list(self._buckets.pop(bucket, {}).values())
+        for reminder in reminders:
+            self._bucket_of.pop(reminder.meeting_id, None)
+        metrics.set_gauge("reminders_pending", len(self._bucket_of))
+        if reminders:
+            metrics.observe("reminder_bucket_size", len(reminders))
+            await self.deliver(self.bot, reminders)
+            self._schedule_next([r for r in reminders if r.occurrence is not None])
+            self._notify_fired(reminders)
+
+    def _notify_fired(self, reminders):
+        if self.on_fired is None:
+            return
+        try:
+            self.on_fired([r.meeting_id for r in reminders])
+        except Exception as e:
+            print(f"❌ on_fired for {len(reminders)} reminder(s) failed: {e}")
+
+    def _schedule_next(self, fired):
+        if not fired or self.next_due is None:
+            return
+        try:
+            following = self.next_due(fired)
+        except Exception as e:
+            print(f"❌ Could not schedule the next recurring reminders: {e}")
+            return
+        for reminder in fired:
+            if reminder.meeting_id in following and reminder.meeting_id not in self._bucket_of:
+                occurrence, due = following[reminder.meeting_id]
+                self.schedule(self.bot, reminder.chat_id, reminder.meeting_id, reminder.minutes_before, due, occurrence)
+
+    async def deliver(self, bot, reminders):
+        """Send `reminders`; one meeting query for the batch, chats in parallel, each chat in order."""
+        with metrics.timed("reminder_batch_load"):
+            db = SessionLocal()
+            try:
+                summaries = dict(
+                    db.query(Meeting.id, Meeting.summary)
+                    .filter(Meeting.id.in_([r.meeting_id for r in reminders]))
+                    .all()
+                )
+            finally:
+                db.close()
+            recurring = {r.meeting_id for r in reminders if r.occurrence is not None}
+            overrides = recurrence.load_overrides(recurring) if recurring else {}
+
+        per_chat = OrderedDict()
+        for reminder in sorted(reminders, key=lambda r: r.due):
+            summary = summaries.get(reminder.meeting_id)
+            if summary is None:
+                metrics.inc("reminders_sent_total", result="meeting_gone")
+                continue
+            if reminder.occurrence is not None:
+                override = overrides.get(reminder.meeting_id, {}).get(reminder.occurrence)
+                if override is not None and override.cancelled:
+                    metrics.inc("reminders_sent_total", result="occurrence_cancelled")
+                    continue
+                summary = recurrence.occurrence_summary(summary, recurrence.Occurrence(
+                    reminder.meeting_id, reminder.occurrence,
+                    (override and override.meet_date) or reminder.occurrence,
+                    override and override.time, override and override.place))
+            per_chat.setdefault(reminder.chat_id, []).append(
+                (reminder, reminder_text(reminder.minutes_before, summary))
+            )
+
+        await asyncio.gather(*(self._send_chat(bot, chat_id, items) for chat_id, items in per_chat.items()))
+
+    async def _send_chat(self, bot, chat_id: int, items):
+        for i, (reminder, text) in enumerate(items):
+            if i:
+                await asyncio.sleep(self.chat_interval)
+            for attempt in range(MAX_SEND_ATTEMPTS):
+                await self.limiter.wait()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+                except RetryAfter as e:
+                    delay = e.retry_after
+                    delay = delay.total_seconds() if hasattr(delay, "total_seconds") else delay
+                    metrics.inc("reminders_flood_waits_total")
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    print(f"❌ Reminder for meeting {reminder.meeting_id} failed: {e}")
+                    metrics.inc("reminders_sent_total", result="error")
+                    break
+                metrics.inc("reminders_sent_total", result="sent")
+                metrics.observe("reminder_delivery_lag_seconds", max(0.0, time.time() - reminder.due))
+                break
+            else:
+                print(f"❌ Reminder for meeting {reminder.meeting_id} dropped after repeated flood waits")
+                metrics.inc("reminders_sent_total", result="error")
@@ -0,0 +1,88 @@
+"""
+Meeting view-model: the "📋 Final Summary" text and the Edit/Delete/Reminder
+keyboard shown on every meeting message, rendered once and cached per
+meeting. Callers invalidate or replace the cached view whenever the summary,
+the meeting itself or its reminder changes.
+"""
+import os
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+import metrics
+from callbacks import encode as encode_callback
+
+MAX_CACHED_VIEWS = 2000
+
+_views = OrderedDict()  # {meeting_id: MeetingView}, least recently used first
+
+
+def reminder_label(minutes_before: int) -> str:
+    """90 -> '1h30m', 720 -> '12h'."""
+    return f"{minutes_before//60}h" + (f"{minutes_before%60}m" if minutes_before%60 else "")
+
+
+class MeetingView:
+    """Immutable rendering of one meeting. Only the Outlook link varies per viewer."""
+
+    __slots__ = ("meeting_id", "chat_id", "summary", "reminder_minutes", "_head", "_tail", "keyboard")
+
+    def __init__(self, meeting_id: int, chat_id: int, summary: str, reminder_minutes: int = None):
+        self.meeting_id = meeting_id
+        self.chat_id = chat_id
+        self.summary = summary
+        self.reminder_minutes = reminder_minutes
+        self._head = f"📋 Final Summary:\n\n{summary}\n\n🔗 [🗓️ Click here to add to Outlook Calendar]("
+        self._tail = ")"
+        if reminder_minutes:
+            self._tail += f"\n\n⏰ Reminder set: {reminder_label(reminder_minutes)} before meeting"
+        self.keyboard = meeting_keyboard(meeting_id, reminder_active=bool(reminder_minutes))
+
+    def text(self, telegram_user_id: int) -> str:
+        sync_link = f"{os.getenv('DOMAIN_BASE_URL')}/login?telegram_id={telegram_user_id}&meeting_id={self.meeting_id}"
+        return f"{self._head}{sync_link}{self._tail}"
+
+    def with_reminder(self, minutes_before):
+        return MeetingView(self.meeting_id, self.chat_id, self.summary, minutes_before)
+
+
+def meeting_keyboard(meeting_id: int, reminder_active: bool = False) -> InlineKeyboardMarkup:
+    if reminder_active:
+        reminder = InlineKeyboardButton("❌ Cancel Reminder", callback_data=encode_callback("cancel_reminder", meeting_id))
+    else:
+        reminder = InlineKeyboardButton("⏰ Set Reminder", callback_data=encode_callback("setreminder", meeting_id))
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✏️ Edit Meeting",   callback_data=encode_callback("edit", meeting_id))],
+        [InlineKeyboardButton("🗑️ Delete Meeting", callback_data=encode_callback("delete_prompt", meeting_id))],
+        [reminder],
+    ])
+
+
+def get(meeting_id: int, loader):
+    """Cached view for `meeting_id`, or `loader(meeting_id)` on a miss (None if gone)."""
+    view = _views.get(meeting_id)
+    if view is not None:
+        _views.move_to_end(meeting_id)
+        metrics.inc("render_cache_total", result="hit")
+        return view
+
+    metrics.inc("render_cache_total", result="miss")
+    view = loader(meeting_id)
+    if view is not None:
+        put(view)
+    return view
+
+
+def put(view: MeetingView) -> MeetingView:
+    _views[view.meeting_id] = view
+    _views.move_to_end(view.meeting_id)
+    while len(_views) > MAX_CACHED_VIEWS:
+        _views.popitem(last=False)
+    return view
+
+
+def invalidate(meeting_id: int):
+    _views.pop(meeting_id, None)
+
+
+def invalidate_chat(chat_id: int):
+    for meeting_id in [mid for mid, view in _views.items() if view.chat_id == chat_id]:
+        del _views[meeting_id]
@@ -0,0 +1,98 @@
+"""
+Retention and bulk cleanup for meetings.
+
+Deletes run in fixed-size batches on a worker thread, one short
+transaction per batch, so neither the event loop nor the database is
+held up by a large chat. After each batch `on_removed(ids)` runs on the
+event loop so the caller can cancel reminders and drop cached views.
+
+The daily cleanup is opt-in: set MEETING_RETENTION_DAYS (e.g. 90) to turn
+it on. On PostgreSQL run `python db.py` once first; it creates
+meetings_archive and adds the newer columns, which nothing else does for
+an existing database.
+
+Policy (environment):
+    MEETING_RETENTION_DAYS   age after the meeting date before cleanup (default 0: disabled)
+    MEETING_RETENTION_MODE   "archive" (copy to meetings_archive, default) or "purge"
+    RETENTION_BATCH_SIZE     rows per batch (default 500)
+"""
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, insert, or_, select
+from db import SessionLocal, Meeting, ArchivedMeeting
+import metrics
+
+RETENTION_DAYS = int(os.getenv("MEETING_RETENTION_DAYS", "0"))
+RETENTION_MODE = os.getenv("MEETING_RETENTION_MODE", "archive")
+BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+
+_ARCHIVED_COLUMNS = ("id", "chat_id", "summary", "time", "place", "pax", "activity", "meet_date", "rrule", "created_at")
+
+
+def _remove_batch(criterion, archive: bool, batch_size: int):
+    """Remove up to `batch_size` meetings matching `criterion`; returns their IDs."""
+    db = SessionLocal()
+    try:
+        ids = [row.id for row in db.query(Meeting.id).filter(criterion).order_by(Meeting.id).limit(batch_size)]
+        if not ids:
+            return []
+        if archive:
+            db.execute(
+                insert(ArchivedMeeting).from_select(
+                    list(_ARCHIVED_COLUMNS),
+                    select(*(getattr(Meeting, c) for c in _ARCHIVED_COLUMNS)).where(Meeting.id.in_(ids)),
+                )
+            )
+        db.query(Meeting).filter(Meeting.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+async def remove_meetings(criterion, on_removed=None, archive: bool = False, batch_size: int = BATCH_SIZE) -> int:
+    """Remove every meeting matching `criterion` in background batches. Returns the count."""
+    total = 0
+    while True:
+        with metrics.timed("retention_batch", mode="archive" if archive else "purge"):
+            ids = await asyncio.to_thread(_remove_batch, criterion, archive, batch_size)
+        if not ids:
+            break
+        total += len(ids)
+        metrics.inc("retention_meetings_removed_total", len(ids), mode="archive" if archive else "purge")
+        if on_removed:
+            on_removed(ids)
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+async def purge_chat(chat_id: int, on_removed=None) -> int:
+    """/clearmeetings: delete all of a chat's meetings."""
+    return await remove_meetings(Meeting.chat_id == chat_id, on_removed)
+
+
+def expired_criterion(today: date = None, days: int = RETENTION_DAYS):
+    """
+    Meetings whose date is more than `days` ago (or undated and created
+    that long ago). A recurring meeting's date is its first occurrence, so
+    those expire by their last one, and never if the rule is endless.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=days)
+    return or_(
+        and_(Meeting.rrule.is_(None), Meeting.meet_date < cutoff),
+        and_(Meeting.rrule.isnot(None), Meeting.recur_until < cutoff),
+        and_(Meeting.meet_date.is_(None), Meeting.created_at < datetime.combine(cutoff, datetime.min.time())),
+    )
+
+
+async def apply_retention(on_removed=None) -> int:
+    """Run the configured policy once; scheduled daily by the bot."""
+    if RETENTION_DAYS <= 0:
+        return 0
+    removed = await remove_meetings(expired_criterion(), on_removed, archive=RETENTION_MODE == "archive")
+    if removed:
+        print(f"🧹 Retention: {RETENTION_MODE}d {removed} meeting(s) older than {RETENTION_DAYS} days")
+    return removed
@@ -0,0 +1,130 @@
+"""
+Ranked meeting search within a chat, for /findmeeting and the admin API.
+
+Postgres uses the weighted tsvector index from db.SEARCH_VECTOR_SQL (place
+> activity > pax > summary), plus pg_trgm similarity on the place so typos
+like "jemm" still find "Jem". The embedded SQLite backend uses the
+`meetings_fts` FTS5 table ranked by bm25 with the same weights. Every
+search term is a prefix match and all terms must match. Without either
+index it falls back to LIKE scans, newest first.
+
+Pages are fetched one row past the page size to tell whether there is a
+next page, so no COUNT(*) is needed.
+"""
+import re
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import text
+from db import SessionLocal, get_engine, SEARCH_VECTOR_SQL
+import metrics
+
+PAGE_SIZE = 5
+MAX_TERMS = 8
+
+Hit = namedtuple("Hit", "id meet_date place activity pax summary")
+
+_FIELD_LABELS = {"place": "📍 Place:", "activity": "🎯 Activity:", "pax": "👥 Pax:"}
+_backend = None  # "fts5", "postgres", "postgres_trgm" or "like", decided on first search
+
+
+def summary_fields(summary: str):
+    """{"place", "activity", "pax"} values from a summary's labelled lines (None if absent)."""
+    fields = dict.fromkeys(_FIELD_LABELS)
+    for line in (summary or "").splitlines():
+        line = line.strip()
+        for field, label in _FIELD_LABELS.items():
+            if line.startswith(label):
+                value = line[len(label):].strip()
+                # process_availability appends " (Nearest MRT = ...)" to the place
+                fields[field] = value.split(" (Nearest MRT")[0].strip() or None
+    return fields
+
+
+def index_fields(meeting):
+    """Copy place/activity/pax out of the summary onto the meeting's own (searchable) columns."""
+    for field, value in summary_fields(meeting.summary).items():
+        setattr(meeting, field, value)
+
+
+def terms(query: str):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _detect_backend(db):
+    dialect = get_engine().dialect.name
+    if dialect == "sqlite":
+        found = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'meetings_fts'")).first()
+        return "fts5" if found else "like"
+    if dialect == "postgresql":
+        trgm = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+        return "postgres_trgm" if trgm else "postgres"
+    return "like"
+
+
+def _fts5(db, chat_id, words, offset, limit):
+    match = " ".join(f'"{w}"*' for w in words)
+    return db.execute(text(
+        "SELECT m.id, m.meet_date, m.place, m.activity, m.pax, m.summary "
+        "FROM meetings_fts JOIN meetings m ON m.id = meetings_fts.rowid "
+        "WHERE meetings_fts MATCH :match AND m.chat_id = :chat_id "
+        "ORDER BY bm25(meetings_fts, 10.0, 5.0, 2.0, 1.0), m.id DESC "
+        "LIMIT :limit OFFSET :offset"
+    ), {"match": match, "chat_id": chat_id, "limit": limit, "offset": offset}).all()
+
+
+def _postgres(db, chat_id, words, offset, limit, trigram):
+    tsquery = " & ".join(f"{w}:*" for w in words)
+    condition = f"({SEARCH_VECTOR_SQL}) @@ to_tsquery('simple', :tsquery)"
+    rank = f"ts_rank_cd({SEARCH_VECTOR_SQL}, to_tsquery('simple', :tsquery))"
+    if trigram:
+        # `%` is pg_trgm's indexed similarity test (pg_trgm.similarity_threshold, default 0.3)
+        condition = f"({condition} OR lower(place) % :phrase)"
+        rank = f"{rank} + similarity(lower(coalesce(place, '')), :phrase)"
+    return db.execute(text(
+        "SELECT id, meet_date, place, activity, pax, summary FROM meetings "
+        f"WHERE chat_id = :chat_id AND {condition} "
+        f"ORDER BY {rank} DESC, id DESC LIMIT :limit OFFSET :offset"
+    ), {"tsquery": tsquery, "phrase": " ".join(words), "chat_id": chat_id,
+        "limit": limit, "offset": offset}).all()
+
+
+def _like(db, chat_id, words, offset, limit):
+    params = {"chat_id": chat_id, "limit": limit, "offset": offset}
+    clauses = []
+    for i, word in enumerate(words):
+        params[f"w{i}"] = f"%{word}%"
+        clauses.append(f"lower(coalesce(place, '') || ' ' || coalesce(activity, '') || ' ' || "
+                       f"coalesce(pax, '') || ' ' || coalesce(summary, '')) LIKE :w{i}")
+    return db.execute(text(
+        "SELECT id, meet_date, place, activity, pax, summary FROM meetings "
+        f"WHERE chat_id = :chat_id AND {' AND '.join(clauses)} "
+        "ORDER BY id DESC LIMIT :limit OFFSET :offset"
+    ), params).all()
+
+
+def search(chat_id: int, query: str, offset: int = 0, limit: int = PAGE_SIZE):
+    """([Hit], has_more) for the chat's meetings matching every term of `query`, best first."""
+    global _backend
+    words = terms(query)
+    if not words:
+        return [], False
+    db = SessionLocal()
+    try:
+        if _backend is None:
+            _backend = _detect_backend(db)
+        with metrics.timed("meeting_search", backend=_backend):
+            if _backend == "fts5":
+                rows = _fts5(db, chat_id, words, offset, limit + 1)
+            elif _backend.startswith("postgres"):
+                rows = _postgres(db, chat_id, words, offset, limit + 1, trigram=_backend == "postgres_trgm")
+            else:
+                rows = _like(db, chat_id, words, offset, limit + 1)
+    finally:
+        db.close()
+    hits = []
+    for row in rows[:limit]:
+        hit = Hit(*row)
+        if isinstance(hit.meet_date, str):  # SQLite hands raw SQL dates back as text
+            hit = hit._replace(meet_date=date.fromisoformat(hit.meet_date))
+        hits.append(hit)
+    return hits, len(rows) > limit
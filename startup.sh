@@ -1,2 +1,14 @@
 #!/bin/bash
-gunicorn -w 4 -k uvicorn.workers.UvicornWorker auth_server:app
+# exec: gunicorn itself must receive the platform's SIGTERM to shut down gracefully.
+# Each worker answers /readyz with 503 as soon as it gets SIGTERM, keeps serving for
+# DRAIN_READY_GRACE seconds so the load balancer can take it out of rotation, then
+# stops accepting connections and finishes in-flight requests (OAuth callbacks).
+# GRACEFUL_TIMEOUT has to cover both. `kill -HUP <master pid>` replaces the workers
+# one by one for a zero-downtime reload.
+# Prometheus: this serves the OAuth app only, with no /metrics (each of the 4 workers
+# would expose its own series). Scrape the bot process instead, started with
+# METRICS_PORT set, or run appentry:app with one worker and RUN_BOT_IN_APP=1.
+exec gunicorn -w 4 -k uvicorn.workers.UvicornWorker \
+    --graceful-timeout "${GRACEFUL_TIMEOUT:-30}" \
+    --timeout "${WORKER_TIMEOUT:-60}" \
+    auth_server:app
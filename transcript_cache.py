@@ -0,0 +1,86 @@
+"""
+Persistent cache of voice-note transcriptions.
+
+Forwarded voice notes keep their Telegram `file_unique_id`, so most repeats
+are answered from that key before anything is downloaded. Re-uploads of
+the same clip get a new ID but the same bytes, so after downloading we also
+look up the audio's SHA-256 before running ffmpeg or calling Whisper.
+The table is bounded to TRANSCRIPT_CACHE_MAX_ENTRIES rows, evicting the
+least recently used.
+"""
+import hashlib
+import os
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from db import SessionLocal, Transcript
+import metrics
+
+MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "20000"))
+# Whisper list price, USD per audio minute
+WHISPER_USD_PER_MINUTE = float(os.getenv("WHISPER_USD_PER_MINUTE", "0.006"))
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _lookup(column, value, kind: str):
+    if not value:
+        return None
+    db = SessionLocal()
+    try:
+        row = db.query(Transcript).filter(column == value).first()
+        if row is None:
+            metrics.inc("transcript_cache_total", result=f"{kind}_miss")
+            return None
+        row.hits += 1
+        row.last_used_at = datetime.utcnow()
+        db.commit()
+        metrics.inc("transcript_cache_total", result=f"{kind}_hit")
+        metrics.inc("transcription_cost_saved_usd_total", round(row.duration / 60 * WHISPER_USD_PER_MINUTE, 6))
+        metrics.inc("transcription_seconds_saved_total", row.duration)
+        return row.text
+    finally:
+        db.close()
+
+
+def by_file_id(file_unique_id: str):
+    """Cached transcript for a Telegram file, or None."""
+    return _lookup(Transcript.file_unique_id, file_unique_id, "file_id")
+
+
+def by_hash(sha256: str):
+    """Cached transcript for identical audio bytes, or None."""
+    return _lookup(Transcript.sha256, sha256, "hash")
+
+
+def store(file_unique_id: str, sha256: str, text: str, duration: int):
+    db = SessionLocal()
+    try:
+        db.add(Transcript(file_unique_id=file_unique_id, sha256=sha256, text=text, duration=duration or 0))
+        db.commit()
+    except IntegrityError:
+        # Another worker cached the same file first
+        db.rollback()
+        return
+    finally:
+        db.close()
+    evict()
+
+
+def evict(max_entries: int = MAX_ENTRIES):
+    """Drop least recently used rows beyond `max_entries`."""
+    db = SessionLocal()
+    try:
+        excess = db.query(Transcript).count() - max_entries
+        if excess > 0:
+            oldest = [row.id for row in db.query(Transcript.id).order_by(Transcript.last_used_at).limit(excess)]
+            db.query(Transcript).filter(Transcript.id.in_(oldest)).delete(synchronize_session=False)
+            db.commit()
+            metrics.inc("transcript_cache_evictions_total", len(oldest))
+    finally:
+        db.close()
@@ -0,0 +1,122 @@
+"""
+Concurrent update processing with per-chat ordering.
+
+python-telegram-bot runs one update at a time by default, so a slow
+handler in one chat delays every other chat. With this processor up to
+UPDATE_CONCURRENCY updates run at once, but updates sharing a key (the
+chat, and the sender, whose /editmeeting flow lives in `editing_sessions`)
+still run one after another in arrival order.
+
+An update waits for its predecessors before taking one of the concurrency
+slots, so a backlog in one busy chat never holds slots other chats could
+use. Keys are registered in the order PTB starts its update tasks, which
+is the order the updates were received, so updates sharing several keys
+cannot deadlock.
+
+    updates_in_flight          gauge, handlers running now
+    updates_waiting            gauge, updates queued behind an earlier one with the same key
+    update_key_queue_longest   gauge, the longest of those per-key queues
+    update_queue_wait_seconds  histogram, time spent waiting for a turn
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import metrics
+
+CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+
+
+def update_keys(update):
+    """Ordering keys for an update: its chat and its sender."""
+    if not isinstance(update, Update):
+        return ()
+    keys = []
+    if update.effective_chat is not None:
+        keys.append(("chat", update.effective_chat.id))
+    if update.effective_user is not None:
+        keys.append(("user", update.effective_user.id))
+    return keys
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = CONCURRENCY, key_func=update_keys):
+        super().__init__(max_concurrent_updates)
+        self.key_func = key_func
+        self._tails = {}  # {key: future resolved when the newest update with that key finishes}
+        self._queued = Counter()  # {key: updates holding a place in that key's queue}
+        self._waiting = 0
+        self._in_flight = 0
+        self._pending = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def pending(self) -> int:
+        """Updates handed to the processor and not finished yet, running or waiting."""
+        return self._pending
+
+    def queue_lengths(self):
+        """{key: updates queued or running for it}, only keys with at least one."""
+        return {key: n for key, n in self._queued.items() if n}
+
+    def _publish(self):
+        metrics.set_gauge("updates_in_flight", self._in_flight)
+        metrics.set_gauge("updates_waiting", self._waiting)
+        metrics.set_gauge("update_key_queue_longest", max(self._queued.values(), default=0))
+
+    async def process_update(self, update, coroutine):
+        keys = self.key_func(update)
+        self._pending += 1
+        done = asyncio.get_running_loop().create_future()
+        # Registered before the first await, i.e. in arrival order
+        previous = [self._tails[key] for key in keys if key in self._tails]
+        for key in keys:
+            self._tails[key] = done
+            self._queued[key] += 1
+
+        started = False
+        try:
+            if previous:
+                self._waiting += 1
+                self._publish()
+                start = time.perf_counter()
+                try:
+                    for earlier in previous:
+                        await asyncio.shield(earlier)
+                finally:
+                    self._waiting -= 1
+                    metrics.observe("update_queue_wait_seconds", time.perf_counter() - start)
+            started = True
+            await super().process_update(update, coroutine)
+        finally:
+            self._pending -= 1
+            if not started and hasattr(coroutine, "close"):
+                coroutine.close()  # cancelled while waiting for its turn
+            if not done.done():
+                done.set_result(None)
+            for key in keys:
+                self._queued[key] -= 1
+                if not self._queued[key]:
+                    del self._queued[key]
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+            self._publish()
+
+    async def do_process_update(self, update, coroutine):
+        self._in_flight += 1
+        self._publish()
+        try:
+            await coroutine
+        finally:
+            self._in_flight -= 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
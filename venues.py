@@ -0,0 +1,217 @@
+"""
+Venue canonicalization for the Google Maps enrichment.
+
+"jem", "JEM mall" and "Jem, Jurong East" are the same place, but each
+spelling used to cost a geocode, a nearby search and a distance matrix
+call per lookup. resolve() maps a place string to a canonical venue key:
+
+1. normalize: lowercase, drop punctuation and filler ("mall", "the",
+   "singapore", ...). What follows the first comma is an address or area:
+   it is dropped when the name before it is already a known venue ("Jem,
+   Jurong East" is Jem), and kept otherwise, since it is what tells the
+   branches of a chain apart ("Starbucks, Jurong Point" vs "Starbucks,
+   Tampines Mall", "Blk 85, Bedok North" vs "Blk 85, Fengshan");
+2. exact match on a known key or a learned alias;
+3. otherwise fuzzy match against known venues by character-trigram Dice
+   similarity ("vivo city" ~ "vivocity", "plaza sing" ~ "plaza
+   singapura"). Candidates come from trigram and word indexes, so a
+   lookup does not scan every venue.
+
+Matching is deliberately conservative: a wrong merge would give one venue
+another's directions, while a missed one only costs the remote calls.
+
+Known venues are learned from past `Meeting.place` values at startup
+(the most common spelling wins) and from every new place resolved after
+that. MRT and bus-stop answers are then cached per canonical key.
+
+    venue_resolve_total{result}        known, fuzzy or new
+    transit_cache_total{kind,result}   kind mrt/bus, result hit/miss
+
+Environment:
+    VENUE_MATCH_THRESHOLD   trigram similarity needed to match a known venue (default 0.65)
+    VENUE_TRANSIT_TTL       seconds a cached MRT/bus answer is reused (default 7 days)
+"""
+import os
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from sqlalchemy import func
+from db import SessionLocal, Meeting
+import metrics
+
+MATCH_THRESHOLD = float(os.getenv("VENUE_MATCH_THRESHOLD", "0.65"))
+TRANSIT_TTL = int(os.getenv("VENUE_TRANSIT_TTL", str(7 * 24 * 3600)))
+WORD_MATCH = 0.5
+MAX_CACHED = 5000
+
+FILLER = {"the", "mall", "shopping", "centre", "center", "singapore", "sg", "at", "s", "building", "bldg"}
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize(place: str) -> str:
+    words = _PUNCT_RE.sub(" ", (place or "").lower()).split()
+    kept = [w for w in words if w not in FILLER]
+    return " ".join(kept or words)
+
+
+def trigrams(name: str):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a, b) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _exact_only(word: str) -> bool:
+    """Numbers and short codes ("85", "t4", "b2") tell venues apart and only match themselves."""
+    return word.isdigit() or len(word) < 3 or (len(word) <= 4 and any(c.isdigit() for c in word))
+
+
+def _covered(word: str, other: str) -> bool:
+    """Whether `word` is accounted for in the normalized name `other` (spelled out, abbreviated or misspelt)."""
+    if _exact_only(word):
+        return word in other.split()
+    if word in other.replace(" ", ""):
+        return True
+    others = other.split()
+    if any(len(o) >= 3 and word.startswith(o) for o in others):
+        return True  # "sing" for "singapura"
+    grams = trigrams(word)
+    return any(_dice(grams, trigrams(o)) >= WORD_MATCH for o in others)
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Trigram Dice similarity of two normalized names, 0..1, ignoring spaces.
+    0 when either has a word the other lacks: "tampines hub" is not
+    "tampines", however many trigrams they share, and "changi airport t4"
+    is not "changi airport t1".
+    """
+    if not all(_covered(w, b) for w in a.split()) or not all(_covered(w, a) for w in b.split()):
+        return 0.0
+    return _dice(trigrams(a.replace(" ", "")), trigrams(b.replace(" ", "")))
+
+
+class VenueIndex:
+    def __init__(self, threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.names = {}  # {key: display name, the most used spelling}
+        self.uses = Counter()  # {key: times seen}
+        self.aliases = {}  # {normalized spelling: key}
+        self._by_trigram = defaultdict(set)  # {trigram: {key}}
+        self._by_word = defaultdict(set)  # {word: {key}}
+        self._learned = False
+
+    def _add(self, key: str, display: str, uses: int = 1):
+        self.names[key] = display
+        self.aliases[key] = key
+        self.uses[key] += uses
+        for gram in trigrams(key.replace(" ", "")):
+            self._by_trigram[gram].add(key)
+        for word in key.split():
+            self._by_word[word].add(key)
+
+    def normalized(self, place: str) -> str:
+        """normalize(place), without the part after the first comma if the part before it is a known venue."""
+        name, comma, _ = (place or "").partition(",")
+        short = normalize(name)
+        if comma and short and (short in self.aliases or self.match(short)[0] is not None):
+            return short
+        return normalize(place)
+
+    def match(self, normalized: str):
+        """(key, score) of the best known venue for a normalized name, or (None, 0)."""
+        candidates = Counter()
+        for gram in trigrams(normalized.replace(" ", "")):
+            for key in self._by_trigram.get(gram, ()):
+                candidates[key] += 1
+        for word in normalized.split():
+            # Short names share few trigrams with longer spellings; look them up by word too
+            for key in self._by_word.get(word, ()):
+                candidates[key] += 1
+        best, best_score = None, 0.0
+        for key, _ in candidates.most_common(50):
+            score = similarity(normalized, key)
+            if score > best_score or (score == best_score and best and self.uses[key] > self.uses[best]):
+                best, best_score = key, score
+        return (best, best_score) if best_score >= self.threshold else (None, best_score)
+
+    def learn(self, places):
+        """Seed from (place, count) pairs, most used first, folding spellings into one venue."""
+        for place, count in sorted(places, key=lambda pc: -pc[1]):
+            normalized = self.normalized(place)
+            if not normalized:
+                continue
+            key = self.aliases.get(normalized)
+            if key is None:
+                key, _ = self.match(normalized)
+            if key is None:
+                self._add(normalized, place.strip(), count)
+            else:
+                self.aliases[normalized] = key
+                self.uses[key] += count
+
+    def load(self):
+        """Learn venues from past meetings. Done once at startup, or on the first resolve()."""
+        self._learned = True
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Meeting.place, func.count(Meeting.id))
+                .filter(Meeting.place.isnot(None))
+                .group_by(Meeting.place)
+                .all()
+            )
+        finally:
+            db.close()
+        self.learn(rows)
+
+    def resolve(self, place: str) -> str:
+        """Canonical key for `place`, remembering new spellings and venues."""
+        if not self._learned:
+            self.load()
+        normalized = self.normalized(place)
+        key = self.aliases.get(normalized)
+        if key is not None:
+            metrics.inc("venue_resolve_total", result="known")
+            self.uses[key] += 1
+            return key
+        key, _ = self.match(normalized)
+        if key is not None:
+            metrics.inc("venue_resolve_total", result="fuzzy")
+            self.aliases[normalized] = key
+            self.uses[key] += 1
+            return key
+        metrics.inc("venue_resolve_total", result="new")
+        self._add(normalized, place.strip())
+        return normalized
+
+
+venues = VenueIndex()
+
+_transit = OrderedDict()  # {(kind, key): (expires_at, answer)}, least recently used first
+
+
+async def cached_lookup(kind: str, place: str, lookup):
+    """
+    `await lookup(place)`, cached per canonical venue. Only answers that
+    found something are cached; errors, "not found" and answers without a
+    walking distance are retried.
+    """
+    key = (kind, venues.resolve(place))
+    entry = _transit.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _transit.move_to_end(key)
+        metrics.inc("transit_cache_total", kind=kind, result="hit")
+        return entry[1]
+
+    metrics.inc("transit_cache_total", kind=kind, result="miss")
+    answer = await lookup(place)
+    if answer and not answer.startswith("❌") and "⚠️" not in answer:
+        _transit[key] = (time.monotonic() + TRANSIT_TTL, answer)
+        _transit.move_to_end(key)
+        while len(_transit) > MAX_CACHED:
+            _transit.popitem(last=False)
+    return answer